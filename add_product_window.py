@@ -30,9 +30,10 @@ class AddProductWindow(QDialog):
         self.create_widgets()
         
     def load_data(self):
-        """Загрузка категорий и поставщиков"""
-        self.categories = db.get_categories()
-        self.suppliers = db.get_suppliers()
+        """Загрузка категорий и поставщиков одним запросом к БД"""
+        data = db.fetch_many("categories", "suppliers")
+        self.categories = data["categories"]
+        self.suppliers = data["suppliers"]
         
     def create_widgets(self):
         # Основной layout с двумя колонками
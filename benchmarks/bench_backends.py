@@ -0,0 +1,75 @@
+"""
+Задержка вызовов db.* на PostgreSQL и на встроенной базе SQLite (db_sqlite.py).
+
+Данные PostgreSQL копируются во временный файл SQLite, поэтому оба хранилища
+работают с одинаковыми строками. Продажи, созданные на PostgreSQL, удаляются
+после замера; временный файл SQLite удаляется в конце.
+
+    python benchmarks/bench_backends.py [--repeat 200]
+"""
+import argparse
+import os
+import tempfile
+from datetime import date
+
+from common import configure_db, db, delete_sales, measure, pick_products
+
+import db_sqlite  # noqa: E402  (путь к проекту добавляет common)
+
+
+def run_backend(args, product_ids, sale_ids):
+    """Замеры на текущем хранилище db: список (функция, результат measure())"""
+    sale_items = [(product_id, 1, None) for product_id in product_ids[:3]]
+    calls = [
+        ("get_categories", db.get_categories),
+        ("get_product_by_id", lambda: db.get_product_by_id(product_ids[0])),
+        ("get_products", db.get_products),
+        ("get_inventory", db.get_inventory),
+        ("get_sales_with_items", db.get_sales_with_items),
+        ("create_sale (3 позиции)",
+         lambda: sale_ids.append(db.create_sale("Бенчмарк", None, date.today(), sale_items))),
+    ]
+    results = []
+    for name, fn in calls:
+        repeat = args.repeat if not name.startswith("create_") else min(args.repeat, 100)
+        results.append((name, measure(fn, repeat=repeat)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200, help="вызовов на функцию")
+    args = parser.parse_args()
+    configure_db()
+    db.get_pool().prefill()
+    product_ids = pick_products(3, min_stock=500)
+    if len(product_ids) < 3:
+        raise SystemExit("Нужно хотя бы 3 товара с остатком больше 500")
+
+    sale_ids = []
+    try:
+        postgres = run_backend(args, product_ids, sale_ids)
+    finally:
+        delete_sales(sale_ids)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        with db.get_cursor() as cur:
+            suppliers_table = db.get_schema(cur).resolve_table("suppliers", "suppliens", "supplier")
+            db_sqlite.copy_from_postgres(cur, path, suppliers_table or "suppliers")
+        db.set_backend("sqlite", path)
+        try:
+            sqlite = run_backend(args, product_ids, [])
+        finally:
+            db.set_backend("postgres")
+            db_sqlite.close_pool()
+
+    print()
+    print(f"{'функция':<28} {'PG сред.':>9} {'PG p95':>8} {'SQLite сред.':>13} {'SQLite p95':>11}  мс")
+    for (name, pg), (_name, lite) in zip(postgres, sqlite):
+        print(f"{name:<28} {pg['mean']:>9.3f} {pg['p95']:>8.3f} "
+              f"{lite['mean']:>13.3f} {lite['p95']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Загрузка коллекции товаров: catalog_import.import_catalog (COPY во временную таблицу,
+проверка и слияние одной транзакцией) против db.add_product на каждую строку файла
+(путь окна «Добавить товар»: проверка артикула, товар и строка склада — три запроса).
+
+Файл CSV на --rows товаров создаётся во временной папке; товары по одному добавляются
+только для первых --per-row строк, время на весь файл оценивается пропорционально.
+Созданные товары (артикулы BENCH-IMP-*) после замера удаляются.
+
+    python benchmarks/bench_catalog_import.py [--rows 5000] [--per-row 500]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from common import configure_db, db
+
+import catalog_import  # noqa: E402
+
+SKU_PREFIX = "BENCH-IMP-"
+
+
+def write_collection(path, rows, category):
+    """Файл коллекции в формате catalog_import: rows товаров категории category"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Наименование", "Артикул", "Категория", "Цена", "Скидка",
+                         "Длина", "Ширина", "Высота", "Материал", "Цвет", "Остаток"])
+        for number in range(rows):
+            writer.writerow([f"Бенчмарк {number}", f"{SKU_PREFIX}{number:06d}", category,
+                             f"{1000 + number % 500},50", number % 20, 120, 60, 75,
+                             "Дуб", "Белый", number % 10])
+
+
+def delete_created():
+    """Удалить товары, созданные бенчмарком"""
+    with db.transaction(), db.get_cursor() as cur:
+        cur.execute(
+            "DELETE FROM warehouse WHERE product_id IN (SELECT id FROM products WHERE sku LIKE %s)",
+            (SKU_PREFIX + "%",),
+        )
+        cur.execute("DELETE FROM products WHERE sku LIKE %s", (SKU_PREFIX + "%",))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000, help="товаров в файле")
+    parser.add_argument("--per-row", type=int, default=500, help="товаров, добавляемых по одному через db.add_product")
+    args = parser.parse_args()
+    configure_db()
+
+    categories = db.get_categories()
+    if not categories:
+        raise SystemExit("В БД нет категорий")
+    category_id, category = categories[0]
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "collection.csv")
+        write_collection(path, args.rows, category)
+        try:
+            started = time.perf_counter()
+            inserted, updated, errors = catalog_import.import_catalog(path)
+            import_ms = (time.perf_counter() - started) * 1000
+            if errors:
+                raise SystemExit(f"Ошибки в файле бенчмарка: {errors[:5]}")
+
+            # повторная загрузка того же файла: все товары уже есть и обновляются
+            started = time.perf_counter()
+            _inserted, reupdated, _errors = catalog_import.import_catalog(path)
+            update_ms = (time.perf_counter() - started) * 1000
+            delete_created()
+
+            count = min(args.per_row, args.rows)
+            started = time.perf_counter()
+            for number in range(count):
+                db.add_product(f"Бенчмарк {number}", category_id, f"{SKU_PREFIX}{number:06d}",
+                               1000 + number % 500 + 0.5, 120, 60, 75, "Дуб", "Белый", number % 20)
+            per_row_ms = (time.perf_counter() - started) * 1000 / count
+        finally:
+            delete_created()
+
+    print()
+    print(f"Загрузка {args.rows} товаров")
+    print(f"{'вариант':<48} {'всего, мс':>10} {'на товар, мс':>13}")
+    print(f"{'import_catalog: новые товары':<48} {import_ms:>10.0f} {import_ms / inserted:>13.3f}")
+    print(f"{'import_catalog: обновление тех же артикулов':<48} {update_ms:>10.0f} {update_ms / reupdated:>13.3f}")
+    print(f"{f'db.add_product по одному (оценка по {count})':<48} {per_row_ms * args.rows:>10.0f} {per_row_ms:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Оформление покупки в зависимости от размера чека: db.create_sale (число запросов не
+зависит от числа позиций) против прежней схемы с запросами на каждую позицию
+(проверка остатка, повторное чтение цены, вставка позиции, обновление склада — 4N+1).
+
+Для каждого размера чека печатается задержка и число запросов на вызов. Созданные
+продажи удаляются, остатки возвращаются на склад.
+
+    python benchmarks/bench_checkout.py [--repeat 100] [--sizes 1 5 20 50 100]
+"""
+import argparse
+import datetime
+
+from common import configure_db, db, delete_sales, measure, pick_products
+
+
+def create_sale_per_item(customer_name, employee_id, sale_date, items):
+    """Прежняя реализация db.create_sale: отдельные запросы на каждую позицию"""
+    with db.transaction(), db.get_cursor() as cur:
+        total_amount = 0
+        for product_id, quantity, discount_override in items:
+            cur.execute(
+                """
+                SELECT p.price, p.discount_percent, COALESCE(w.quantity, 0)
+                FROM products p
+                LEFT JOIN warehouse w ON w.product_id = p.id
+                WHERE p.id = %s
+                """,
+                (product_id,),
+            )
+            price, base_discount, stock = cur.fetchone()
+            if stock < quantity:
+                raise ValueError(f"Недостаточно товара id={product_id} на складе")
+            discount = discount_override if discount_override is not None else float(base_discount or 0)
+            total_amount += round(float(price) * (1 - discount / 100.0) * quantity, 2)
+
+        cur.execute(
+            """
+            INSERT INTO sales (sale_date, total_amount, customer_name, employee_id)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+            """,
+            (sale_date, total_amount, customer_name, employee_id),
+        )
+        sale_id = cur.fetchone()[0]
+
+        # у секционированных продаж позиция хранит дату продажи
+        dated = db.get_schema(cur).has_column("sale_items", "sale_date")
+        for product_id, quantity, discount_override in items:
+            cur.execute("SELECT price, discount_percent FROM products WHERE id = %s", (product_id,))
+            price, base_discount = cur.fetchone()
+            discount = discount_override if discount_override is not None else float(base_discount or 0)
+            cur.execute(
+                f"""
+                INSERT INTO sale_items
+                    (sale_id, product_id, quantity, sale_price, discount_percent
+                     {", sale_date" if dated else ""})
+                VALUES (%s, %s, %s, %s, %s{", %s" if dated else ""})
+                """,
+                (sale_id, product_id, quantity, float(price) * (1 - discount / 100.0), discount)
+                + ((sale_date,) if dated else ()),
+            )
+            cur.execute(
+                """
+                UPDATE warehouse
+                SET quantity = COALESCE(quantity, 0) - %s, last_updated = NOW()
+                WHERE product_id = %s
+                """,
+                (quantity, product_id),
+            )
+        return sale_id
+
+
+def measure_checkout(create_sale, basket, repeat):
+    """measure() для create_sale(чек basket) плюс число запросов на вызов"""
+    sale_ids = []
+    queries_before = _queries()
+    try:
+        result = measure(
+            lambda: sale_ids.append(create_sale("Бенчмарк", None, datetime.date.today(), basket)),
+            repeat=repeat,
+        )
+        result["queries"] = (_queries() - queries_before) / len(sale_ids)
+    finally:
+        delete_sales(sale_ids)
+    return result
+
+
+def _queries():
+    return sum(entry["queries"] for entry in db.stats().values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=100, help="вызовов на каждый размер чека")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20, 50, 100],
+                        help="число позиций в чеке")
+    args = parser.parse_args()
+    configure_db()
+    db.get_pool().prefill()
+
+    product_ids = pick_products(max(args.sizes), min_stock=args.repeat + 20)
+    if len(product_ids) < max(args.sizes):
+        raise SystemExit(f"Нужно {max(args.sizes)} товаров с остатком больше {args.repeat + 20}")
+
+    rows = []
+    for size in args.sizes:
+        basket = [(product_id, 1, None) for product_id in product_ids[:size]]
+        per_item = measure_checkout(create_sale_per_item, basket, args.repeat)
+        set_based = measure_checkout(db.create_sale, basket, args.repeat)
+        rows.append((size, per_item, set_based))
+
+    print()
+    print(f"{'позиций':>8} {'по позициям, мс':>16} {'запросов':>9} {'create_sale, мс':>16} {'запросов':>9}")
+    for size, per_item, set_based in rows:
+        print(f"{size:>8} {per_item['mean']:>16.3f} {per_item['queries']:>9.0f} "
+              f"{set_based['mean']:>16.3f} {set_based['queries']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
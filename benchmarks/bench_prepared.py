@@ -0,0 +1,56 @@
+"""
+Задержка на вызов с серверными подготовленными запросами и без них:
+  - двойной клик по карточке товара (db.get_product_by_id);
+  - оформление покупки (db.create_sale, чек из нескольких позиций).
+
+    python benchmarks/bench_prepared.py [--repeat 500] [--basket 5]
+"""
+import argparse
+import datetime
+
+from common import configure_db, db, delete_sales, measure, pick_products, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=500, help="вызовов get_product_by_id")
+    parser.add_argument("--sales", type=int, default=100, help="вызовов create_sale")
+    parser.add_argument("--basket", type=int, default=5, help="позиций в чеке")
+    args = parser.parse_args()
+    configure_db()
+
+    product_ids = pick_products(max(args.basket, 50), min_stock=args.sales + 10)
+    if len(product_ids) < args.basket:
+        raise SystemExit("Недостаточно товаров с остатком для бенчмарка")
+    basket = [(product_id, 1, None) for product_id in product_ids[:args.basket]]
+
+    details_rows = []
+    checkout_rows = []
+    for enabled in (False, True):
+        db.USE_PREPARED_STATEMENTS = enabled
+        label = "PREPARE/EXECUTE" if enabled else "текст запроса каждый раз"
+
+        position = iter(range(10 ** 9))
+        details_rows.append((label, measure(
+            lambda: db.get_product_by_id(product_ids[next(position) % len(product_ids)]),
+            repeat=args.repeat,
+        )))
+
+        sale_ids = []
+        try:
+            checkout_rows.append((label, measure(
+                lambda: sale_ids.append(
+                    db.create_sale("Бенчмарк", None, datetime.date.today(), basket)
+                ),
+                repeat=args.sales,
+                warmup=3,
+            )))
+        finally:
+            delete_sales(sale_ids)
+
+    print_table("Двойной клик по карточке: get_product_by_id", details_rows)
+    print_table(f"Оформление покупки: create_sale, позиций в чеке: {args.basket}", checkout_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Поиск по мере ввода в индексе товаров в памяти (search_index): время на нажатие клавиши
+при наборе запросов, построение индекса и обновление одного товара.
+
+По умолчанию каталог синтетический (--products товаров), с --from-db — товары из БД.
+
+    python benchmarks/bench_search_index.py [--products 50000] [--from-db]
+"""
+import argparse
+import random
+import time
+
+from common import configure_db, db, measure, print_table
+
+import search_index  # noqa: E402
+
+KINDS = ["Стол", "Стул", "Шкаф", "Комод", "Диван", "Кресло", "Кровать", "Тумба", "Полка", "Стеллаж"]
+STYLES = ["обеденный", "письменный", "угловой", "раскладной", "детский", "офисный", "барный", "журнальный"]
+MATERIALS = ["Дуб", "Бук", "Сосна", "Ясень", "МДФ", "ЛДСП", "Металл", "Стекло"]
+COLORS = ["Белый", "Чёрный", "Венге", "Орех", "Серый", "Бежевый", "Коричневый"]
+CATEGORIES = ["Столы", "Стулья", "Шкафы", "Диваны", "Кровати"]
+
+# Запросы, которые набираются по букве: каждая промежуточная строка — один поиск
+TYPED_QUERIES = ["стол дуб бел", "кр", "шкаф угл венге", "ABC-0123", "о", "лдсп орех 120"]
+
+
+def synthetic_products(count, seed=1):
+    """Строки товаров в формате db.get_products"""
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(1, count + 1):
+        name = f"{rng.choice(KINDS)} {rng.choice(STYLES)} {rng.randint(40, 240)}"
+        products.append((
+            product_id, name, f"{rng.choice(['ABC', 'KLM', 'XYZ'])}-{product_id:05d}",
+            rng.choice(CATEGORIES), rng.choice(MATERIALS), rng.choice(COLORS),
+            None, None, None, 1000, 0, 10, 1000, None,
+        ))
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=50000, help="товаров в синтетическом каталоге")
+    parser.add_argument("--from-db", action="store_true", help="взять товары из БД (db.get_products)")
+    parser.add_argument("--limit", type=int, default=30, help="результатов на запрос (как PAGE_SIZE каталога)")
+    args = parser.parse_args()
+
+    if args.from_db:
+        configure_db()
+        products = db.get_products()
+    else:
+        products = synthetic_products(args.products)
+
+    started = time.perf_counter()
+    index = search_index.ProductSearchIndex(products)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"Товаров: {len(index)}, построение индекса: {build_ms:.0f} мс")
+
+    rows = []
+    for query in TYPED_QUERIES:
+        prefixes = [query[:length] for length in range(1, len(query) + 1)]
+        position = iter(range(10 ** 9))
+        found = len(index.search(query))
+        rows.append((f"«{query}» по буквам (найдено {found})", measure(
+            lambda: index.search(prefixes[next(position) % len(prefixes)], limit=args.limit),
+            repeat=len(prefixes) * 50,
+        )))
+    print_table("Поиск на одно нажатие клавиши", rows)
+
+    product = products[len(products) // 2]
+    renamed = (product[0], product[1] + " обновлённый") + tuple(product[2:])
+    flip = iter(range(10 ** 9))
+    print_table("Обновление одного товара (db.add_product_listener)", [
+        ("put (замена строки)", measure(
+            lambda: index.put(renamed if next(flip) % 2 else product), repeat=2000,
+        )),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+История продаж и поставок: fetchall() против потокового чтения серверным курсором.
+Для каждого варианта печатается время до первых строк, полное время и пик памяти
+Python (tracemalloc) при проходе по всей истории.
+
+    python benchmarks/bench_streaming.py [--chunk 500]
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import configure_db, db
+
+
+def run(label, make_chunks):
+    """Пройти по всем строкам; make_chunks() возвращает итерируемое списков строк"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_rows = None
+    rows = 0
+    for chunk in make_chunks():
+        if first_rows is None:
+            first_rows = time.perf_counter() - started
+        rows += len(chunk)
+    total = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return label, rows, (first_rows or total) * 1000, total * 1000, peak / 1024 / 1024
+
+
+def print_results(title, results):
+    print()
+    print(title)
+    print(f"{'вариант':<32} {'строк':>8} {'первые, мс':>11} {'всего, мс':>10} {'пик, МБ':>8}")
+    for label, rows, first_ms, total_ms, peak_mb in results:
+        print(f"{label:<32} {rows:>8} {first_ms:>11.1f} {total_ms:>10.1f} {peak_mb:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk", type=int, default=db.STREAM_CHUNK_SIZE, help="строк в порции")
+    args = parser.parse_args()
+    configure_db()
+    # подключение открывается заранее, чтобы не попасть в замер
+    db.get_pool().prefill()
+
+    print_results("Продажи: get_sales_with_items / iter_sales_with_items", [
+        run("fetchall()", lambda: [db.get_sales_with_items()]),
+        run(f"серверный курсор, по {args.chunk}",
+            lambda: db.iter_sales_with_items(chunk_size=args.chunk)),
+    ])
+    print_results("Поставки: get_deliveries_with_items / iter_deliveries_with_items", [
+        run("fetchall()", lambda: [db.get_deliveries_with_items()]),
+        run(f"серверный курсор, по {args.chunk}",
+            lambda: db.iter_deliveries_with_items(chunk_size=args.chunk)),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Многооператорные записи: фиксация каждого оператора отдельно (autocommit, как db.py
+работал раньше) против единицы работы db.transaction():
+  - жизненный цикл товара: add_product + update_product + delete_product;
+  - оформление покупки: db.create_sale, чек из нескольких позиций;
+  - пакет из нескольких товаров в одной внешней транзакции db.transaction().
+
+Для каждого варианта печатается задержка и число пишущих транзакций (COMMIT с записью
+WAL) на вызов — по расходу номеров транзакций (txid_current). Чтобы счётчик был точным,
+во время замера в базу не должен писать никто другой.
+
+    python benchmarks/bench_transactions.py [--repeat 200] [--basket 5] [--batch 10]
+"""
+import argparse
+import contextlib
+import datetime
+import itertools
+
+from common import configure_db, db, delete_sales, measure, pick_products, print_table
+
+
+@contextlib.contextmanager
+def _per_statement(readonly=False):
+    """Подмена db.transaction: каждый оператор фиксируется сам (autocommit)"""
+    yield None
+
+
+def _current_xid():
+    with db.get_cursor() as cur:
+        cur.execute("SELECT txid_current()")
+        return cur.fetchone()[0]
+
+
+def measure_with_commits(fn, repeat, warmup=5):
+    """measure() плюс число пишущих транзакций на вызов"""
+    before = _current_xid()
+    result = measure(fn, repeat=repeat, warmup=warmup)
+    # сам txid_current() тоже расходует один номер
+    result["commits"] = (_current_xid() - before - 1) / (repeat + warmup)
+    return result
+
+
+def print_commits(title, rows):
+    print()
+    print(title)
+    print(f"{'вариант':<40} {'COMMIT на вызов':>16}")
+    for name, result in rows:
+        print(f"{name:<40} {result['commits']:>16.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200, help="повторов каждого сценария")
+    parser.add_argument("--basket", type=int, default=5, help="позиций в чеке")
+    parser.add_argument("--batch", type=int, default=10, help="товаров в пакете")
+    args = parser.parse_args()
+    configure_db()
+
+    product_ids = pick_products(max(args.basket, 50), min_stock=2 * args.repeat + 20)
+    if len(product_ids) < args.basket:
+        raise SystemExit("Недостаточно товаров с остатком для бенчмарка")
+    basket = [(product_id, 1, None) for product_id in product_ids[:args.basket]]
+    categories = db.get_categories()
+    if not categories:
+        raise SystemExit("В БД нет категорий")
+    category_id = categories[0][0]
+    sku_counter = itertools.count()
+
+    def product_lifecycle():
+        sku = f"BENCH-TX-{next(sku_counter)}"
+        product_id = db.add_product("Бенчмарк", category_id, sku, 100)
+        db.update_product(product_id, "Бенчмарк", category_id, sku, 120)
+        db.delete_product(product_id)
+
+    def product_batch():
+        with db.transaction():
+            for _ in range(args.batch):
+                product_lifecycle()
+
+    variants = (
+        ("autocommit: COMMIT на каждый оператор", _per_statement),
+        ("db.transaction()", db.transaction),
+    )
+    lifecycle_rows = []
+    checkout_rows = []
+    batch_rows = []
+    transaction = db.transaction
+    try:
+        for label, tx in variants:
+            db.transaction = tx
+            lifecycle_rows.append((label, measure_with_commits(product_lifecycle, args.repeat)))
+
+            sale_ids = []
+            try:
+                checkout_rows.append((label, measure_with_commits(
+                    lambda: sale_ids.append(
+                        db.create_sale("Бенчмарк", None, datetime.date.today(), basket)
+                    ),
+                    args.repeat,
+                )))
+            finally:
+                db.transaction = transaction
+                delete_sales(sale_ids)
+        batch_rows.append((
+            f"{args.batch} товаров в одной db.transaction()",
+            measure_with_commits(product_batch, max(1, args.repeat // args.batch), warmup=1),
+        ))
+    finally:
+        db.transaction = transaction
+
+    print_table("Товар: add_product + update_product + delete_product", lifecycle_rows + batch_rows)
+    print_commits("Пишущих транзакций: товар", lifecycle_rows + batch_rows)
+    print_table(f"Оформление покупки: create_sale, позиций в чеке: {args.basket}", checkout_rows)
+    print_commits("Пишущих транзакций: create_sale", checkout_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Проверка планов запросов db.*: на реалистичном объёме данных ни один запрос
+не должен читать большую таблицу целиком (Seq Scan), кроме списков, которые
+по смыслу показывают всю таблицу (FULL_LISTINGS).
+
+Скрипт в одной транзакции добавляет данные (ROWS), обновляет статистику (ANALYZE),
+вызывает функции db.*, перехватывает их запросы через журнал медленных запросов
+(SLOW_QUERY_MS = 0) и выполняет для каждого EXPLAIN. В конце транзакция
+откатывается — база остаётся прежней. Схема должна быть обновлена (python migrate.py).
+
+Ошибка — полное чтение, которое остаётся и с enable_seqscan = off: запросу не хватает
+индекса. Если же индекс есть, но планировщик счёл полное чтение дешевле, выводится
+предупреждение. Обычно это значит, что random_page_cost (по умолчанию 4) рассчитан
+на жёсткий диск; для SSD и базы, помещающейся в память, подходит 1.1.
+
+У секционированных таблиц (продажи по месяцам) полное чтение части секций — ожидаемый
+план для запроса за период: остальные секции отброшены, а выбранные нужны целиком.
+
+    python benchmarks/check_indexes.py
+"""
+import contextlib
+import io
+import sys
+from datetime import date, timedelta
+
+from common import configure_db, db
+
+# Сколько строк добавить для проверки
+ROWS = {
+    "categories": 20,
+    "products": 20000,
+    "suppliers": 50,
+    "deliveries": 5000,
+    "delivery_items_per_delivery": 4,
+    "sales": 100000,
+    "sale_items_per_sale": 2,
+    "days": 3 * 365,
+}
+
+# Таблицы меньше этого числа строк можно читать целиком
+LARGE_TABLE_ROWS = 1000
+
+# Функции, которые возвращают всю таблицу: для них Seq Scan — ожидаемый план
+FULL_LISTINGS = {
+    "get_products (все категории)", "get_inventory", "get_sales", "get_deliveries",
+    "get_deliveries_with_items", "iter_deliveries_with_items", "fetch_many",
+}
+
+# Поиск товаров: без индекса pg_trgm (migrations/006_product_search.sql) читает весь каталог
+PRODUCT_SEARCHES = {"search_products", "search_products (категория, опечатка)"}
+
+
+class _Rollback(Exception):
+    """Откат проверочной транзакции"""
+
+
+def seed(cur, suppliers_table):
+    """Проверочные данные; возвращает (id товара, артикул, (id, дата) продажи, id поставщика)"""
+    cur.execute(
+        "INSERT INTO categories (name) SELECT 'Проверка индексов ' || g FROM generate_series(1, %s) g",
+        (ROWS["categories"],),
+    )
+    cur.execute(
+        """
+        INSERT INTO products (name, category_id, sku, price, discount_percent)
+        SELECT
+            'Проверка ' || lpad(g::text, 6, '0'),
+            c.ids[1 + g %% array_length(c.ids, 1)],
+            'CHK-' || g,
+            100 + g %% 5000,
+            CASE WHEN g %% 10 = 0 THEN 15 ELSE 0 END
+        FROM generate_series(1, %s) g,
+             (SELECT array_agg(id) AS ids FROM categories) c
+        """,
+        (ROWS["products"],),
+    )
+    cur.execute(
+        """
+        INSERT INTO warehouse (product_id, quantity)
+        SELECT id, 1000000 FROM products
+        ON CONFLICT (product_id) DO UPDATE SET quantity = 1000000
+        """
+    )
+    cur.execute(
+        "INSERT INTO " + suppliers_table + " (name, city, inn) "
+        "SELECT 'Поставщик ' || g, 'Город', lpad(g::text, 10, '9') FROM generate_series(1, %s) g",
+        (ROWS["suppliers"],),
+    )
+    cur.execute(
+        """
+        INSERT INTO deliveries (supplier_id, delivery_date, total_amount)
+        SELECT s.ids[1 + g %% array_length(s.ids, 1)], current_date - g %% %s, 1000
+        FROM generate_series(1, %s) g,
+             (SELECT array_agg(id) AS ids FROM """ + suppliers_table + """) s
+        """,
+        (ROWS["days"], ROWS["deliveries"]),
+    )
+    cur.execute(
+        """
+        INSERT INTO delivery_items (delivery_id, product_id, quantity, purchase_price)
+        SELECT d.id, p.ids[1 + (d.id * 7 + k) %% array_length(p.ids, 1)], 5, 80
+        FROM deliveries d, generate_series(1, %s) k,
+             (SELECT array_agg(id) AS ids FROM products) p
+        """,
+        (ROWS["delivery_items_per_delivery"],),
+    )
+    if db.get_schema(cur).has_table("sales_default"):
+        # продажи секционированы: секции на весь период, как после миграции
+        cur.execute(
+            "SELECT create_sales_partitions(current_date - %s, current_date)", (ROWS["days"],)
+        )
+    dated = db.get_schema(cur).has_column("sale_items", "sale_date")
+    cur.execute(
+        """
+        INSERT INTO sales (sale_date, total_amount, customer_name)
+        SELECT current_date - g %% %s, 500, 'Покупатель ' || g %% 1000
+        FROM generate_series(1, %s) g
+        """,
+        (ROWS["days"], ROWS["sales"]),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO sale_items (sale_id, product_id, quantity, sale_price, discount_percent
+                                {", sale_date" if dated else ""})
+        SELECT s.id, p.ids[1 + (s.id * 13 + k) %% array_length(p.ids, 1)], 1, 250, 0
+               {", s.sale_date" if dated else ""}
+        FROM sales s, generate_series(1, %s) k,
+             (SELECT array_agg(id) AS ids FROM products) p
+        """,
+        (ROWS["sale_items_per_sale"],),
+    )
+    cur.execute("ANALYZE")
+    cur.execute("SELECT id, sku FROM products WHERE sku = 'CHK-100'")
+    product_id, sku = cur.fetchone()
+    cur.execute("SELECT id, sale_date FROM sales ORDER BY id DESC LIMIT 1")
+    sale = cur.fetchone()
+    cur.execute("SELECT max(id) FROM " + suppliers_table)
+    supplier_id = cur.fetchone()[0]
+    return product_id, sku, sale, supplier_id
+
+
+def scenario(product_id, sku, sale, supplier_id):
+    """Вызовы db.*: (название, функция без аргументов)"""
+    category_id = _category_of(product_id)
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+
+    def product_lifecycle():
+        new_id = db.add_product("Проверка индексов", category_id, "CHK-NEW", 100)
+        db.update_product(new_id, "Проверка индексов", category_id, "CHK-NEW", 110, discount_percent=5)
+        db.delete_product(new_id)
+
+    return [
+        ("get_session_context", lambda: db.get_session_context("admin")),
+        ("get_user_by_username", lambda: db.get_user_by_username("admin")),
+        ("get_employee_by_user_id", lambda: db.get_employee_by_user_id(1)),
+        ("get_categories", db.get_categories),
+        ("get_products", lambda: db.get_products(category_id)),
+        ("get_products (все категории)", db.get_products),
+        ("get_products_page", lambda: db.get_products_page(category_id, limit=30)),
+        ("get_products_page (след. страница)",
+         lambda: db.get_products_page(category_id, after=("Проверка 010000", 0), limit=30)),
+        ("get_product_by_id", lambda: db.get_product_by_id(product_id)),
+        ("search_product", lambda: db.search_product(sku)),
+        ("search_products", lambda: db.search_products("проверка 01234", limit=51)),
+        ("search_products (категория, опечатка)",
+         lambda: db.search_products("провекра", category_id=category_id, limit=51)),
+        ("get_discounted_products", db.get_discounted_products),
+        ("get_discounted_products_by_category",
+         lambda: db.get_discounted_products_by_category(category_id)),
+        ("add_product / update_product / delete_product", product_lifecycle),
+        ("get_inventory", db.get_inventory),
+        ("get_suppliers", db.get_suppliers),
+        ("get_deliveries", db.get_deliveries),
+        ("get_deliveries_with_items", db.get_deliveries_with_items),
+        ("create_delivery", lambda: db.create_delivery(supplier_id, today, [(product_id, 3, 90)])),
+        ("create_sale", lambda: db.create_sale("Проверка", None, today, [(product_id, 1, None)])),
+        ("get_sales", db.get_sales),
+        ("get_sale_items", lambda: db.get_sale_items(sale[0])),
+        ("get_sale_items (с датой)", lambda: db.get_sale_items(*sale)),
+        ("get_sales_with_items (месяц)", lambda: db.get_sales_with_items(month_ago, today)),
+        ("iter_sales_with_items (месяц)", lambda: list(db.iter_sales_with_items(month_ago, today))),
+    ]
+
+
+def _category_of(product_id):
+    with db.get_cursor() as cur:
+        cur.execute("SELECT category_id FROM products WHERE id = %s", (product_id,))
+        return cur.fetchone()[0]
+
+
+def capture_queries(fn):
+    """Запросы, выполненные вызовом fn(): список (запрос, параметры)"""
+    db.reset_stats()
+    fn()
+    return [(entry["query"], entry["params"]) for entry in reversed(db.slow_queries())]
+
+
+def scans(plan):
+    """Все узлы чтения таблиц плана: список (тип узла, таблица, индекс)"""
+    found = []
+    if "Relation Name" in plan:
+        found.append((plan["Node Type"], plan["Relation Name"], plan.get("Index Name")))
+    for child in plan.get("Plans", ()):
+        found.extend(scans(child))
+    return found
+
+
+def full_scans(cur, query, params, sizes):
+    """Большие таблицы, которые план запроса читает целиком, и все узлы чтения плана"""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    nodes = scans(cur.fetchone()[0][0]["Plan"])
+    tables = [table for node, table, _index in nodes
+              if node == "Seq Scan" and sizes.get(table, 0) >= LARGE_TABLE_ROWS]
+    return tables, nodes
+
+
+def pruned(tables, nodes, parents):
+    """Все полностью читаемые таблицы — секции, и план читает не все секции своей таблицы"""
+    if not all(table in parents for table in tables):
+        return False
+    read = {table for _node, table, _index in nodes if table in parents}
+    for parent in {parents[table] for table in tables}:
+        all_partitions = sum(other == parent for other in parents.values())
+        if sum(parents[table] == parent for table in read) >= all_partitions:
+            return False
+    return True
+
+
+def check(cur, title, query, params, sizes, parents):
+    """Результат проверки одного запроса: (итог, узлы плана, полностью читаемые таблицы)"""
+    tables, nodes = full_scans(cur, query, params, sizes)
+    if not tables:
+        return "OK", nodes, tables
+    if title in FULL_LISTINGS:
+        return "OK (весь список)", nodes, tables
+    if pruned(tables, nodes, parents):
+        return "OK (секции периода)", nodes, tables
+    cur.execute("SET LOCAL enable_seqscan = off")
+    try:
+        without_index, _nodes = full_scans(cur, query, params, sizes)
+    finally:
+        cur.execute("SET LOCAL enable_seqscan = on")
+    return ("ОШИБКА" if without_index else "ПРЕДУПРЕЖДЕНИЕ"), nodes, without_index or tables
+
+
+def describe(nodes, parents):
+    """Узлы плана для вывода; чтения секций одной таблицы собираются в один узел"""
+    counts = {}
+    for node, table, index in nodes:
+        key = (node, parents[table]) if table in parents else (node, index or table)
+        counts[key] = counts.get(key, 0) + (table in parents)
+    return ", ".join(f"{node} {name}" + (f" ({count} секц.)" if count else "")
+                     for (node, name), count in counts.items())
+
+
+def main():
+    configure_db()
+    db.USE_PREPARED_STATEMENTS = False  # в журнал попадает сам текст запроса
+    db.SLOW_QUERY_MS = 0  # в журнал попадает каждый запрос (журнал очищается перед каждым вызовом)
+    db.SLOW_QUERY_LOG_PARAMS = True  # параметры нужны для EXPLAIN
+
+    results = []
+    notes = []
+    print("Добавление проверочных данных и проверка планов...")
+    try:
+        # журнал выводит каждый запрос в консоль — здесь он не нужен
+        with contextlib.redirect_stdout(io.StringIO()), db.transaction(), db.get_cursor() as cur:
+            suppliers_table = db.get_schema(cur).resolve_table("suppliers", "suppliens", "supplier")
+            ids = seed(cur, suppliers_table)
+            cur.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            sizes = dict(cur.fetchall())
+            cur.execute(
+                """
+                SELECT c.relname, p.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE c.relkind = 'r'
+                """
+            )
+            parents = dict(cur.fetchall())
+            if "products_search_trgm_idx" not in db.get_schema(cur).indexes("products"):
+                FULL_LISTINGS.update(PRODUCT_SEARCHES)
+                notes.append("Нет индекса pg_trgm: поиск товаров читает весь каталог "
+                             "(установите postgresql-contrib и примените migrations/006_product_search.sql)")
+
+            for title, fn in scenario(*ids):
+                for query, params in capture_queries(fn):
+                    if query.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                        results.append((title, query) + check(cur, title, query, params, sizes, parents))
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    print()
+    for title, query, mark, nodes, tables in results:
+        print(f"{mark:<20} {title:<48} {describe(nodes, parents)}")
+        if mark in ("ОШИБКА", "ПРЕДУПРЕЖДЕНИЕ"):
+            print(f"{'':<20} полное чтение {', '.join(tables)}: {query[:150]}")
+    failed = sum(mark == "ОШИБКА" for _title, _query, mark, _nodes, _tables in results)
+    warned = sum(mark == "ПРЕДУПРЕЖДЕНИЕ" for _title, _query, mark, _nodes, _tables in results)
+    print()
+    for note in notes:
+        print(note)
+    print(f"Запросов: {len(results)}, без нужного индекса: {failed}, полное чтение по выбору планировщика: {warned}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Проверка разделения чтения и записи между основным сервером и репликой.
+
+Основной сервер задаётся как обычно (db.DB_CONFIG или PGHOST/PGPORT/...), реплика —
+переменными REPLICA_PGHOST, REPLICA_PGPORT (остальные параметры как у основного).
+Скрипт проверяет, что:
+  - отчётные функции читают с реплики;
+  - запись идёт на основной сервер, и сразу после неё чтение тоже идёт на основной;
+  - при отставании реплики больше REPLICA_MAX_LAG чтение уходит на основной сервер.
+В базе создаётся и сразу удаляется тестовая категория.
+
+    REPLICA_PGHOST=localhost REPLICA_PGPORT=5433 python benchmarks/check_replica.py
+"""
+import os
+import sys
+import time
+
+from common import configure_db, db
+
+
+def served_by(fn):
+    """Какой пул выдал подключение для вызова fn(): 'реплика', 'основной' или оба"""
+    replica_before = db.get_replica_pool().stats()["checkouts"]
+    primary_before = db.get_pool().stats()["checkouts"]
+    fn()
+    servers = []
+    if db.get_replica_pool().stats()["checkouts"] > replica_before:
+        servers.append("реплика")
+    if db.get_pool().stats()["checkouts"] > primary_before:
+        servers.append("основной")
+    return "+".join(servers) or "—"
+
+
+def main():
+    configure_db()
+    if not os.environ.get("REPLICA_PGHOST"):
+        raise SystemExit("Задайте реплику: REPLICA_PGHOST (и при необходимости REPLICA_PGPORT)")
+    db.REPLICA_CONFIG = dict(db.DB_CONFIG, host=os.environ["REPLICA_PGHOST"])
+    if os.environ.get("REPLICA_PGPORT"):
+        db.REPLICA_CONFIG["port"] = os.environ["REPLICA_PGPORT"]
+
+    lag = db.replica_lag()
+    print(f"Отставание реплики: {lag} с")
+    if lag is None:
+        raise SystemExit("Реплика недоступна")
+    # дальше отставание не перепроверяется, чтобы проверка не смешивалась с запросами
+    db.REPLICA_LAG_CHECK_INTERVAL = 3600
+
+    checks = []
+
+    def check(title, fn, expected):
+        actual = served_by(fn)
+        checks.append((title, expected, actual))
+
+    for fn in (db.get_products, db.get_inventory, db.get_suppliers,
+               db.get_sales_with_items, db.get_deliveries_with_items):
+        check(fn.__name__, fn, "реплика")
+    check("iter_sales_with_items", lambda: list(db.iter_sales_with_items()), "реплика")
+    check("get_categories (не переносится)", db.get_categories, "основной")
+
+    check("запись: add_category + delete_category",
+          lambda: db.delete_category(db.add_category("Проверка реплики")), "основной")
+    check("чтение сразу после записи", db.get_products, "основной")
+    time.sleep(db.REPLICA_STICKY_SECONDS + 0.5)
+    check(f"чтение через {db.REPLICA_STICKY_SECONDS} с после записи", db.get_products, "реплика")
+
+    max_lag = db.REPLICA_MAX_LAG
+    db.REPLICA_MAX_LAG = -1
+    db.replica_lag()
+    check("реплика отстаёт больше REPLICA_MAX_LAG", db.get_products, "основной")
+    db.REPLICA_MAX_LAG = max_lag
+
+    failed = 0
+    print()
+    print(f"{'проверка':<45} {'ожидалось':<10} {'фактически':<10}")
+    for title, expected, actual in checks:
+        mark = "OK" if expected == actual else "ОШИБКА"
+        failed += expected != actual
+        print(f"{title:<45} {expected:<10} {actual:<10} {mark}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Общие помощники для бенчмарков.
+
+Бенчмарки запускаются из корня проекта, например:
+    python benchmarks/bench_prepared.py
+Параметры подключения берутся из db.DB_CONFIG; их можно переопределить стандартными
+переменными окружения PostgreSQL: PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD.
+Бенчмарки, которые пишут в БД, после себя удаляют созданные строки, но запускать их
+лучше на копии базы.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+_ENV_TO_CONFIG = {
+    "PGHOST": "host",
+    "PGPORT": "port",
+    "PGDATABASE": "database",
+    "PGUSER": "user",
+    "PGPASSWORD": "password",
+}
+
+
+def configure_db():
+    """Переопределить db.DB_CONFIG из переменных окружения"""
+    for env_name, key in _ENV_TO_CONFIG.items():
+        if os.environ.get(env_name):
+            db.DB_CONFIG[key] = os.environ[env_name]
+
+
+def measure(fn, repeat=200, warmup=10):
+    """Замер времени вызова fn(): возвращает словарь со статистикой в миллисекундах"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "calls": repeat,
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def print_table(title, rows):
+    """Печать результатов: rows — список (название варианта, результат measure())"""
+    print()
+    print(title)
+    print(f"{'вариант':<40} {'вызовов':>8} {'сред., мс':>10} {'p50, мс':>9} {'p95, мс':>9}")
+    for name, result in rows:
+        print(f"{name:<40} {result['calls']:>8} {result['mean']:>10.3f} "
+              f"{result['p50']:>9.3f} {result['p95']:>9.3f}")
+
+
+def pick_products(limit, min_stock=0):
+    """ID товаров с остатком больше min_stock"""
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT p.id
+            FROM products p
+            JOIN warehouse w ON w.product_id = p.id
+            WHERE w.quantity > %s
+            ORDER BY p.id
+            LIMIT %s
+            """,
+            (min_stock, limit),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def delete_sales(sale_ids):
+    """Удалить тестовые продажи и вернуть проданный товар на склад"""
+    if not sale_ids:
+        return
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE warehouse w
+            SET quantity = w.quantity + si.quantity
+            FROM (
+                SELECT product_id, SUM(quantity) AS quantity
+                FROM sale_items
+                WHERE sale_id = ANY(%s)
+                GROUP BY product_id
+            ) si
+            WHERE w.product_id = si.product_id
+            """,
+            (list(sale_ids),),
+        )
+        cur.execute("DELETE FROM sale_items WHERE sale_id = ANY(%s)", (list(sale_ids),))
+        cur.execute("DELETE FROM sales WHERE id = ANY(%s)", (list(sale_ids),))
@@ -0,0 +1,191 @@
+"""
+Нагрузочная проверка оформления покупок: N касс одновременно вызывают db.create_sale
+с чеками из 1..--max-basket позиций. Часть позиций приходится на несколько «ходовых»
+товаров (--hot), остаток которых ограничен (--hot-stock): кассы соревнуются за
+последние единицы, и часть продаж должна завершаться отказом «Недостаточно товара».
+
+Печатает пропускную способность, задержку успешных продаж (p50/p95/p99), долю отказов
+по остатку и конфликтов (взаимные блокировки и т. п.), а затем сверяет склад: остаток
+каждого товара должен уменьшиться ровно на проданное количество и не уйти в минус.
+
+Кассы — потоки одного процесса с общим пулом (в приложении у каждой кассы свой
+процесс, но время уходит на сервер, а не на Python). После проверки продажи удаляются,
+остатки восстанавливаются.
+
+    python benchmarks/load_checkout.py [--terminals 8] [--seconds 10] [--hot-stock 500]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import random
+import statistics
+import threading
+import time
+
+import psycopg2
+
+from common import configure_db, db, delete_sales, pick_products
+
+# Остаток обычных товаров на время проверки — заведомо достаточный
+PLENTY = 1000000
+
+
+class Terminal(threading.Thread):
+    """Касса: оформляет случайные чеки до истечения deadline"""
+
+    def __init__(self, number, args, hot_ids, other_ids, deadline):
+        super().__init__(name=f"Касса {number}")
+        self.args = args
+        self.hot_ids = hot_ids
+        self.other_ids = other_ids
+        self.deadline = deadline
+        self.random = random.Random(number)
+        self.latencies = []
+        self.sale_ids = []
+        self.out_of_stock = 0
+        self.conflicts = 0
+        self.errors = []
+
+    def basket(self):
+        lines = {}
+        for _ in range(self.random.randint(1, self.args.max_basket)):
+            source = self.hot_ids if self.random.random() < self.args.hot_share else self.other_ids
+            lines[self.random.choice(source)] = self.random.randint(1, 2)
+        return [(product_id, quantity, None) for product_id, quantity in lines.items()]
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            basket = self.basket()
+            started = time.perf_counter()
+            try:
+                sale_id = db.create_sale(self.name, None, datetime.date.today(), basket)
+            except ValueError as e:
+                if not str(e).startswith("Недостаточно товара"):
+                    self.errors.append(str(e))
+                self.out_of_stock += 1
+                continue
+            except psycopg2.errors.TransactionRollbackError:
+                # взаимная блокировка или конфликт сериализации
+                self.conflicts += 1
+                continue
+            except Exception as e:
+                self.errors.append(f"{type(e).__name__}: {e}")
+                continue
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            self.sale_ids.append(sale_id)
+
+
+def stock_of(product_ids):
+    with db.get_cursor() as cur:
+        cur.execute(
+            "SELECT product_id, quantity FROM warehouse WHERE product_id = ANY(%s)",
+            (list(product_ids),),
+        )
+        return dict(cur.fetchall())
+
+
+def set_stock(quantities):
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE warehouse w
+            SET quantity = item.quantity
+            FROM unnest(%s::integer[], %s::integer[]) AS item (product_id, quantity)
+            WHERE w.product_id = item.product_id
+            """,
+            (list(quantities), list(quantities.values())),
+        )
+
+
+def sold_quantities(sale_ids):
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT product_id, SUM(quantity)
+            FROM sale_items
+            WHERE sale_id = ANY(%s)
+            GROUP BY product_id
+            """,
+            (list(sale_ids),),
+        )
+        return dict(cur.fetchall())
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terminals", type=int, default=8, help="одновременных касс")
+    parser.add_argument("--seconds", type=float, default=10, help="длительность проверки")
+    parser.add_argument("--products", type=int, default=100, help="товаров в проверке")
+    parser.add_argument("--hot", type=int, default=5, help="из них ходовых")
+    parser.add_argument("--hot-share", type=float, default=0.3, help="доля позиций с ходовыми товарами")
+    parser.add_argument("--hot-stock", type=int, default=500, help="остаток каждого ходового товара")
+    parser.add_argument("--max-basket", type=int, default=5, help="наибольшее число позиций в чеке")
+    args = parser.parse_args()
+    configure_db()
+    db.POOL_CONFIG["maxconn"] = max(db.POOL_CONFIG["maxconn"], args.terminals + 1)
+
+    product_ids = pick_products(args.products)
+    if len(product_ids) <= args.hot:
+        raise SystemExit(f"Нужно больше {args.hot} товаров со складской записью")
+    hot_ids, other_ids = product_ids[:args.hot], product_ids[args.hot:]
+    original = stock_of(product_ids)
+    initial = dict.fromkeys(other_ids, PLENTY)
+    initial.update(dict.fromkeys(hot_ids, args.hot_stock))
+    set_stock(initial)
+    db.get_pool().prefill(args.terminals)
+
+    terminals = []
+    try:
+        deadline = time.monotonic() + args.seconds
+        terminals = [Terminal(number, args, hot_ids, other_ids, deadline)
+                     for number in range(1, args.terminals + 1)]
+        started = time.perf_counter()
+        # db печатает каждую ошибку продажи — при тысячах отказов вывод не нужен
+        with contextlib.redirect_stdout(io.StringIO()):
+            for terminal in terminals:
+                terminal.start()
+            for terminal in terminals:
+                terminal.join()
+        elapsed = time.perf_counter() - started
+
+        sale_ids = [sale_id for terminal in terminals for sale_id in terminal.sale_ids]
+        latencies = sorted(ms for terminal in terminals for ms in terminal.latencies)
+        out_of_stock = sum(terminal.out_of_stock for terminal in terminals)
+        conflicts = sum(terminal.conflicts for terminal in terminals)
+        errors = [error for terminal in terminals for error in terminal.errors]
+        attempts = len(sale_ids) + out_of_stock + conflicts + len(errors)
+
+        final = stock_of(product_ids)
+        sold = sold_quantities(sale_ids)
+        mismatched = [product_id for product_id in product_ids
+                      if initial[product_id] - sold.get(product_id, 0) != final[product_id]]
+        negative = [product_id for product_id in product_ids if final[product_id] < 0]
+    finally:
+        delete_sales([sale_id for terminal in terminals for sale_id in terminal.sale_ids])
+        set_stock(original)
+
+    print()
+    print(f"Касс: {args.terminals}, секунд: {elapsed:.1f}, попыток: {attempts}")
+    print(f"Продаж: {len(sale_ids)} ({len(sale_ids) / elapsed:.1f} в секунду)")
+    if latencies:
+        print(f"Задержка продажи, мс: сред. {statistics.mean(latencies):.2f}, "
+              f"p50 {percentile(latencies, 0.50):.2f}, p95 {percentile(latencies, 0.95):.2f}, "
+              f"p99 {percentile(latencies, 0.99):.2f}, макс. {latencies[-1]:.2f}")
+    print(f"Отказов «недостаточно товара»: {out_of_stock} ({out_of_stock / max(attempts, 1):.1%})")
+    print(f"Конфликтов (взаимные блокировки): {conflicts} ({conflicts / max(attempts, 1):.1%})")
+    print(f"Ходовых товаров продано: {sum(sold.get(product_id, 0) for product_id in hot_ids)} "
+          f"из {args.hot * args.hot_stock}")
+    print(f"Расхождений остатка: {len(mismatched)}, отрицательных остатков: {len(negative)}")
+    for error in errors[:5]:
+        print(f"Ошибка: {error}")
+    if mismatched or negative or errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Загрузка товаров из таблицы CSV или XLSX (новые коллекции — сотни и тысячи артикулов).
+
+Файл построчно передаётся в PostgreSQL через COPY во временную таблицу и там проверяется
+целиком несколькими запросами (не указаны поля, повторы артикулов, неизвестные категории,
+не числа и размеры вне допустимого). Затем одной транзакцией товары с уже известными
+артикулами обновляются, новые добавляются вместе со строкой склада. Ошибки — по строкам
+файла — выводятся и сохраняются в отчёт CSV (по умолчанию рядом с файлом: ИМЯ.errors.csv).
+
+Первая строка файла — заголовки столбцов (русские или имена полей products):
+Наименование, Артикул, Категория, Цена — обязательные; Скидка, Длина, Ширина, Высота,
+Материал, Цвет, Остаток (начальный остаток нового товара) — нет. У обновляемых товаров
+меняются только поля, столбцы которых есть в файле; остаток не меняется (для этого — поставки).
+Подписчики db.add_product_listener о загруженных товарах не оповещаются (индекс поиска
+search_index увидит их после reload()).
+Для XLSX нужен пакет openpyxl (pip install openpyxl).
+    python catalog_import.py collection.xlsx                 # загрузить, если в файле нет ошибок
+    python catalog_import.py collection.csv --dry-run        # только проверить
+    python catalog_import.py collection.csv --skip-invalid   # загрузить строки без ошибок
+"""
+import argparse
+import csv
+import io
+import os
+
+import db
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+    openpyxl = None  # type: ignore[assignment]
+
+# Поля временной таблицы (после номера строки) и заголовки столбцов файла для них
+FIELDS = {
+    "name": ("наименование", "название"),
+    "sku": ("артикул",),
+    "category": ("категория",),
+    "price": ("цена",),
+    "discount_percent": ("скидка", "скидка %", "скидка, %"),
+    "length": ("длина",),
+    "width": ("ширина",),
+    "height": ("высота",),
+    "material": ("материал",),
+    "color": ("цвет",),
+    "quantity": ("остаток", "количество"),
+}
+
+REQUIRED_FIELDS = ("name", "sku", "category", "price")
+
+# Поля products, которые загружаются из файла как есть (category и quantity — отдельно)
+_PRODUCT_FIELDS = ("name", "price", "discount_percent", "length", "width", "height", "material", "color")
+
+_NUMERIC_FIELDS = ("price", "discount_percent", "length", "width", "height", "quantity")
+
+_STAGING_SQL = """
+    CREATE TEMP TABLE catalog_import (
+        line integer NOT NULL,
+        {columns}
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE catalog_import_errors (
+        line integer NOT NULL,
+        sku text,
+        message text NOT NULL
+    ) ON COMMIT DROP
+""".format(columns=",\n        ".join(f"{field} text" for field in FIELDS))
+
+# Неотрицательное число (после удаления пробелов и замены запятой на точку)
+_NUMBER_RE = "'^[0-9]+([.][0-9]+)?$'"
+
+
+def _bad_number(field, invalid_value):
+    """Условие: в поле не число или число, для которого invalid_value (SQL с {value}) истинно"""
+    value = f"{field}::numeric"
+    return f"CASE WHEN {field} ~ {_NUMBER_RE} THEN {invalid_value.format(value=value)} ELSE true END"
+
+
+# Проверки строк: (условие над catalog_import, сообщение — выражение SQL)
+_CHECKS = [
+    ("name IS NULL", "'Не указано наименование'"),
+    ("sku IS NULL", "'Не указан артикул'"),
+    ("category IS NULL", "'Не указана категория'"),
+    ("category IS NOT NULL AND NOT EXISTS (SELECT 1 FROM categories c WHERE c.name = i.category)",
+     "'Неизвестная категория: ' || category"),
+    ("price IS NULL", "'Не указана цена'"),
+    ("price IS NOT NULL AND " + _bad_number("price", "false"), "'Цена — не число: ' || price"),
+    ("discount_percent IS NOT NULL AND " + _bad_number("discount_percent", "{value} > 100"),
+     "'Скидка должна быть числом от 0 до 100: ' || discount_percent"),
+    ("length IS NOT NULL AND " + _bad_number("length", "{value} = 0"),
+     "'Длина должна быть положительным числом: ' || length"),
+    ("width IS NOT NULL AND " + _bad_number("width", "{value} = 0"),
+     "'Ширина должна быть положительным числом: ' || width"),
+    ("height IS NOT NULL AND " + _bad_number("height", "{value} = 0"),
+     "'Высота должна быть положительным числом: ' || height"),
+    ("quantity IS NOT NULL AND quantity !~ '^[0-9]{1,9}$'",
+     "'Остаток должен быть целым неотрицательным числом: ' || quantity"),
+]
+
+_DUPLICATES_SQL = """
+    INSERT INTO catalog_import_errors (line, sku, message)
+    SELECT i.line, i.sku, 'Артикул повторяется в строках ' || d.lines
+    FROM catalog_import i
+    JOIN (
+        SELECT sku, string_agg(line::text, ', ' ORDER BY line) AS lines
+        FROM catalog_import
+        WHERE sku IS NOT NULL
+        GROUP BY sku
+        HAVING count(*) > 1
+    ) d ON d.sku = i.sku
+"""
+
+_VALID_ROWS = "NOT EXISTS (SELECT 1 FROM catalog_import_errors e WHERE e.line = i.line)"
+
+
+class _CopyStream:
+    """Файл для COPY FROM STDIN: строки временной таблицы в формате CSV, по мере чтения"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            # None пишется пустым полем без кавычек — в COPY это NULL
+            self._writer.writerow(row)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def _cell(value):
+    """Значение ячейки строкой без пробелов по краям; пустое — None"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _read_csv(path):
+    """Строки файла CSV (разделитель ; или ,): (номер строки, список ячеек)"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        for cells in reader:
+            yield reader.line_num, cells
+
+
+def _read_xlsx(path):
+    """Строки первого листа книги XLSX: (номер строки, список ячеек)"""
+    if not HAS_OPENPYXL:
+        raise ValueError("Для файлов XLSX установите пакет openpyxl: pip install openpyxl")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for line, cells in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            yield line, cells
+    finally:
+        workbook.close()
+
+
+def _header_fields(header):
+    """Поле временной таблицы для каждого столбца файла (None — столбец не загружается)"""
+    names = {}
+    for field, titles in FIELDS.items():
+        names[field] = field
+        for title in titles:
+            names[title] = field
+    fields = [names.get((_cell(title) or "").lower()) for title in header]
+    missing = [FIELDS[field][0].capitalize() for field in REQUIRED_FIELDS if field not in fields]
+    if missing:
+        raise ValueError("В файле нет столбцов: " + ", ".join(missing))
+    return fields
+
+
+def read_rows(path):
+    """
+    Строки файла для временной таблицы: (поля файла, генератор [номер строки, *FIELDS]).
+    Пустые строки пропускаются.
+    """
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xlsm"):
+        lines = _read_xlsx(path)
+    else:
+        lines = _read_csv(path)
+    _line, header = next(lines, (None, None))
+    if header is None:
+        raise ValueError("Файл пуст")
+    fields = _header_fields(header)
+    positions = {field: position for position, field in enumerate(fields) if field is not None}
+
+    def rows():
+        for line, cells in lines:
+            values = [_cell(cells[positions[field]]) if field in positions and positions[field] < len(cells)
+                      else None
+                      for field in FIELDS]
+            if any(value is not None for value in values):
+                yield [line] + values
+
+    return set(positions), rows()
+
+
+def _length_checks(cur):
+    """Проверки длины строк и величины чисел по типам колонок products"""
+    cur.execute(
+        """
+        SELECT column_name, character_maximum_length, numeric_precision, numeric_scale
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'products'
+        """
+    )
+    checks = []
+    for column, max_length, precision, scale in cur.fetchall():
+        if column not in FIELDS:
+            continue
+        if max_length is not None:
+            checks.append((f"length({column}) > {max_length}",
+                           f"'{FIELDS[column][0].capitalize()} длиннее {max_length} символов'"))
+        elif precision is not None and scale is not None and column in _NUMERIC_FIELDS:
+            limit = 10 ** (precision - scale)
+            # не числа уже отмечены в _CHECKS
+            checks.append((f"CASE WHEN {column} ~ {_NUMBER_RE} THEN {column}::numeric >= {limit} ELSE false END",
+                           f"'{FIELDS[column][0].capitalize()} должна быть меньше {limit}: ' || {column}"))
+    return checks
+
+
+def import_catalog(path, skip_invalid=False, dry_run=False):
+    """
+    Загрузить товары из файла path (CSV или XLSX).
+    Если в файле есть ошибки, ничего не загружается, кроме случая skip_invalid=True —
+    тогда загружаются строки без ошибок. dry_run=True — только проверка.
+    Возвращает (добавлено, обновлено, ошибки), ошибки — список (номер строки, артикул, сообщение).
+    """
+    present, rows = read_rows(path)
+    with db.transaction(), db.get_cursor() as cur:
+        cur.execute(_STAGING_SQL)
+        cur.copy_expert(
+            f"COPY catalog_import (line, {', '.join(FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+            _CopyStream(rows),
+        )
+        # числа: без пробелов (в том числе неразрывных), с точкой вместо запятой
+        cur.execute(
+            "UPDATE catalog_import SET "
+            + ", ".join(f"{field} = replace(replace(replace({field}, ' ', ''), chr(160), ''), ',', '.')"
+                        for field in _NUMERIC_FIELDS)
+        )
+        # у временных таблиц нет статистики, без неё планировщик не знает, сколько строк в файле
+        cur.execute("ANALYZE catalog_import")
+        for condition, message in _CHECKS + _length_checks(cur):
+            cur.execute(
+                f"INSERT INTO catalog_import_errors (line, sku, message) "
+                f"SELECT line, sku, {message} FROM catalog_import i WHERE {condition}"
+            )
+        cur.execute(_DUPLICATES_SQL)
+        cur.execute("SELECT line, sku, message FROM catalog_import_errors ORDER BY line, message")
+        errors = cur.fetchall()
+        if dry_run or (errors and not skip_invalid):
+            return 0, 0, errors
+
+        # параллельный add_product не добавит товар с тем же артикулом, пока идёт загрузка
+        cur.execute("LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE")
+        updated_fields = [field for field in _PRODUCT_FIELDS if field in present]
+        assignments = ["category_id = c.id"] + [
+            f"{field} = COALESCE(i.{field}::numeric, 0)" if field == "discount_percent"
+            else f"{field} = i.{field}::numeric" if field in _NUMERIC_FIELDS
+            else f"{field} = i.{field}"
+            for field in updated_fields
+        ]
+        cur.execute(
+            f"""
+            UPDATE products p
+            SET {', '.join(assignments)}
+            FROM catalog_import i
+            JOIN categories c ON c.name = i.category
+            WHERE p.sku = i.sku AND {_VALID_ROWS}
+            """
+        )
+        updated = cur.rowcount
+        cur.execute(
+            f"""
+            WITH new_products AS (
+                INSERT INTO products
+                    (name, category_id, sku, price,
+                     length, width, height,
+                     material, color, discount_percent)
+                SELECT
+                    i.name, c.id, i.sku, i.price::numeric,
+                    i.length::numeric, i.width::numeric, i.height::numeric,
+                    i.material, i.color, COALESCE(i.discount_percent::numeric, 0)
+                FROM catalog_import i
+                JOIN categories c ON c.name = i.category
+                WHERE {_VALID_ROWS}
+                  AND NOT EXISTS (SELECT 1 FROM products p WHERE p.sku = i.sku)
+                ORDER BY i.line
+                RETURNING id, sku
+            )
+            INSERT INTO warehouse (product_id, quantity)
+            SELECT n.id, COALESCE(i.quantity::integer, 0)
+            FROM new_products n
+            JOIN catalog_import i ON i.sku = n.sku
+            """
+        )
+        inserted = cur.rowcount
+    return inserted, updated, errors
+
+
+def write_report(errors, path):
+    """Сохранить ошибки в CSV (разделитель ; — файл открывается в Excel)"""
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Строка", "Артикул", "Ошибка"])
+        writer.writerows(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка товаров из CSV или XLSX")
+    parser.add_argument("path", help="файл CSV или XLSX")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="загрузить строки без ошибок, даже если в других есть ошибки")
+    parser.add_argument("--report", help="файл отчёта об ошибках (по умолчанию ИМЯ.errors.csv рядом с файлом)")
+    args = parser.parse_args()
+
+    if db.BACKEND != "postgres":
+        raise SystemExit("Загрузка товаров работает только с PostgreSQL")
+
+    try:
+        inserted, updated, errors = import_catalog(args.path, args.skip_invalid, args.dry_run)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Ошибка загрузки: {e}")
+
+    for line, sku, message in errors[:50]:
+        print(f"Строка {line}" + (f" ({sku})" if sku else "") + f": {message}")
+    if len(errors) > 50:
+        print(f"... и ещё {len(errors) - 50}")
+    if errors:
+        report = args.report or os.path.splitext(args.path)[0] + ".errors.csv"
+        write_report(errors, report)
+        print(f"Ошибок: {len(errors)}, отчёт: {report}")
+
+    if args.dry_run:
+        print("Проверка завершена, товары не загружались")
+    elif errors and not args.skip_invalid:
+        raise SystemExit("Товары не загружены: исправьте ошибки или запустите с --skip-invalid")
+    else:
+        print(f"Добавлено товаров: {inserted}, обновлено: {updated}")
+
+
+if __name__ == "__main__":
+    main()
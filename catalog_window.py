@@ -1,10 +1,13 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QLineEdit, QMessageBox, QScrollArea,
                              QFrame, QGridLayout)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPixmap, QImage
 from functools import partial
 import db
+import db_async
+import refresh_scheduler
+import search_index
 import os
 from ui_styles import (BUTTON_STYLE, TITLE_STYLE, SUBTITLE_STYLE,
                       INFO_STYLE, ERROR_STYLE)
@@ -35,6 +38,12 @@ UTIL_PLACEHOLDER = """
         border: 1px solid #bbb;
     }
 """
+# Товаров на странице (кратно числу карточек в ряду)
+PAGE_SIZE = 30
+CARDS_PER_ROW = 3
+# За сколько пикселей до конца прокрутки подгружать следующую страницу
+LOAD_MORE_THRESHOLD = 400
+
 UTIL_LABEL = "font-size: 10pt; color: #333;"
 UTIL_FIELD = "font-size: 10pt; color: #000; border: none; background-color: transparent;"
 UTIL_INPUT = """
@@ -48,13 +57,18 @@ UTIL_INPUT = """
 
 
 class CatalogWindow(QWidget):
-    def __init__(self, parent, category_id=None, category_name=None, on_refresh=None, user_data=None):
+    def __init__(self, parent, category_id=None, category_name=None, user_data=None):
         super().__init__(parent)
         self.category_id = category_id
         self.category_name = category_name
-        self.on_refresh = on_refresh
         self.user = user_data or {}
         self.selected_product_id = None
+        self._load_task = None
+        self._card_count = 0        # сколько карточек уже показано
+        self._next_after = None     # курсор следующей страницы: (name, id) последнего товара
+        self._has_more = False
+        self._filtered = False      # показаны товары, найденные по мере ввода в поле поиска
+        self._filtered_rows = None  # строки показанных найденных товаров
 
         self.create_interface()
 
@@ -79,10 +93,11 @@ class CatalogWindow(QWidget):
         search_label.setStyleSheet(UTIL_LABEL)
         top_layout.addWidget(search_label)
         self.search_entry = QLineEdit()
-        self.search_entry.setPlaceholderText("артикул")
+        self.search_entry.setPlaceholderText("название или артикул")
         self.search_entry.setMinimumWidth(180)
         self.search_entry.setStyleSheet(UTIL_INPUT)
         self.search_entry.returnPressed.connect(self._on_search_enter)
+        self.search_entry.textChanged.connect(self.filter_products)
         top_layout.addWidget(self.search_entry)
 
         discounts_btn = QPushButton("Скидки")
@@ -99,6 +114,9 @@ class CatalogWindow(QWidget):
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         scroll_area.setFrameShape(QFrame.NoFrame)
         scroll_area.setStyleSheet("QScrollArea { background: #f5f5f5; border: none; }")
+        self.scroll_area = scroll_area
+        # следующая страница товаров подгружается при прокрутке к концу списка
+        scroll_area.verticalScrollBar().valueChanged.connect(self._maybe_load_more)
 
         self.products_widget = QWidget()
         self.products_widget.setStyleSheet("background: #f5f5f5;")
@@ -141,6 +159,11 @@ class CatalogWindow(QWidget):
 
         if self.category_id is not None:
             self.load_products()
+            refresh_scheduler.register(self, self.refresh_products, refresh_scheduler.PRODUCTS)
+            # индекс для поиска по мере ввода строится в фоне один раз на приложение
+            index = search_index.product_index()
+            if not index.loaded and not index.loading:
+                db_async.run_async(index.reload, on_error=self._on_index_error)
         else:
             no_category_label = QLabel("Выберите категорию для просмотра товаров")
             no_category_label.setStyleSheet(INFO_STYLE)
@@ -154,8 +177,63 @@ class CatalogWindow(QWidget):
         else:
             self.load_products()
 
-    def load_products(self):
-        """Загрузка товаров категории с учётом фильтра скидок."""
+    def _on_index_error(self, e):
+        """Индекс не загрузился: поиск по мере ввода не работает, Enter ищет на сервере"""
+        print(f"Ошибка загрузки индекса поиска: {e}")
+
+    def filter_products(self, text):
+        """
+        Поиск по мере ввода: карточки товаров категории, найденных в индексе в памяти
+        (search_index), без запроса к БД. Свежими строки индекса держат подписка на
+        изменения товаров и перечитывание в refresh_products. Пока индекс строится,
+        ищет только Enter.
+        """
+        if not text.strip():
+            if self._filtered:
+                self._filtered = False
+                self._filtered_rows = None
+                self.load_products()
+            return
+        index = search_index.product_index()
+        if self.category_id is None or not index.loaded:
+            return
+        if self._load_task is not None:
+            self._load_task.cancel()
+            self._load_task = None
+        found = index.search(text, category=self.category_name, limit=PAGE_SIZE)
+        if self._filtered and found == self._filtered_rows:
+            # те же товары с теми же ценами и остатками: карточки не пересоздаются
+            return
+        self._filtered = True
+        self._filtered_rows = found
+        self._clear_products()
+        self._card_count = 0
+        self._next_after = None
+        self.show_products(found)
+        # найденное показывается одной страницей, без подгрузки при прокрутке
+        self._has_more = False
+
+    def refresh_products(self):
+        """
+        Обновление по refresh_scheduler (продажи, поставки, правки товаров): индекс поиска
+        перечитывается в фоне — остатки, цены и товары других рабочих мест, — после чего
+        поиск по мере ввода повторяется; без поиска перечитывается страница.
+        """
+        index = search_index.product_index()
+        if index.loaded and not index.loading:
+            db_async.run_async(index.reload, owner=self, on_error=self._on_index_error,
+                               on_result=lambda _result: self._refilter())
+        elif self._filtered:
+            self._refilter()
+        if not self._filtered:
+            self.load_products()
+
+    def _refilter(self):
+        """Повторить поиск по мере ввода по текущему индексу"""
+        if self._filtered:
+            self.filter_products(self.search_entry.text())
+
+    def _clear_products(self):
         while self.products_layout.count():
             child = self.products_layout.takeAt(0)
             if child is not None:
@@ -163,33 +241,78 @@ class CatalogWindow(QWidget):
                 if w is not None:
                     w.deleteLater()
 
+    def load_products(self):
+        """Загрузка первой страницы товаров категории в фоне; пока идёт запрос, показывается заглушка."""
+        self._clear_products()
+        loading_label = QLabel(db_async.LOADING_TEXT)
+        loading_label.setStyleSheet(INFO_STYLE)
+        loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.products_layout.addWidget(loading_label, 0, 0, 1, CARDS_PER_ROW, Qt.AlignmentFlag.AlignCenter)
+
+        self._card_count = 0
+        self._next_after = None
+        self._has_more = False
+        self._load_page()
+
+    def _load_page(self):
+        """Запрос следующей страницы (после self._next_after)"""
+        if self._load_task is not None:
+            self._load_task.cancel()
+        self._load_task = db_async.run_async(
+            db.get_products_page, category_id=self.category_id,
+            after=self._next_after, limit=PAGE_SIZE, owner=self,
+            on_result=self.show_products, on_error=self.show_load_error,
+        )
+
+    def _maybe_load_more(self):
+        """Подгрузить следующую страницу, если прокрутка близко к концу или список не заполняет окно"""
+        if not self._has_more or (self._load_task is not None and not self._load_task.done):
+            return
+        # по высоте содержимого, а не по полосе прокрутки: её диапазон обновляется позже раскладки
+        visible_bottom = self.scroll_area.verticalScrollBar().value() + self.scroll_area.viewport().height()
+        if self.products_widget.sizeHint().height() - visible_bottom <= LOAD_MORE_THRESHOLD:
+            self._load_page()
+
+    def show_products(self, products):
+        """Добавление страницы карточек товаров в сетку."""
+        if self._card_count == 0:
+            self._clear_products()
         try:
-            products = db.get_products(category_id=self.category_id)
-            if not products:
+            if not products and self._card_count == 0:
                 no_products_label = QLabel("Товары не найдены")
                 no_products_label.setStyleSheet(INFO_STYLE)
                 no_products_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.products_layout.addWidget(no_products_label, 0, 0, 1, 3, Qt.AlignmentFlag.AlignCenter)
+                self.products_layout.addWidget(no_products_label, 0, 0, 1, CARDS_PER_ROW, Qt.AlignmentFlag.AlignCenter)
                 return
 
-            row, col, cols_per_row = 0, 0, 3
-            for i, product in enumerate(products):
-                if col >= cols_per_row:
-                    col = 0
-                    row += 1
+            for product in products:
                 try:
-                    card = self.create_product_card(product, card_index=i + 1)
+                    card = self.create_product_card(product, card_index=self._card_count + 1)
+                    row, col = divmod(self._card_count, CARDS_PER_ROW)
                     self.products_layout.addWidget(card, row, col)
-                    col += 1
+                    self._card_count += 1
                 except Exception as e:
-                    print(f"Ошибка при создании карточки товара {i}: {e}")
+                    print(f"Ошибка при создании карточки товара {self._card_count}: {e}")
+
+            self._has_more = len(products) == PAGE_SIZE
+            if products:
+                self._next_after = (products[-1][1], products[-1][0])
+            # после раскладки карточек: если прокручивать ещё нечего, нужна следующая страница
+            QTimer.singleShot(0, self._maybe_load_more)
         except Exception as e:
             import traceback
             print(traceback.format_exc())
-            QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки товаров: {e}")
-            err = QLabel(f"Ошибка загрузки товаров: {e}")
-            err.setStyleSheet(ERROR_STYLE)
-            self.products_layout.addWidget(err, 0, 0, 1, 3, Qt.AlignmentFlag.AlignCenter)
+            self.show_load_error(e)
+
+    def show_load_error(self, e):
+        """Сообщение об ошибке загрузки товаров."""
+        self._clear_products()
+        self._card_count = 0
+        self._has_more = False
+        QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки товаров: {e}")
+        err = QLabel(f"Ошибка загрузки товаров: {e}")
+        err.setStyleSheet(ERROR_STYLE)
+        self.products_layout.addWidget(err, 0, 0, 1, 3, Qt.AlignmentFlag.AlignCenter)
     
     def create_product_card(self, product, card_index=1):
         """Карточка товара: серый квадрат-заглушка с номером, справа — Наименование, Артикул, Цена, Скидка. Текст по левому краю."""
@@ -315,21 +438,14 @@ class CatalogWindow(QWidget):
         self.selected_product_id = product_id
     
     def search_product(self):
-        """Поиск товара по артикулу"""
-        sku = self.search_entry.text().strip()
-        if not sku:
-            QMessageBox.information(self, "Поиск", "Введите артикул для поиска")
+        """Поиск товаров по названию, артикулу, материалу и цвету — окно со списком результатов"""
+        query = self.search_entry.text().strip()
+        if not query:
+            QMessageBox.information(self, "Поиск", "Введите название или артикул для поиска")
             return
         
-        try:
-            product = db.search_product(sku)
-            if product:
-                search_window = SearchWindow(self.window(), product)
-                search_window.show()
-            else:
-                QMessageBox.information(self, "Поиск", f"Товар с артикулом {sku} не найден")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка поиска: {e}")
+        search_window = SearchWindow(self.window(), query)
+        search_window.show()
     
     def open_discounts_window(self):
         """Открыть окно со всеми товарами со скидками по выбранной категории (тот же стиль, что и каталог)."""
@@ -356,9 +472,7 @@ class CatalogWindow(QWidget):
                 db.delete_product(self.selected_product_id)
                 QMessageBox.information(self, "Успех", "Товар удален")
                 self.selected_product_id = None
-                self.load_products()
-                if self.on_refresh:
-                    self.on_refresh()
+                refresh_scheduler.request(refresh_scheduler.PRODUCTS)
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось удалить товар: {e}")
     
@@ -380,7 +494,8 @@ class CatalogWindow(QWidget):
             product = db.get_product_by_id(product_id)
             if product:
                 edit_window = EditProductWindow(self.window(), product, 
-                                              on_success=self.load_products)
+                                              on_success=partial(refresh_scheduler.request,
+                                                                 refresh_scheduler.PRODUCTS))
                 edit_window.show()
             else:
                 QMessageBox.critical(self, "Ошибка", "Товар не найден")
@@ -395,5 +510,6 @@ class CatalogWindow(QWidget):
         
         add_window = AddProductWindow(self.window(), 
                                     category_id=self.category_id,
-                                    on_success=self.load_products)
+                                    on_success=partial(refresh_scheduler.request,
+                                                       refresh_scheduler.PRODUCTS))
         add_window.show()
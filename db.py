@@ -1,5 +1,18 @@
+import atexit
+import itertools
+import json
+import re
+import threading
+import time
 import psycopg2
+import psycopg2.errors
 from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from db_cancel import QueryCancelled, QueryScope
+from db_pool import ConnectionPool, PooledConnection
+from db_schema import SchemaCache
+from db_stats import InstrumentedCursor, QueryStats
 
 # Параметры подключения к PostgreSQL (ранее config.py)
 DB_CONFIG = {
@@ -10,41 +23,687 @@ DB_CONFIG = {
     "password": "1234",
 }
 
+# Реплика только для чтения (потоковая репликация PostgreSQL), те же ключи, что в DB_CONFIG.
+# Отчётные запросы (товары, склад, продажи, поставки, поставщики) читаются с неё.
+# None — все запросы идут на основной сервер.
+REPLICA_CONFIG = None
+
+# Если реплика отстаёт больше чем на REPLICA_MAX_LAG секунд или недоступна,
+# чтение идёт с основного сервера; отставание проверяется раз в REPLICA_LAG_CHECK_INTERVAL секунд
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 2
+
+# После записи чтение в течение REPLICA_STICKY_SECONDS идёт с основного сервера,
+# чтобы пользователь сразу видел свои изменения
+REPLICA_STICKY_SECONDS = 5
+
+# Параметры пула подключений (для основного сервера и для реплики)
+POOL_CONFIG = {
+    "minconn": 1,
+    "maxconn": 10,
+    "idle_timeout": 300,           # сек: простаивающие подключения сверх minconn закрываются
+    "health_check_interval": 30,   # сек: давно не использованное подключение проверяется SELECT 1
+    "acquire_timeout": 10,         # сек: ожидание свободного подключения
+}
+
+# Сколько подключений открывать заранее, пока открыто окно входа (db.warm_up)
+WARMUP_CONNECTIONS = 3
+
+# Миграции схемы (migrations/) применяются при обновлении программы командой
+# python migrate.py, когда остальные рабочие места закрыты: они меняют таблицы
+# под блокировками, а старые версии программы с новой схемой не работают.
+# True — применять их при запуске приложения, до окна входа (установка на одном
+# компьютере); если миграция не применилась, приложение не запускается.
+AUTO_MIGRATE = False
+
+# Частые запросы выполняются как серверные подготовленные (PREPARE / EXECUTE)
+USE_PREPARED_STATEMENTS = True
+
+# Сводки продаж (get_sales_summary) читают дневные итоги daily_sales_rollup,
+# если таблица есть (migrations/004_daily_sales_rollup.sql, см. sales_rollup.py)
+USE_SALES_ROLLUP = True
+
+# На сколько месяцев вперёд создавать секции продаж при запуске (db.warm_up),
+# если продажи секционированы (migrations/005_sales_partitions.sql, см. sales_archive.py)
+SALES_PARTITIONS_AHEAD = 3
+
+# Сколько строк за раз читают потоковые запросы iter_* (серверный курсор)
+STREAM_CHUNK_SIZE = 500
+
+# Как часто (сек) сверять закэшированную структуру БД с сервером
+SCHEMA_CHECK_INTERVAL = 300
+
+# Запросы дольше SLOW_QUERY_MS (мс) попадают в журнал медленных запросов (db.slow_queries())
+SLOW_QUERY_MS = 200
+SLOW_QUERY_LOG_SIZE = 100
+# Писать в журнал медленных запросов и параметры (в них имена пользователей и покупателей) —
+# только для отладки
+SLOW_QUERY_LOG_PARAMS = False
+
 # Путь к папке с фотографиями товаров
 PHOTO_BASE_PATH = "photo"
 
+# Хранилище данных: "postgres" (DB_CONFIG) или "sqlite" — встроенная база в файле
+# SQLITE_PATH для работы на одном компьютере без сервера (см. db_sqlite.py и set_backend)
+BACKEND = "postgres"
+SQLITE_PATH = "furniture_store.db"
+
 # ==================================================
 # CONNECTION
 # ==================================================
 
+_pool = None
+_replica_pool = None
+_pool_lock = threading.Lock()
+
+# Открытая в текущем потоке транзакция db.transaction(): (подключение, только чтение)
+_local = threading.local()
+
+
+def _connect(config=None):
+    """Открытие нового подключения к базе данных (используется пулом)"""
+    config = config or DB_CONFIG
+    conn = psycopg2.connect(
+        host=config["host"],
+        database=config["database"],
+        user=config["user"],
+        password=config["password"],
+        port=str(config["port"]),
+        connection_factory=PooledConnection,
+        cursor_factory=InstrumentedCursor,
+    )
+    conn.set_client_encoding("UTF8")
+    conn.autocommit = True
+    conn.query_stats = _query_stats
+    return conn
+
+
+def get_pool():
+    """Общий для процесса пул подключений (создаётся при первом обращении)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect, **POOL_CONFIG)
+    return _pool
+
+
+def pool_stats():
+    """Статистика пула подключений"""
+    return get_pool().stats()
+
+
+def warm_up(connections=None):
+    """
+    Подготовка к работе после входа: заранее открывает подключения пула
+    (по умолчанию WARMUP_CONNECTIONS), загружает в кэш структуру БД и создаёт
+    секции продаж на ближайшие месяцы (SALES_PARTITIONS_AHEAD).
+    Вызывается в фоне, пока пользователь вводит логин и пароль.
+    """
+    get_pool().prefill(connections or WARMUP_CONNECTIONS)
+    get_schema()
+    ensure_sales_partitions()
+
+
+def close_pool():
+    """Закрытие всех подключений пула (при выходе из приложения)"""
+    global _pool, _replica_pool
+    with _pool_lock:
+        pools = (_pool, _replica_pool)
+        _pool = _replica_pool = None
+    for pool in pools:
+        if pool is not None:
+            pool.closeall()
+
+
+atexit.register(close_pool)
+
+
 @contextmanager
-def get_connection():
-    """Получение подключения к базе данных"""
+def get_connection(replica=False):
+    """
+    Получение подключения к базе данных из пула.
+    Внутри db.transaction() возвращается подключение этой транзакции.
+    replica=True — запрос только читает и может выполняться на реплике (см. REPLICA_CONFIG).
+    """
+    current = getattr(_local, "transaction", None)
+    if current is not None:
+        yield current[0]
+        return
+
+    pool = _read_pool() if replica else get_pool()
+    scope = getattr(_local, "scope", None)
     conn = None
     try:
-        conn = psycopg2.connect(
-            host=DB_CONFIG["host"],
-            database=DB_CONFIG["database"],
-            user=DB_CONFIG["user"],
-            password=DB_CONFIG["password"],
-            port=str(DB_CONFIG["port"]),
-        )
-        conn.set_client_encoding("UTF8")
-        conn.autocommit = True
+        conn = pool.getconn()
+        if scope is not None:
+            scope.attach(conn, conn.cancel)
+        _set_statement_timeout(conn, scope.timeout if scope is not None else None)
         yield conn
+    except (QueryCancelled, psycopg2.errors.QueryCanceled):
+        raise
     except Exception as e:
         print(f"Ошибка подключения к БД: {e}")
         raise
     finally:
         if conn is not None:
-            conn.close()
+            if scope is not None:
+                scope.detach(conn)
+            pool.putconn(conn)
+
+
+def _set_statement_timeout(conn, timeout):
+    """statement_timeout подключения: timeout сек или значение сервера по умолчанию (None)"""
+    timeout_ms = int(timeout * 1000) if timeout else None
+    if getattr(conn, "statement_timeout", None) == timeout_ms:
+        return
+    with conn.cursor() as cur:
+        if timeout_ms is None:
+            cur.execute("RESET statement_timeout")
+        else:
+            cur.execute("SELECT set_config('statement_timeout', %s, false)", (str(timeout_ms),))
+    conn.statement_timeout = timeout_ms
+
+
+@contextmanager
+def query_scope(scope):
+    """
+    Запросы db.* внутри блока относятся к группе scope (db_cancel.QueryScope):
+    scope.cancel() из другого потока прерывает их на сервере, а каждый запрос
+    выполняется не дольше scope.timeout секунд. Прерванный запрос — ошибка QueryCancelled.
+
+        scope = db.QueryScope(timeout=30)
+        with db.query_scope(scope):   # в рабочем потоке
+            rows = db.get_sales_with_items(date_from, date_to)
+        ...
+        scope.cancel()                # в GUI-потоке, если результат больше не нужен
+    """
+    previous = getattr(_local, "scope", None)
+    _local.scope = scope
+    try:
+        yield scope
+    except psycopg2.errors.QueryCanceled as e:
+        if scope.cancelled:
+            raise QueryCancelled("Запрос отменён") from e
+        raise QueryCancelled(f"Запрос выполнялся дольше {scope.timeout} с и был прерван") from e
+    finally:
+        _local.scope = previous
+
+
+@contextmanager
+def get_cursor(replica=False):
+    """
+    Курсор на подключении из пула; вызов учитывается в статистике db.stats().
+    replica=True — только чтение, можно выполнять на реплике.
+    """
+    function = _query_stats.caller()
+    _query_stats.slow_query_ms = SLOW_QUERY_MS
+    _query_stats.log_params = SLOW_QUERY_LOG_PARAMS
+    started = time.perf_counter()
+    cur = None
+    error = False
+    try:
+        with get_connection(replica) as conn:
+            with conn.cursor() as cur:
+                cur.function = function
+                yield cur
+    except BaseException:
+        error = True
+        raise
+    finally:
+        if cur is not None and cur.wrote:
+            _note_write()
+        _query_stats.record_call(function, (time.perf_counter() - started) * 1000, cur, error)
 
 
 @contextmanager
-def get_cursor():
+def transaction(readonly=False):
+    """
+    Единица работы: все вызовы db.* внутри блока выполняются на одном подключении
+    и фиксируются одним COMMIT, а при исключении откатываются целиком.
+
+        with db.transaction():
+            product_id = db.add_product(...)
+            db.update_product(product_id, ...)
+
+    Вне блока каждый запрос фиксируется сам по себе (autocommit).
+    Вложенный transaction() присоединяется к внешней транзакции.
+    Подписчики на изменения товаров (add_product_listener) узнают о них после COMMIT.
+
+    readonly=True — транзакция только для чтения (BEGIN READ ONLY): все запросы видят
+    один снимок данных, а сервер не выделяет ей номер транзакции и не пишет WAL при COMMIT.
+    """
+    current = getattr(_local, "transaction", None)
+    if current is not None:
+        if current[1] and not readonly:
+            raise ValueError("Нельзя изменять данные внутри транзакции только для чтения")
+        yield current[0]
+        return
+
     with get_connection() as conn:
+        conn.autocommit = False
+        if readonly:
+            conn.readonly = True
+        _local.transaction = (conn, readonly)
+        _local.changed_products = changed_products = []
+        try:
+            yield conn
+            conn.commit()
+            if not readonly:
+                _note_write()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            _local.transaction = None
+            if not conn.closed:
+                conn.readonly = None
+                conn.autocommit = True
+    _notify_product_listeners(changed_products)
+
+
+_stream_names = itertools.count(1)
+
+
+def stream_query(sql, params=None, chunk_size=None, replica=False):
+    """
+    Выполнить запрос через именованный (серверный) курсор и отдавать строки
+    списками по chunk_size (по умолчанию STREAM_CHUNK_SIZE).
+    В памяти клиента одновременно находится не больше одной порции строк.
+
+    Пока генератор не исчерпан или не закрыт, он держит подключение пула
+    и открытую транзакцию только для чтения (внутри db.transaction() — её подключение).
+    replica=True — запрос можно выполнять на реплике.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    with get_connection(replica) as conn:
+        own_transaction = conn.autocommit
+        if own_transaction:
+            # серверный курсор живёт только внутри транзакции
+            conn.autocommit = False
+            conn.readonly = True
+        cur = None
+        error = False
+        try:
+            with conn.cursor(name=f"stream_{next(_stream_names)}") as cur:
+                cur.function = _query_stats.caller()
+                cur.itersize = chunk_size
+                cur.execute(sql, params)
+                scope = getattr(_local, "scope", None)
+                while True:
+                    if scope is not None:
+                        # между порциями сервер не выполняет запрос, отмену проверяем сами
+                        scope.check()
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+        except Exception:
+            error = True
+            raise
+        finally:
+            if cur is not None:
+                # время, пока потребитель разбирал порции, не учитывается
+                _query_stats.record_call(cur.function, cur.exec_ms, cur, error)
+            if own_transaction and not conn.closed:
+                conn.rollback()
+                conn.readonly = None
+                conn.autocommit = True
+
+
+# ==================================================
+# READ REPLICA
+# ==================================================
+
+# Отставание реплики: SELECT ниже выполняется на реплике, 0 — реплика догнала основной сервер,
+# NULL — реплика не получает WAL (нет процесса walreceiver или он не в состоянии streaming):
+# тогда принятое совпадает с применённым, но отставание растёт.
+# Состояние walreceiver видно ролям с pg_read_all_stats; другим — только наличие процесса.
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver
+            WHERE pid IS NOT NULL AND COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_replica_state = {
+    "checked_at": None,   # time.monotonic() последней проверки отставания
+    "lag": None,          # отставание, сек; None — реплика недоступна
+    "last_write": None,   # time.monotonic() последней записи из этого процесса
+}
+_replica_check_lock = threading.Lock()
+
+
+def get_replica_pool():
+    """Пул подключений к реплике (None, если REPLICA_CONFIG не задан)"""
+    global _replica_pool
+    if REPLICA_CONFIG is None:
+        return None
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                config = dict(REPLICA_CONFIG)
+                _replica_pool = ConnectionPool(lambda: _connect(config), **POOL_CONFIG)
+    return _replica_pool
+
+
+def replica_lag():
+    """Текущее отставание реплики в секундах; None — реплика не настроена или недоступна"""
+    pool = get_replica_pool()
+    if pool is None:
+        return None
+    conn = None
+    try:
+        conn = pool.getconn()
         with conn.cursor() as cur:
-            yield cur
+            cur.execute(_REPLICA_LAG_SQL)
+            lag = cur.fetchone()[0]
+        if lag is None:
+            print("Реплика недоступна: не получает WAL с основного сервера")
+        else:
+            lag = float(lag)
+    except Exception as e:
+        print(f"Реплика недоступна: {e}")
+        lag = None
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
+    _replica_state["lag"] = lag
+    _replica_state["checked_at"] = time.monotonic()
+    return lag
+
+
+def _note_write():
+    """Запомнить момент записи: ближайшие чтения пойдут на основной сервер"""
+    _replica_state["last_write"] = time.monotonic()
+
+
+def _read_pool():
+    """Пул для запроса только на чтение: реплика, если она настроена, свежая и не нужна своя запись"""
+    if REPLICA_CONFIG is None:
+        return get_pool()
+    now = time.monotonic()
+    last_write = _replica_state["last_write"]
+    if last_write is not None and now - last_write < REPLICA_STICKY_SECONDS:
+        return get_pool()
+    checked_at = _replica_state["checked_at"]
+    if checked_at is None or now - checked_at >= REPLICA_LAG_CHECK_INTERVAL:
+        # проверяет один поток, остальные пользуются прошлым результатом
+        if _replica_check_lock.acquire(blocking=checked_at is None):
+            try:
+                replica_lag()
+            finally:
+                _replica_check_lock.release()
+    lag = _replica_state["lag"]
+    if lag is None or lag > REPLICA_MAX_LAG:
+        return get_pool()
+    return get_replica_pool()
+
+
+# ==================================================
+# QUERY STATS
+# ==================================================
+
+# Служебные функции db.py: запросы из них относятся к вызвавшей их функции
+_query_stats = QueryStats(
+    module_name=__name__,
+    skip=("get_connection", "get_cursor", "transaction", "stream_query",
+          "execute_prepared", "get_schema", "invalidate_schema"),
+    slow_query_ms=SLOW_QUERY_MS,
+    slow_log_size=SLOW_QUERY_LOG_SIZE,
+    log_params=SLOW_QUERY_LOG_PARAMS,
+)
+
+
+def stats():
+    """
+    Статистика обращений к БД по функциям db.*: имя функции -> словарь
+    calls, errors, queries, rows, bytes, wall_total_ms, wall_mean_ms, wall_max_ms,
+    exec_total_ms, exec_mean_ms, p50_ms, p95_ms, p99_ms, histogram.
+    wall — полное время вызова, exec — время выполнения запросов на сервере (с сетью).
+    """
+    return _query_stats.snapshot()
+
+
+def slow_queries():
+    """
+    Журнал медленных запросов (новые первыми): time, function, ms, query, params
+    (params — None, если не задан SLOW_QUERY_LOG_PARAMS)
+    """
+    return _query_stats.slow_queries()
+
+
+def reset_stats():
+    """Обнулить статистику и журнал медленных запросов"""
+    _query_stats.reset()
+
+
+# ==================================================
+# SCHEMA
+# ==================================================
+
+_schema_cache = SchemaCache(SCHEMA_CHECK_INTERVAL)
+
+
+def get_schema(cur=None):
+    """
+    Закэшированная структура БД (db_schema.SchemaSnapshot): таблицы, колонки, индексы.
+    Если передан курсор, при необходимости обновления используется он,
+    так что отдельное подключение не открывается.
+    """
+    _schema_cache.check_interval = SCHEMA_CHECK_INTERVAL
+    if cur is not None:
+        return _schema_cache.get(cur)
+    with get_cursor() as own_cur:
+        return _schema_cache.get(own_cur)
+
+
+def invalidate_schema():
+    """Сбросить кэш структуры БД (например, после миграции)"""
+    _schema_cache.invalidate()
+
+
+# ==================================================
+# PREPARED STATEMENTS
+# ==================================================
+
+# Колонки строки товара (get_products, search_product, get_product_by_id и др.)
+_PRODUCT_COLUMNS = """
+    id, name, sku, category, material, color, length, width, height,
+    price, discount_percent, stock_quantity, current_price, photo_path
+"""
+
+
+def _product_sql(*conditions, order_by=None):
+    """
+    Запрос к представлению product_catalog (migrations/001_product_catalog.sql):
+    товар с категорией, остатком и ценой со скидкой current_price.
+    conditions — условия WHERE с плейсхолдерами %s, order_by — выражение ORDER BY.
+    """
+    sql = "SELECT " + _PRODUCT_COLUMNS + " FROM product_catalog"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        sql += " ORDER BY " + order_by
+    return sql
+
+
+# имя -> (типы параметров, текст запроса с плейсхолдерами %s)
+PREPARED_STATEMENTS = {
+    "user_by_username": ("text", """
+        SELECT id, username, full_name, role, password
+        FROM users
+        WHERE username = %s
+    """),
+    "session_context": ("text", """
+        SELECT
+            u.id, u.username, u.full_name, u.role, u.password,
+            e.id, e.last_name, e.first_name, e.middle_name, e.position,
+            (SELECT COALESCE(json_agg(json_build_array(c.id, c.name) ORDER BY c.name), '[]')
+             FROM categories c) AS categories
+        FROM users u
+        LEFT JOIN employees e ON e.user_id = u.id
+        WHERE u.username = %s
+        LIMIT 1
+    """),
+    "product_by_id": ("integer", _product_sql("id = %s")),
+    "product_by_sku": ("text", _product_sql("sku = %s")),
+    # Складские строки товаров чека блокируются до конца продажи, и остаток читается
+    # уже после блокировки: две кассы не продадут последний товар дважды. Блокировки
+    # берутся в порядке product_id (так же их берёт create_delivery), поэтому кассы
+    # с пересекающимися чеками ждут друг друга, а не попадают во взаимную блокировку;
+    # продажи разных товаров друг другу не мешают. Сами товары не блокируются —
+    # их можно редактировать во время продажи.
+    "sale_products": ("integer[], integer[]", """
+        WITH stock AS MATERIALIZED (
+            SELECT w.product_id, w.quantity
+            FROM warehouse w
+            WHERE w.product_id = ANY(%s::integer[])
+            ORDER BY w.product_id
+            FOR NO KEY UPDATE
+        )
+        SELECT
+            p.id,
+            p.price,
+            p.discount_percent,
+            COALESCE(stock.quantity, 0) AS stock
+        FROM products p
+        LEFT JOIN stock ON stock.product_id = p.id
+        WHERE p.id = ANY(%s::integer[])
+    """),
+    "sale_items_insert": ("integer, integer[], integer[], numeric[], numeric[]", """
+        INSERT INTO sale_items (sale_id, product_id, quantity, sale_price, discount_percent)
+        SELECT %s, item.product_id, item.quantity, item.sale_price, item.discount_percent
+        FROM unnest(%s::integer[], %s::integer[], %s::numeric[], %s::numeric[])
+            AS item (product_id, quantity, sale_price, discount_percent)
+    """),
+    # то же для секционированных продаж: позиция хранит дату продажи (ключ секции)
+    "sale_items_insert_dated": ("integer, date, integer[], integer[], numeric[], numeric[]", """
+        INSERT INTO sale_items (sale_id, sale_date, product_id, quantity, sale_price, discount_percent)
+        SELECT %s, %s, item.product_id, item.quantity, item.sale_price, item.discount_percent
+        FROM unnest(%s::integer[], %s::integer[], %s::numeric[], %s::numeric[])
+            AS item (product_id, quantity, sale_price, discount_percent)
+    """),
+    "warehouse_decrement": ("integer[], integer[]", """
+        UPDATE warehouse w
+        SET quantity = COALESCE(w.quantity, 0) - item.quantity,
+            last_updated = NOW()
+        FROM unnest(%s::integer[], %s::integer[]) AS item (product_id, quantity)
+        WHERE w.product_id = item.product_id
+    """),
+    # поставка целиком — один запрос: шапка с суммой, строки, склад и розничные цены;
+    # складские строки блокируются в порядке product_id, как в sale_products
+    "delivery_insert": ("integer[], integer[], numeric[], integer, date, integer[], numeric[]", """
+        WITH item AS (
+            SELECT *
+            FROM unnest(%s::integer[], %s::integer[], %s::numeric[])
+                AS item (product_id, quantity, purchase_price)
+        ),
+        delivery AS (
+            INSERT INTO deliveries (supplier_id, delivery_date, total_amount)
+            SELECT %s, %s, COALESCE(SUM(item.quantity * item.purchase_price), 0)
+            FROM item
+            RETURNING id
+        ),
+        lines AS (
+            INSERT INTO delivery_items (delivery_id, product_id, quantity, purchase_price)
+            SELECT delivery.id, item.product_id, item.quantity, item.purchase_price
+            FROM delivery, item
+        ),
+        stock AS (
+            INSERT INTO warehouse (product_id, quantity, last_updated)
+            SELECT item.product_id, SUM(item.quantity), NOW()
+            FROM item
+            GROUP BY item.product_id
+            ORDER BY item.product_id
+            ON CONFLICT (product_id)
+            DO UPDATE SET
+                quantity = warehouse.quantity + EXCLUDED.quantity,
+                last_updated = NOW()
+        ),
+        prices AS (
+            UPDATE products p
+            SET price = retail.price
+            FROM unnest(%s::integer[], %s::numeric[]) AS retail (product_id, price)
+            WHERE p.id = retail.product_id
+        )
+        SELECT id FROM delivery
+    """),
+}
+
+# Ошибки, после которых подготовленный запрос нужно подготовить заново:
+# запрос не найден на сервере или его план устарел после изменения схемы
+_STALE_PREPARED_ERRORS = (
+    psycopg2.errors.InvalidSqlStatementName,
+    psycopg2.errors.FeatureNotSupported,
+)
+
+
+def _to_server_placeholders(sql):
+    """Замена плейсхолдеров %s на $1, $2, ... (и %% на %) для PREPARE"""
+    counter = itertools.count(1)
+    return re.sub(r"%%|%s", lambda m: "%" if m.group() == "%%" else f"${next(counter)}", sql)
+
+
+def execute_prepared(cur, name, params=()):
+    """
+    Выполнить запрос из PREPARED_STATEMENTS.
+    На каждом подключении пула запрос подготавливается один раз (PREPARE), дальше
+    выполняется только EXECUTE.
+    Если подготовленный запрос пропал или устарел, он подготавливается заново;
+    внутри открытой транзакции ошибка пробрасывается дальше, а запрос удаляется
+    на сервере при возврате подключения в пул (после отката) и подготавливается
+    заново при следующем вызове.
+    """
+    types, sql = PREPARED_STATEMENTS[name]
+    conn = cur.connection
+    prepared = getattr(conn, "prepared", None)
+    if not USE_PREPARED_STATEMENTS or prepared is None:
+        cur.execute(sql, params)
+        return
+
+    execute_sql = "EXECUTE " + name
+    if params:
+        execute_sql += " (" + ", ".join(["%s"] * len(params)) + ")"
+    prepare_sql = f"PREPARE {name} ({types}) AS {_to_server_placeholders(sql)}"
+
+    if name in prepared:
+        try:
+            cur.execute(execute_sql, params)
+            return
+        except _STALE_PREPARED_ERRORS:
+            prepared.discard(name)
+            if not conn.autocommit:
+                # транзакция прервана: запрос удаляется после отката, при возврате в пул
+                conn.deallocate.add(name)
+                raise
+            _deallocate(cur, name)
+    # PREPARE — отдельным запросом: откат транзакции и ошибка EXECUTE его не отменяют,
+    # и запрос должен быть записан в conn.prepared, даже если EXECUTE не выполнится
+    try:
+        cur.execute(prepare_sql)
+    except psycopg2.errors.DuplicatePreparedStatement:
+        # запрос уже есть на сервере, но не записан (подготовлен в обход execute_prepared);
+        # в транзакции он удаляется после отката и подготавливается заново при следующем вызове
+        if not conn.autocommit:
+            conn.deallocate.add(name)
+            raise
+    prepared.add(name)
+    cur.execute(execute_sql, params)
+
+
+def _deallocate(cur, name):
+    """Удалить подготовленный запрос на сервере, если он там ещё есть"""
+    try:
+        cur.execute("DEALLOCATE " + name)
+    except psycopg2.errors.InvalidSqlStatementName:
+        pass
 
 
 # ==================================================
@@ -58,14 +717,30 @@ def get_cursor():
 def get_user_by_username(username):
     """Получить пользователя по имени для проверки пароля"""
     with get_cursor() as cur:
-        cur.execute("""
-            SELECT id, username, full_name, role, password
-            FROM users
-            WHERE username = %s
-        """, (username,))
+        execute_prepared(cur, "user_by_username", (username,))
         return cur.fetchone()
 
 
+def get_session_context(username):
+    """
+    Всё, что нужно сразу после входа, одним запросом:
+      user       — как get_user_by_username: (id, username, full_name, role, password);
+      employee   — как get_employee_by_user_id или None;
+      categories — как get_categories.
+    Возвращает None, если пользователя нет.
+    """
+    with get_cursor() as cur:
+        execute_prepared(cur, "session_context", (username,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return {
+        "user": tuple(row[0:5]),
+        "employee": tuple(row[5:10]) if row[5] is not None else None,
+        "categories": [tuple(category) for category in row[10]],
+    }
+
+
 # ==================================================
 # CATEGORIES
 # ==================================================
@@ -96,40 +771,53 @@ def delete_category(category_id):
 # PRODUCTS
 # ==================================================
 
+# Подписчики на изменения товаров (add_product_listener)
+_product_listeners = []
+
+
+def add_product_listener(listener):
+    """
+    Подписаться на изменения товаров через add_product, update_product и delete_product:
+    listener(product_id) вызывается после фиксации изменения, в потоке, который его сделал.
+    Действует при любом хранилище (set_backend).
+    """
+    _product_listeners.append(listener)
+
+
+def remove_product_listener(listener):
+    """Отписаться от изменений товаров"""
+    if listener in _product_listeners:
+        _product_listeners.remove(listener)
+
+
+def _notify_product_listeners(product_ids):
+    """Сообщить подписчикам о зафиксированных изменениях товаров"""
+    for product_id in product_ids:
+        for listener in list(_product_listeners):
+            try:
+                listener(product_id)
+            except Exception as e:
+                print(f"Ошибка обработчика изменения товара {product_id}: {e}")
+
+
+def _product_changed(product_id):
+    """
+    Товар изменён: внутри db.transaction() подписчики узнают об этом после COMMIT,
+    без транзакции (каждый оператор фиксируется сам) — сразу
+    """
+    if getattr(_local, "transaction", None) is None:
+        _notify_product_listeners([product_id])
+    else:
+        _local.changed_products.append(product_id)
+
+
 def get_products(category_id=None):
     """Получение товаров с полной информацией, включая остатки и цену со скидкой"""
-    with get_cursor() as cur:
-        base_sql = """
-            SELECT
-                p.id,
-                p.name,
-                p.sku,
-                c.name AS category,
-                p.material,
-                p.color,
-                p.length,
-                p.width,
-                p.height,
-                p.price,
-                p.discount_percent,
-                COALESCE(w.quantity, 0) AS stock_quantity,
-                CASE
-                    WHEN p.discount_percent IS NOT NULL AND p.discount_percent > 0
-                        THEN ROUND(p.price * (1 - p.discount_percent / 100.0), 2)
-                    ELSE p.price
-                END AS current_price,
-                p.photo_path
-            FROM products p
-            LEFT JOIN categories c ON c.id = p.category_id
-            LEFT JOIN warehouse w ON w.product_id = p.id
-        """
-        params = []
+    with get_cursor(replica=True) as cur:
         if category_id:
-            base_sql += " WHERE p.category_id = %s"
-            params.append(category_id)
-
-        base_sql += " ORDER BY p.name"
-        cur.execute(base_sql, params)
+            cur.execute(_product_sql("category_id = %s", order_by="name"), (category_id,))
+        else:
+            cur.execute(_product_sql(order_by="name"))
         return cur.fetchall()
 
 
@@ -145,7 +833,7 @@ def add_product(name, category_id, sku, price,
     Args:
         photo_path: Путь к фотографии товара (относительный, например photo/{product_id}/filename.jpg)
     """
-    with get_cursor() as cur:
+    with transaction(), get_cursor() as cur:
         # проверка уникальности артикула
         cur.execute("SELECT id FROM products WHERE sku = %s", (sku,))
         if cur.fetchone():
@@ -177,6 +865,7 @@ def add_product(name, category_id, sku, price,
             """,
             (product_id,),
         )
+        _product_changed(product_id)
 
         return product_id
 
@@ -191,7 +880,7 @@ def update_product(product_id, name, category_id, sku, price,
     Args:
         photo_path: Путь к фотографии товара (относительный, например photo/{product_id}/filename.jpg)
     """
-    with get_cursor() as cur:
+    with transaction(), get_cursor() as cur:
         cur.execute(
             "SELECT id FROM products WHERE sku = %s AND id <> %s",
             (sku, product_id),
@@ -221,15 +910,39 @@ def update_product(product_id, name, category_id, sku, price,
              material, color, discount_percent, photo_path,
              product_id),
         )
+        _product_changed(product_id)
 
 
 def delete_product(product_id):
-    """Удаление товара"""
-    with get_cursor() as cur:
+    """Удаление товара (остатки и сам товар удаляются в одной транзакции)"""
+    with transaction(), get_cursor() as cur:
         # Удаляем складские остатки
         cur.execute("DELETE FROM warehouse WHERE product_id = %s", (product_id,))
         # Удаляем товар
         cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        _product_changed(product_id)
+
+
+def get_products_page(category_id=None, after=None, limit=50):
+    """
+    Страница товаров в порядке (name, id): не больше limit строк, идущих после
+    товара after = (name, id); after=None — первая страница.
+    Строки как у get_products; курсор следующей страницы — (row[1], row[0]) последней строки.
+    Каждая страница читается по индексу (category_id, name, id), сколько бы товаров
+    ни было в категории.
+    """
+    conditions = []
+    params = []
+    if category_id:
+        conditions.append("category_id = %s")
+        params.append(category_id)
+    if after is not None:
+        conditions.append("(name, id) > (%s, %s)")
+        params.extend(after)
+    params.append(limit)
+    with get_cursor(replica=True) as cur:
+        cur.execute(_product_sql(*conditions, order_by="name, id") + " LIMIT %s", params)
+        return cur.fetchall()
 
 
 def get_products_by_category(category_id):
@@ -240,63 +953,68 @@ def get_products_by_category(category_id):
 def search_product(sku):
     """Поиск товара по артикулу"""
     with get_cursor() as cur:
-        cur.execute("""
-            SELECT
-                p.id,
-                p.name,
-                p.sku,
-                c.name AS category,
-                p.material,
-                p.color,
-                p.length,
-                p.width,
-                p.height,
-                p.price,
-                p.discount_percent,
-                COALESCE(w.quantity, 0) AS stock_quantity,
-                CASE
-                    WHEN p.discount_percent IS NOT NULL AND p.discount_percent > 0
-                        THEN ROUND(p.price * (1 - p.discount_percent / 100.0), 2)
-                    ELSE p.price
-                END AS current_price,
-                p.photo_path
-            FROM products p
-            LEFT JOIN categories c ON c.id = p.category_id
-            LEFT JOIN warehouse w ON w.product_id = p.id
-            WHERE p.sku = %s
-        """, (sku,))
+        execute_prepared(cur, "product_by_sku", (sku,))
         return cur.fetchone()
 
 
+# Текст товара для поиска; то же выражение — в индексе migrations/006_product_search.sql
+_PRODUCT_SEARCH_TEXT = (
+    "lower(coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' "
+    "|| coalesce(material, '') || ' ' || coalesce(color, ''))"
+)
+
+# Индекс pg_trgm по _PRODUCT_SEARCH_TEXT
+_PRODUCT_SEARCH_INDEX = "products_search_trgm_idx"
+
+
+def _like_pattern(word):
+    """Шаблон LIKE «содержит word» (символы % и _ в word ищутся как есть)"""
+    return "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def search_products(text, category_id=None, limit=50, offset=0):
+    """
+    Нечёткий поиск товаров по названию, артикулу, материалу и цвету.
+    Каждое слово text должно встретиться в товаре подстрокой или похожим словом
+    (опечатка, другое окончание). Сначала идёт товар с артикулом, равным text,
+    затем — по убыванию сходства, при равном сходстве — по названию.
+    Строки как у get_products; offset и limit — страница результатов.
+    С индексом pg_trgm (migrations/006_product_search.sql) поиск не читает весь каталог;
+    без него каждое слово ищется только подстрокой в тех же полях (похожие слова
+    не находятся), а после товара с равным артикулом строки идут по названию.
+    """
+    words = text.lower().split()
+    if not words:
+        return []
+    conditions = []
+    params = []
+    with get_cursor(replica=True) as cur:
+        fuzzy = _PRODUCT_SEARCH_INDEX in get_schema(cur).indexes("products")
+        for word in words:
+            if fuzzy:
+                conditions.append(f"({_PRODUCT_SEARCH_TEXT} LIKE %s OR %s <%% {_PRODUCT_SEARCH_TEXT})")
+                params.extend((_like_pattern(word), word))
+            else:
+                conditions.append(f"{_PRODUCT_SEARCH_TEXT} LIKE %s")
+                params.append(_like_pattern(word))
+        if category_id:
+            conditions.append("category_id = %s")
+            params.append(category_id)
+        order_by = "lower(sku) = %s DESC, "
+        params.append(text.strip().lower())
+        if fuzzy:
+            order_by += f"word_similarity(%s, {_PRODUCT_SEARCH_TEXT}) DESC, "
+            params.append(" ".join(words))
+        order_by += "name, id"
+        params.extend((limit, offset))
+        cur.execute(_product_sql(*conditions, order_by=order_by) + " LIMIT %s OFFSET %s", params)
+        return cur.fetchall()
+
+
 def get_discounted_products():
     """Получение товаров со скидками"""
     with get_cursor() as cur:
-        cur.execute("""
-            SELECT
-                p.id,
-                p.name,
-                p.sku,
-                c.name AS category,
-                p.material,
-                p.color,
-                p.length,
-                p.width,
-                p.height,
-                p.price,
-                p.discount_percent,
-                COALESCE(w.quantity, 0) AS stock_quantity,
-                CASE
-                    WHEN p.discount_percent IS NOT NULL AND p.discount_percent > 0
-                        THEN ROUND(p.price * (1 - p.discount_percent / 100.0), 2)
-                    ELSE p.price
-                END AS current_price,
-                p.photo_path
-            FROM products p
-            LEFT JOIN categories c ON c.id = p.category_id
-            LEFT JOIN warehouse w ON w.product_id = p.id
-            WHERE p.discount_percent IS NOT NULL AND p.discount_percent > 0
-            ORDER BY p.discount_percent DESC
-        """)
+        cur.execute(_product_sql("discount_percent > 0", order_by="discount_percent DESC"))
         return cur.fetchall()
 
 
@@ -305,64 +1023,18 @@ def get_discounted_products_by_category(category_id):
     if category_id is None:
         return get_discounted_products()
     with get_cursor() as cur:
-        cur.execute("""
-            SELECT
-                p.id,
-                p.name,
-                p.sku,
-                c.name AS category,
-                p.material,
-                p.color,
-                p.length,
-                p.width,
-                p.height,
-                p.price,
-                p.discount_percent,
-                COALESCE(w.quantity, 0) AS stock_quantity,
-                CASE
-                    WHEN p.discount_percent IS NOT NULL AND p.discount_percent > 0
-                        THEN ROUND(p.price * (1 - p.discount_percent / 100.0), 2)
-                    ELSE p.price
-                END AS current_price,
-                p.photo_path
-            FROM products p
-            LEFT JOIN categories c ON c.id = p.category_id
-            LEFT JOIN warehouse w ON w.product_id = p.id
-            WHERE p.discount_percent IS NOT NULL AND p.discount_percent > 0
-              AND p.category_id = %s
-            ORDER BY p.discount_percent DESC
-        """, (category_id,))
+        cur.execute(
+            _product_sql("discount_percent > 0", "category_id = %s",
+                         order_by="discount_percent DESC"),
+            (category_id,),
+        )
         return cur.fetchall()
 
 
 def get_product_by_id(product_id):
     """Получение товара по ID"""
     with get_cursor() as cur:
-        cur.execute("""
-            SELECT
-                p.id,
-                p.name,
-                p.sku,
-                c.name AS category,
-                p.material,
-                p.color,
-                p.length,
-                p.width,
-                p.height,
-                p.price,
-                p.discount_percent,
-                COALESCE(w.quantity, 0) AS stock_quantity,
-                CASE
-                    WHEN p.discount_percent IS NOT NULL AND p.discount_percent > 0
-                        THEN ROUND(p.price * (1 - p.discount_percent / 100.0), 2)
-                    ELSE p.price
-                END AS current_price,
-                p.photo_path
-            FROM products p
-            LEFT JOIN categories c ON c.id = p.category_id
-            LEFT JOIN warehouse w ON w.product_id = p.id
-            WHERE p.id = %s
-        """, (product_id,))
+        execute_prepared(cur, "product_by_id", (product_id,))
         return cur.fetchone()
 
 
@@ -372,7 +1044,7 @@ def get_product_by_id(product_id):
 
 def get_inventory():
     """Получение данных склада: id, name, sku, quantity, last_updated, category, price, photo_path"""
-    with get_cursor() as cur:
+    with get_cursor(replica=True) as cur:
         cur.execute("""
             SELECT
                 p.id,
@@ -398,50 +1070,46 @@ def get_inventory():
 def get_suppliers():
     """Получение списка поставщиков из БД.
     Возвращает список кортежей: (id, name, city, phone, email, inn, created_at, updated_at)."""
-    table = _suppliers_table()
-    with get_cursor() as cur:
+    with get_cursor(replica=True) as cur:
+        table = _suppliers_table(cur)
         try:
             cur.execute("SELECT * FROM " + table + " ORDER BY name")
         except psycopg2.ProgrammingError:
+            invalidate_schema()
             return []
         rows = cur.fetchall()
         if not rows or not cur.description:
             return []
         col_names = [d[0].lower() for d in cur.description]
-        result = []
-        for r in rows:
-            row_dict = dict(zip(col_names, r))
-            result.append((
-                row_dict.get("id"),
-                row_dict.get("name"),
-                row_dict.get("city"),
-                row_dict.get("phone"),
-                row_dict.get("email"),
-                row_dict.get("inn"),
-                row_dict.get("created_at"),
-                row_dict.get("updated_at"),
-            ))
-        return result
-
-
-def _suppliers_table():
-    """Возвращает имя таблицы поставщиков: ту, которая есть в БД."""
-    with get_cursor() as cur:
-        for table in ("suppliers", "suppliens", "supplier"):
-            try:
-                cur.execute("SELECT 1 FROM " + table + " LIMIT 1")
-                return table
-            except psycopg2.ProgrammingError as e:
-                if "does not exist" not in str(e).lower():
-                    raise
-                continue
+        return [_supplier_row(dict(zip(col_names, r))) for r in rows]
+
+
+def _supplier_row(row_dict):
+    """Строка поставщика в формате get_suppliers() из словаря «колонка -> значение»"""
+    return (
+        row_dict.get("id"),
+        row_dict.get("name"),
+        row_dict.get("city"),
+        row_dict.get("phone"),
+        row_dict.get("email"),
+        row_dict.get("inn"),
+        row_dict.get("created_at"),
+        row_dict.get("updated_at"),
+    )
+
+
+def _suppliers_table(cur):
+    """Возвращает имя таблицы поставщиков: ту, которая есть в БД (по кэшу структуры БД)."""
+    table = get_schema(cur).resolve_table("suppliers", "suppliens", "supplier")
+    if table is None:
         raise ValueError("Таблица поставщиков (suppliers / suppliens / supplier) не найдена в БД")
+    return table
 
 
 def add_supplier(name, city, phone, inn, email=None):
     """Добавление нового поставщика в ту же таблицу, из которой читаются поставщики."""
-    table = _suppliers_table()
     with get_cursor() as cur:
+        table = _suppliers_table(cur)
         cur.execute(
             """
             INSERT INTO """ + table + """ (name, city, phone, inn, email)
@@ -458,8 +1126,8 @@ def add_supplier(name, city, phone, inn, email=None):
 
 def delete_supplier_by_inn(inn: str) -> int:
     """Удаление поставщика по ИНН. Возвращает количество удалённых строк."""
-    table = _suppliers_table()
     with get_cursor() as cur:
+        table = _suppliers_table(cur)
         cur.execute(
             "DELETE FROM " + table + " WHERE inn = %s",
             (inn,),
@@ -469,8 +1137,8 @@ def delete_supplier_by_inn(inn: str) -> int:
 
 def delete_supplier_by_id(supplier_id) -> int:
     """Удаление поставщика по ID. Возвращает количество удалённых строк."""
-    table = _suppliers_table()
     with get_cursor() as cur:
+        table = _suppliers_table(cur)
         cur.execute(
             "DELETE FROM " + table + " WHERE id = %s",
             (supplier_id,),
@@ -497,30 +1165,41 @@ def get_deliveries():
         return cur.fetchall()
 
 
+_DELIVERIES_WITH_ITEMS_SQL = """
+    SELECT
+        d.id AS delivery_id,
+        d.delivery_date,
+        s.name AS supplier_name,
+        d.total_amount,
+        p.id AS product_id,
+        p.name AS product_name,
+        p.sku,
+        di.quantity,
+        di.purchase_price,
+        p.photo_path
+    FROM deliveries d
+    JOIN suppliers s ON s.id = d.supplier_id
+    JOIN delivery_items di ON di.delivery_id = d.id
+    JOIN products p ON p.id = di.product_id
+    ORDER BY d.delivery_date DESC, d.id DESC, p.name
+"""
+
+
 def get_deliveries_with_items():
     """Получение всех поставок с детальной информацией о товарах"""
-    with get_cursor() as cur:
-        cur.execute("""
-            SELECT
-                d.id AS delivery_id,
-                d.delivery_date,
-                s.name AS supplier_name,
-                d.total_amount,
-                p.id AS product_id,
-                p.name AS product_name,
-                p.sku,
-                di.quantity,
-                di.purchase_price,
-                p.photo_path
-            FROM deliveries d
-            JOIN suppliers s ON s.id = d.supplier_id
-            JOIN delivery_items di ON di.delivery_id = d.id
-            JOIN products p ON p.id = di.product_id
-            ORDER BY d.delivery_date DESC, d.id DESC, p.name
-        """)
+    with get_cursor(replica=True) as cur:
+        cur.execute(_DELIVERIES_WITH_ITEMS_SQL)
         return cur.fetchall()
 
 
+def iter_deliveries_with_items(chunk_size=None):
+    """
+    То же, что get_deliveries_with_items, но порциями по chunk_size строк
+    (генератор списков строк, серверный курсор)
+    """
+    yield from stream_query(_DELIVERIES_WITH_ITEMS_SQL, chunk_size=chunk_size, replica=True)
+
+
 def create_delivery(supplier_id, delivery_date, items):
     """
     Создание поставки.
@@ -534,76 +1213,30 @@ def create_delivery(supplier_id, delivery_date, items):
     После оформления поставки розничная цена товара (products.price) устанавливается
     на 20% выше закупочной: price = ROUND(purchase_price * 1.2, 2).
     Цены не берутся из БД — только из введённой пользователем закупочной цены.
-    """
-    with get_connection() as conn:
-        try:
-            with conn.cursor() as cur:
-                # создаём поставку с временной суммой 0
-                cur.execute(
-                    """
-                    INSERT INTO deliveries (supplier_id, delivery_date, total_amount)
-                    VALUES (%s, %s, 0)
-                    RETURNING id
-                    """,
-                    (supplier_id, delivery_date),
-                )
-                row = cur.fetchone()
-                if row is None:
-                    raise ValueError("Не удалось создать поставку")
-                delivery_id = row[0]
-
-                total_amount = 0
-
-                for product_id, quantity, purchase_price in items:
-                    line_amount = quantity * purchase_price
-                    total_amount += line_amount
-
-                    # строки поставки
-                    cur.execute(
-                        """
-                        INSERT INTO delivery_items
-                            (delivery_id, product_id, quantity, purchase_price)
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (delivery_id, product_id, quantity, purchase_price),
-                    )
-
-                    # обновляем склад (увеличиваем остаток)
-                    # Используем UPSERT: создаем запись, если её нет, или обновляем существующую
-                    cur.execute(
-                        """
-                        INSERT INTO warehouse (product_id, quantity, last_updated)
-                        VALUES (%s, %s, NOW())
-                        ON CONFLICT (product_id) 
-                        DO UPDATE SET 
-                            quantity = warehouse.quantity + EXCLUDED.quantity,
-                            last_updated = NOW()
-                        """,
-                        (product_id, quantity),
-                    )
-
-                    # розничная цена = закупочная + 20% (не берём из БД)
-                    retail_price = round(float(purchase_price) * 1.2, 2)
-                    cur.execute(
-                        "UPDATE products SET price = %s WHERE id = %s",
-                        (retail_price, product_id),
-                    )
-
-                # обновляем общую сумму поставки
-                cur.execute(
-                    """
-                    UPDATE deliveries
-                    SET total_amount = %s
-                    WHERE id = %s
-                    """,
-                    (total_amount, delivery_id),
-                )
 
-            conn.commit()
-            return delivery_id
-        except Exception:
-            conn.rollback()
-            raise
+    Вся поставка записывается одним запросом, сколько бы в ней ни было строк.
+    """
+    product_ids = [product_id for product_id, _quantity, _price in items]
+    quantities = [quantity for _product_id, quantity, _price in items]
+    purchase_prices = [purchase_price for _product_id, _quantity, purchase_price in items]
+
+    # розничная цена = закупочная + 20% (не берём из БД);
+    # если товар встречается несколько раз, действует последняя строка
+    retail_prices = {
+        product_id: round(float(purchase_price) * 1.2, 2)
+        for product_id, _quantity, purchase_price in items
+    }
+
+    with transaction(), get_cursor() as cur:
+        execute_prepared(cur, "delivery_insert", (
+            product_ids, quantities, purchase_prices,
+            supplier_id, delivery_date,
+            list(retail_prices), list(retail_prices.values()),
+        ))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось создать поставку")
+        return row[0]
 
 
 def create_sale(customer_name, employee_id, sale_date, items):
@@ -619,117 +1252,118 @@ def create_sale(customer_name, employee_id, sale_date, items):
     Args:
         customer_name: ФИО покупателя (VARCHAR(150))
         employee_id: ID сотрудника из таблицы employees
+
+    Число запросов не зависит от размера чека: одно чтение всех товаров,
+    вставка продажи, одна вставка всех позиций и одно обновление склада.
     """
-    with get_connection() as conn:
-        try:
-            with conn.cursor() as cur:
-                total_amount = 0
-
-                # предварительная проверка остатков и расчет сумм
-                for product_id, quantity, discount_override in items:
-                    cur.execute(
-                        """
-                        SELECT
-                            p.price,
-                            p.discount_percent,
-                            COALESCE(w.quantity, 0) AS stock
-                        FROM products p
-                        LEFT JOIN warehouse w ON w.product_id = p.id
-                        WHERE p.id = %s
-                        """,
-                        (product_id,),
-                    )
-                    row = cur.fetchone()
-                    if not row:
-                        raise ValueError(f"Товар id={product_id} не найден")
-
-                    price, base_discount, stock = row
-                    if stock < quantity:
-                        raise ValueError(
-                            f"Недостаточно товара id={product_id} на складе "
-                            f"(доступно {stock}, нужно {quantity})"
-                        )
-
-                    # Конвертируем Decimal в float для расчетов
-                    price_float = float(price) if price is not None else 0.0
-                    base_discount_float = float(base_discount) if base_discount is not None else 0.0
-                    
-                    # текущая скидка = либо override, либо discount_percent в товаре
-                    discount = discount_override if discount_override is not None else base_discount_float
-                    current_price = price_float * (1 - discount / 100.0) if discount > 0 else price_float
-                    line_amount = round(current_price * quantity, 2)
-                    total_amount += line_amount
-
-                # создаём запись о продаже
-                cur.execute(
-                    """
-                    INSERT INTO sales (sale_date, total_amount, customer_name, employee_id)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                    """,
-                    (sale_date, total_amount, customer_name, employee_id),
+    # один товар может встретиться в чеке несколько раз: остаток проверяется по сумме
+    needed = {}
+    for product_id, quantity, _discount_override in items:
+        needed[product_id] = needed.get(product_id, 0) + quantity
+
+    with transaction(), get_cursor() as cur:
+        execute_prepared(cur, "sale_products", (sorted(needed), sorted(needed)))
+        products = {row[0]: row[1:] for row in cur.fetchall()}
+
+        total_amount = 0
+        lines = []
+        for product_id, quantity, discount_override in items:
+            if product_id not in products:
+                raise ValueError(f"Товар id={product_id} не найден")
+
+            price, base_discount, stock = products[product_id]
+            if stock < needed[product_id]:
+                raise ValueError(
+                    f"Недостаточно товара id={product_id} на складе "
+                    f"(доступно {stock}, нужно {needed[product_id]})"
                 )
-                row = cur.fetchone()
-                if row is None:
-                    raise ValueError("Не удалось создать продажу")
-                sale_id = row[0]
-
-                # создаём позиции продажи и уменьшаем остатки
-                for product_id, quantity, discount_override in items:
-                    cur.execute(
-                        """
-                        SELECT
-                            p.price,
-                            p.discount_percent
-                        FROM products p
-                        WHERE p.id = %s
-                        """,
-                        (product_id,),
-                    )
-                    price_row = cur.fetchone()
-                    if price_row is None:
-                        raise ValueError(f"Товар id={product_id} не найден")
-                    price, base_discount = price_row
-
-                    # Конвертируем Decimal в float для расчетов
-                    price_float = float(price) if price is not None else 0.0
-                    base_discount_float = float(base_discount) if base_discount is not None else 0.0
-                    
-                    discount = discount_override if discount_override is not None else base_discount_float
-                    sale_price = price_float * (1 - discount / 100.0) if discount > 0 else price_float
-                    line_amount = round(sale_price * quantity, 2)
-
-                    cur.execute(
-                        """
-                        INSERT INTO sale_items
-                            (sale_id, product_id, quantity, sale_price, discount_percent)
-                        VALUES (%s, %s, %s, %s, %s)
-                        """,
-                        (sale_id, product_id, quantity, sale_price, discount),
-                    )
-
-                    # уменьшаем остаток на складе
-                    cur.execute(
-                        """
-                        UPDATE warehouse
-                        SET quantity = COALESCE(quantity, 0) - %s,
-                            last_updated = NOW()
-                        WHERE product_id = %s
-                        """,
-                        (quantity, product_id),
-                    )
 
-            conn.commit()
-            return sale_id
-        except Exception:
-            conn.rollback()
+            # Конвертируем Decimal в float для расчетов
+            price_float = float(price) if price is not None else 0.0
+            base_discount_float = float(base_discount) if base_discount is not None else 0.0
+
+            # текущая скидка = либо override, либо discount_percent в товаре
+            discount = discount_override if discount_override is not None else base_discount_float
+            sale_price = price_float * (1 - discount / 100.0) if discount > 0 else price_float
+            total_amount += round(sale_price * quantity, 2)
+            lines.append((product_id, quantity, round(sale_price, 2), discount))
+
+        # создаём запись о продаже
+        cur.execute(
+            """
+            INSERT INTO sales (sale_date, total_amount, customer_name, employee_id)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+            """,
+            (sale_date, total_amount, customer_name, employee_id),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось создать продажу")
+        sale_id = row[0]
+
+        # все позиции продажи одним запросом
+        product_ids, quantities, sale_prices, discounts = (
+            [list(column) for column in zip(*lines)] if lines else ([], [], [], [])
+        )
+        try:
+            if _sale_items_dated(cur):
+                execute_prepared(
+                    cur, "sale_items_insert_dated",
+                    (sale_id, sale_date, product_ids, quantities, sale_prices, discounts),
+                )
+            else:
+                execute_prepared(
+                    cur, "sale_items_insert", (sale_id, product_ids, quantities, sale_prices, discounts),
+                )
+        except (psycopg2.errors.NotNullViolation, psycopg2.errors.UndefinedColumn):
+            # секционирование продаж (миграция 005) применили или откатили, пока приложение
+            # работало: следующая продажа перечитает структуру БД, не дожидаясь SCHEMA_CHECK_INTERVAL
+            invalidate_schema()
             raise
 
+        # уменьшаем остатки на складе
+        execute_prepared(cur, "warehouse_decrement", (list(needed), list(needed.values())))
+
+        return sale_id
+
 
 # ==================================================
 # SALES
 # ==================================================
 
+def _sale_items_dated(cur=None):
+    """
+    Есть ли у позиций продаж своя дата: продажи секционированы по месяцам
+    (migrations/005_sales_partitions.sql). Тогда условие на дату добавляется и к позициям,
+    чтобы запрос читал только секции своего периода.
+    """
+    return get_schema(cur).has_column("sale_items", "sale_date")
+
+
+def ensure_sales_partitions(months_ahead=None):
+    """
+    Создать секции продаж на текущий и следующие months_ahead месяцев
+    (по умолчанию SALES_PARTITIONS_AHEAD). Возвращает число созданных месяцев;
+    0 — если все уже есть или продажи не секционированы.
+    """
+    if months_ahead is None:
+        months_ahead = SALES_PARTITIONS_AHEAD
+    with get_cursor() as cur:
+        if not get_schema(cur).has_table("sales_default"):
+            return 0
+        cur.execute(
+            """
+            SELECT create_sales_partitions(
+                current_date,
+                (date_trunc('month', current_date) + make_interval(months => %s))::date
+            )
+            """,
+            (months_ahead,),
+        )
+        return cur.fetchone()[0]
+
+
 def get_sales():
     """Получение списка продаж"""
     with get_cursor() as cur:
@@ -751,10 +1385,14 @@ def get_sales():
         return cur.fetchall()
 
 
-def get_sale_items(sale_id):
-    """Получение позиций продажи"""
+def get_sale_items(sale_id, sale_date=None):
+    """
+    Получение позиций продажи.
+    sale_date — дата продажи, если известна: у секционированных продаж позиции ищутся
+    только в секции её месяца, а не во всех.
+    """
     with get_cursor() as cur:
-        cur.execute("""
+        query = """
             SELECT
                 p.name,
                 si.quantity,
@@ -763,38 +1401,238 @@ def get_sale_items(sale_id):
             FROM sale_items si
             JOIN products p ON p.id = si.product_id
             WHERE si.sale_id = %s
-        """, (sale_id,))
+        """
+        params = [sale_id]
+        if sale_date is not None and _sale_items_dated(cur):
+            query += " AND si.sale_date = %s"
+            params.append(sale_date)
+        cur.execute(query, params)
         return cur.fetchall()
 
 
-def get_sales_with_items(date_from=None, date_to=None):
-    """Получение всех позиций продаж с информацией о продаже для отображения в таблице"""
-    with get_cursor() as cur:
-        query = """
-            SELECT
-                p.name AS product_name,
-                si.quantity,
-                si.sale_price,
-                s.sale_date,
-                (si.sale_price * si.quantity) AS line_total,
-                s.customer_name
-            FROM sale_items si
-            JOIN products p ON p.id = si.product_id
-            JOIN sales s ON s.id = si.sale_id
-        """
-        params = []
-        if date_from or date_to:
-            conditions = []
+def _sales_with_items_query(date_from=None, date_to=None, dated_items=False):
+    """
+    SQL и параметры позиций продаж за период.
+    dated_items — у позиций есть sale_date (см. _sale_items_dated): период задаётся
+    и для них, и запрос читает только секции этих месяцев.
+    """
+    query = """
+        SELECT
+            p.name AS product_name,
+            si.quantity,
+            si.sale_price,
+            s.sale_date,
+            (si.sale_price * si.quantity) AS line_total,
+            s.customer_name
+        FROM sale_items si
+        JOIN products p ON p.id = si.product_id
+        JOIN sales s ON s.id = si.sale_id
+    """
+    if dated_items:
+        query += " AND s.sale_date = si.sale_date"
+    params = []
+    if date_from or date_to:
+        conditions = []
+        for alias in ("s", "si") if dated_items else ("s",):
             if date_from:
-                conditions.append("s.sale_date >= %s")
+                conditions.append(f"{alias}.sale_date >= %s")
                 params.append(date_from)
             if date_to:
-                conditions.append("s.sale_date <= %s")
+                conditions.append(f"{alias}.sale_date <= %s")
                 params.append(date_to)
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-        query += " ORDER BY s.sale_date DESC, p.name"
-        cur.execute(query, params)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY s.sale_date DESC, p.name"
+    return query, params
+
+
+def get_sales_with_items(date_from=None, date_to=None):
+    """Получение всех позиций продаж с информацией о продаже для отображения в таблице"""
+    with get_cursor(replica=True) as cur:
+        cur.execute(*_sales_with_items_query(date_from, date_to, _sale_items_dated(cur)))
+        return cur.fetchall()
+
+
+def iter_sales_with_items(date_from=None, date_to=None, chunk_size=None):
+    """
+    То же, что get_sales_with_items, но порциями по chunk_size строк
+    (генератор списков строк, серверный курсор): первую порцию можно показать сразу,
+    не дожидаясь всей истории продаж.
+    """
+    query, params = _sales_with_items_query(date_from, date_to, _sale_items_dated())
+    yield from stream_query(query, params, chunk_size=chunk_size, replica=True)
+
+
+# Периоды сводки продаж (get_sales_summary)
+SUMMARY_GRANULARITIES = ("day", "week", "month")
+
+# Группировки сводки продаж: имя -> (id группы, название группы, нужные JOIN)
+SUMMARY_GROUPS = {
+    "category": (
+        "c.id",
+        "COALESCE(c.name, 'Без категории')",
+        " JOIN products p ON p.id = si.product_id LEFT JOIN categories c ON c.id = p.category_id",
+    ),
+    "product": ("p.id", "p.name", " JOIN products p ON p.id = si.product_id"),
+}
+
+
+def _check_summary_args(granularity, group_by):
+    if granularity is not None and granularity not in SUMMARY_GRANULARITIES:
+        raise ValueError(f"Неизвестный период сводки: {granularity}")
+    if group_by is not None and group_by not in SUMMARY_GROUPS:
+        raise ValueError(f"Неизвестная группировка сводки: {group_by}")
+
+
+def _sales_summary_query(date_from=None, date_to=None, granularity="day", group_by=None,
+                         dated_items=False):
+    """
+    SQL и параметры сводки продаж по позициям продаж (см. get_sales_summary);
+    dated_items — как в _sales_with_items_query
+    """
+    _check_summary_args(granularity, group_by)
+    period = f"date_trunc('{granularity}', s.sale_date)::date" if granularity else "NULL::date"
+    group_id, group_name, joins = SUMMARY_GROUPS[group_by] if group_by else ("NULL", "NULL", "")
+    query = f"""
+        SELECT
+            {period} AS period,
+            {group_id} AS group_id,
+            {group_name} AS group_name,
+            COUNT(DISTINCT s.id) AS receipts,
+            SUM(si.quantity) AS units,
+            SUM(si.sale_price * si.quantity) AS revenue
+        FROM sales s
+        JOIN sale_items si ON si.sale_id = s.id {"AND si.sale_date = s.sale_date" if dated_items else ""}
+        {joins}
+    """
+    conditions = []
+    params = []
+    if granularity:
+        conditions.append("s.sale_date IS NOT NULL")
+    for alias in ("s", "si") if dated_items else ("s",):
+        if date_from:
+            conditions.append(f"{alias}.sale_date >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"{alias}.sale_date <= %s")
+            params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    # ROLLUP добавляет к строкам итоги по каждому периоду и общий итог
+    rollup = []
+    if granularity:
+        rollup.append("1")
+    if group_by:
+        rollup.append("(2, 3)")
+    if rollup:
+        query += f" GROUP BY ROLLUP ({', '.join(rollup)})"
+        query = f"""
+            SELECT * FROM ({query}) summary
+            ORDER BY period NULLS LAST, group_name IS NULL, revenue DESC
+        """
+    return query, params
+
+
+def _rollup_summary_query(date_from=None, date_to=None, granularity="day", group_by=None,
+                          archived_days=False):
+    """
+    SQL и параметры сводки продаж по дневным итогам daily_sales_rollup: строк столько,
+    сколько пар (день, товар), а не позиций продаж. Чеки за период считаются по sales
+    (индекс по sale_date), чеки с товаром — по итогам. Группировка по категориям здесь
+    не поддерживается: чек с двумя товарами категории посчитался бы дважды.
+    archived_days — есть таблица sales_archive_days: чеки архивированных месяцев
+    (sales_archive.py) берутся из неё.
+    """
+    _check_summary_args(granularity, group_by)
+    if group_by not in (None, "product"):
+        raise ValueError(f"Сводка по дневным итогам не группируется по {group_by}")
+
+    def period(column):
+        return f"date_trunc('{granularity}', {column})::date" if granularity else "NULL::date"
+
+    def date_range(column):
+        conditions = [f"{column} IS NOT NULL"]
+        params = []
+        if date_from:
+            conditions.append(f"{column} >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"{column} <= %s")
+            params.append(date_to)
+        return " WHERE " + " AND ".join(conditions), params
+
+    totals_rollup = (["1"] if granularity else []) + (["(2, 3)"] if group_by else [])
+    receipts_rollup = ["1"] if granularity else []
+    totals_where, totals_params = date_range("r.sale_date")
+    receipts_where, receipts_params = date_range("s.sale_date")
+    receipts_from, receipts_count = "sales s" + receipts_where, "COUNT(*)"
+    if archived_days:
+        archive_where, archive_params = date_range("a.sale_date")
+        receipts_from = (
+            f"(SELECT s.sale_date, 1 AS receipts FROM sales s{receipts_where}"
+            f" UNION ALL SELECT a.sale_date, a.receipts FROM sales_archive_days a{archive_where}) s"
+        )
+        receipts_count = "SUM(s.receipts)"
+        receipts_params += archive_params
+    query = f"""
+        WITH totals AS (
+            SELECT
+                {period("r.sale_date")} AS period,
+                {"r.product_id" if group_by else "NULL::integer"} AS group_id,
+                {"p.name" if group_by else "NULL::text"} AS group_name,
+                SUM(r.receipts) AS receipts,
+                SUM(r.units) AS units,
+                SUM(r.revenue) AS revenue
+            FROM daily_sales_rollup r
+            {"JOIN products p ON p.id = r.product_id" if group_by else ""}
+            {totals_where}
+            {f"GROUP BY ROLLUP ({', '.join(totals_rollup)})" if totals_rollup else ""}
+        ),
+        receipts AS (
+            SELECT {period("s.sale_date")} AS period, {receipts_count} AS receipts
+            FROM {receipts_from}
+            {f"GROUP BY ROLLUP ({', '.join(receipts_rollup)})" if receipts_rollup else ""}
+        )
+        SELECT
+            t.period,
+            t.group_id,
+            t.group_name,
+            CASE WHEN t.group_name IS NULL THEN d.receipts ELSE t.receipts END AS receipts,
+            t.units,
+            t.revenue
+        FROM totals t
+        LEFT JOIN receipts d ON d.period IS NOT DISTINCT FROM t.period
+        ORDER BY t.period NULLS LAST, t.group_name IS NULL, t.revenue DESC
+    """
+    return query, totals_params + receipts_params
+
+
+def get_sales_summary(date_from=None, date_to=None, granularity="day", group_by=None):
+    """
+    Сводка продаж за период, посчитанная на сервере.
+    granularity — "day", "week", "month" (SUMMARY_GRANULARITIES) или None (без разбивки по времени);
+    group_by — "category", "product" (SUMMARY_GROUPS) или None.
+
+    Строки (period, group_id, group_name, receipts, units, revenue): receipts — число чеков,
+    units — продано единиц, revenue — выручка. period — первый день периода (неделя
+    начинается с понедельника). Итоговые строки: group_name = None — итог периода по всем
+    группам, period = None — итог за весь интервал. Периоды идут по порядку, внутри
+    периода — группы по убыванию выручки, затем итог периода; последняя строка — общий итог.
+
+    Без группировки и по товарам сводка считается по дневным итогам (USE_SALES_ROLLUP)
+    и включает архивированные месяцы (sales_archive.py), по категориям — по позициям
+    продаж, которые ещё в БД.
+    """
+    with get_cursor(replica=True) as cur:
+        schema = get_schema(cur)
+        if (USE_SALES_ROLLUP and group_by in (None, "product")
+                and schema.has_table("daily_sales_rollup")):
+            cur.execute(*_rollup_summary_query(
+                date_from, date_to, granularity, group_by, schema.has_table("sales_archive_days")))
+        else:
+            cur.execute(*_sales_summary_query(
+                date_from, date_to, granularity, group_by, _sale_items_dated(cur)))
         return cur.fetchall()
 
 
@@ -802,7 +1640,7 @@ def get_sales_with_items(date_from=None, date_to=None):
 # EMPLOYEES
 # ==================================================
 
-def get_employee_by_Auser_id(user_id):
+def get_employee_by_user_id(user_id):
     """Получение сотрудника по user_id"""
     with get_cursor() as cur:
         cur.execute("""
@@ -811,3 +1649,114 @@ def get_employee_by_Auser_id(user_id):
             WHERE user_id = %s
         """, (user_id,))
         return cur.fetchone()
+
+
+# старое имя с опечаткой
+get_employee_by_Auser_id = get_employee_by_user_id
+
+
+# ==================================================
+# BATCH FETCH
+# ==================================================
+
+def _batch_supplier_row(row_dict):
+    """Строка поставщика из JSON: даты приходят строками ISO"""
+    row_dict = {key.lower(): value for key, value in row_dict.items()}
+    for key in ("created_at", "updated_at"):
+        if isinstance(row_dict.get(key), str):
+            row_dict[key] = datetime.fromisoformat(row_dict[key])
+    return _supplier_row(row_dict)
+
+
+# Именованные запросы для fetch_many: имя -> (SQL или функция от курсора, возвращающая SQL;
+# преобразование строки-словаря в кортеж или None, если нужен кортеж значений как есть).
+# Формат строк совпадает с get_categories(), get_suppliers() и get_products().
+BATCH_QUERIES = {
+    "categories": ("SELECT id, name FROM categories ORDER BY name", None),
+    "suppliers": (lambda cur: "SELECT * FROM " + _suppliers_table(cur) + " ORDER BY name", _batch_supplier_row),
+    "products": (_product_sql(order_by="name"), None),
+}
+
+
+def fetch_many(*names):
+    """
+    Выполнить несколько именованных запросов из BATCH_QUERIES за один round trip
+    на одном подключении. Возвращает словарь: имя -> список строк.
+
+    Каждый запрос сворачивается на сервере в JSON-массив (json_agg), и все они
+    приходят одной строкой одного SELECT. Числа возвращаются как Decimal,
+    даты поставщиков — как datetime, чтобы строки не отличались от обычных функций.
+    """
+    if not names:
+        return {}
+    with get_cursor() as cur:
+        columns = []
+        for index, name in enumerate(names):
+            sql, _row_factory = BATCH_QUERIES[name]
+            if callable(sql):
+                sql = sql(cur)
+            columns.append(
+                f"(SELECT COALESCE(json_agg(q), '[]') FROM ({sql}) q)::text AS batch_{index}"
+            )
+        cur.execute("SELECT " + ",\n       ".join(columns))
+        values = cur.fetchone()
+
+    result = {}
+    for name, raw in zip(names, values):
+        _sql, row_factory = BATCH_QUERIES[name]
+        rows = json.loads(raw, parse_float=Decimal)
+        if row_factory is None:
+            result[name] = [tuple(row.values()) for row in rows]
+        else:
+            result[name] = [row_factory(row) for row in rows]
+    return result
+
+
+# ==================================================
+# BACKEND
+# ==================================================
+
+# Функции, которые встроенная база SQLite (db_sqlite.py) реализует с теми же
+# аргументами и строками результата; set_backend подменяет их в этом модуле
+BACKEND_API = (
+    "get_connection", "get_cursor", "transaction", "query_scope", "warm_up", "pool_stats",
+    "get_user_by_username", "get_session_context",
+    "get_categories", "add_category", "delete_category",
+    "get_products", "get_products_page", "add_product", "update_product", "delete_product",
+    "get_products_by_category", "search_product", "search_products",
+    "get_discounted_products", "get_discounted_products_by_category",
+    "get_product_by_id", "get_inventory",
+    "get_suppliers", "add_supplier", "delete_supplier_by_inn", "delete_supplier_by_id",
+    "get_deliveries", "get_deliveries_with_items", "iter_deliveries_with_items",
+    "create_delivery", "create_sale",
+    "get_sales", "get_sale_items", "get_sales_with_items", "iter_sales_with_items",
+    "get_sales_summary",
+    "get_employee_by_user_id", "get_employee_by_Auser_id",
+    "fetch_many",
+)
+
+_postgres_api = {name: globals()[name] for name in BACKEND_API}
+
+
+def set_backend(name, path=None):
+    """
+    Переключить функции db.* на другое хранилище:
+      "postgres" — сервер PostgreSQL (DB_CONFIG);
+      "sqlite"   — встроенная база SQLite в режиме WAL в файле path (по умолчанию SQLITE_PATH).
+    Вызывать до первого обращения к БД (окна берут функции через db.*).
+    """
+    global BACKEND
+    if name == "postgres":
+        globals().update(_postgres_api)
+    elif name == "sqlite":
+        import db_sqlite
+        db_sqlite.open_database(path or SQLITE_PATH, query_stats=_query_stats,
+                                product_listener=_notify_product_listeners)
+        globals().update({api_name: getattr(db_sqlite, api_name) for api_name in BACKEND_API})
+    else:
+        raise ValueError(f"Неизвестное хранилище: {name}")
+    BACKEND = name
+
+
+if BACKEND != "postgres":
+    set_backend(BACKEND)
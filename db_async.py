@@ -0,0 +1,221 @@
+"""
+Асинхронный доступ к db.py для окон Qt.
+
+Функция db.* выполняется в пуле рабочих потоков, а результат или ошибка
+возвращаются в GUI-поток сигналами DbTask, поэтому цикл событий не ждёт PostgreSQL.
+
+    task = db_async.run_async(db.get_inventory, owner=self,
+                              on_result=self.show_inventory,
+                              on_error=self.show_error)
+
+Потоковые запросы (db.iter_*) читаются порциями через run_async_stream:
+каждая порция приходит в on_chunk, как только прочитана.
+
+task.cancel() прерывает запрос и на сервере (db.query_scope), поэтому окно,
+запускающее новую загрузку, отменяет предыдущую и не ждёт её завершения.
+timeout — предельное время одного запроса, сек; по его истечении приходит
+on_error с db.QueryCancelled.
+"""
+import threading
+
+from PyQt5 import sip
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+import db
+
+# Сколько запросов к БД может выполняться параллельно (не больше POOL_CONFIG["maxconn"])
+MAX_WORKERS = 4
+
+# Текст заглушки, которую окна показывают, пока данные загружаются
+LOADING_TEXT = "Загрузка..."
+
+# Сколько прочитанных, но ещё не показанных порций потокового запроса может ждать
+# GUI-поток; дальше чтение из БД приостанавливается
+MAX_PENDING_CHUNKS = 2
+
+_thread_pool = None
+_active_tasks = set()
+
+
+def thread_pool():
+    """Пул рабочих потоков для запросов к БД"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = QThreadPool()
+        _thread_pool.setMaxThreadCount(MAX_WORKERS)
+    return _thread_pool
+
+
+class DbTask(QObject):
+    """
+    Запрос к БД, выполняемый в фоне.
+    Сигналы finished(result), failed(exception) и chunk(rows) испускаются в GUI-потоке.
+    cancel() прерывает запрос на сервере, его результат никуда не доставляется.
+    """
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    chunk = pyqtSignal(object)
+
+    # внутренние сигналы из рабочего потока, доставляются в поток объекта (GUI)
+    _result_ready = pyqtSignal(object)
+    _error_ready = pyqtSignal(object)
+    _chunk_ready = pyqtSignal(object)
+
+    def __init__(self, parent=None, timeout=None):
+        super().__init__(parent)
+        self.scope = db.QueryScope(timeout)
+        self._cancelled = False
+        self._done = False
+        # сколько ещё порций рабочий поток может отправить, не дожидаясь GUI
+        self._chunk_credits = threading.Semaphore(MAX_PENDING_CHUNKS)
+        self._result_ready.connect(self._deliver_result)
+        self._error_ready.connect(self._deliver_error)
+        self._chunk_ready.connect(self._deliver_chunk)
+        # окно-владелец закрыто — запрос больше никому не нужен
+        scope = self.scope
+        self.destroyed.connect(lambda _obj=None: scope.cancel())
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def done(self):
+        return self._done
+
+    def cancel(self):
+        """Прервать запрос на сервере и не доставлять результат"""
+        self._cancelled = True
+        self._chunk_credits.release()
+        self.scope.cancel()
+
+    @pyqtSlot(object)
+    def _deliver_result(self, result):
+        self._done = True
+        _active_tasks.discard(self)
+        if not self._cancelled:
+            self.finished.emit(result)
+
+    @pyqtSlot(object)
+    def _deliver_error(self, error):
+        self._done = True
+        _active_tasks.discard(self)
+        if not self._cancelled:
+            self.failed.emit(error)
+
+    @pyqtSlot(object)
+    def _deliver_chunk(self, rows):
+        try:
+            if not self._cancelled:
+                self.chunk.emit(rows)
+        finally:
+            self._chunk_credits.release()
+
+
+class _DbRunnable(QRunnable):
+    def __init__(self, task, func, args, kwargs):
+        super().__init__()
+        self.task = task
+        # ссылка на группу запросов остаётся, даже если задачу удалят вместе с окном
+        self.scope = task.scope
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        if self.task.cancelled:
+            _active_tasks.discard(self.task)
+            return
+        try:
+            with db.query_scope(self.scope):
+                result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self._emit("_error_ready", e)
+        else:
+            self._emit("_result_ready", result)
+
+    def _emit(self, signal_name, value):
+        try:
+            getattr(self.task, signal_name).emit(value)
+        except RuntimeError:
+            # окно-владелец уже закрыто, вместе с ним удалена и задача
+            _active_tasks.discard(self.task)
+
+
+class _DbStreamRunnable(_DbRunnable):
+    """Чтение генератора порций: каждая порция отправляется в GUI-поток отдельно"""
+
+    def run(self):
+        if self.task.cancelled:
+            _active_tasks.discard(self.task)
+            return
+        total = 0
+        chunks = None
+        try:
+            with db.query_scope(self.scope):
+                try:
+                    chunks = iter(self.func(*self.args, **self.kwargs))
+                    for rows in chunks:
+                        if not self._wait_for_credit():
+                            _active_tasks.discard(self.task)
+                            return
+                        self._emit("_chunk_ready", rows)
+                        total += len(rows)
+                finally:
+                    # досрочно закрытый генератор освобождает серверный курсор и подключение
+                    close = getattr(chunks, "close", None)
+                    if close is not None:
+                        close()
+        except Exception as e:
+            self._emit("_error_ready", e)
+        else:
+            self._emit("_result_ready", total)
+
+    def _wait_for_credit(self):
+        """Дождаться, пока GUI разберёт предыдущие порции; False — читать дальше не нужно"""
+        while not self.task._chunk_credits.acquire(timeout=0.2):
+            if sip.isdeleted(self.task):
+                return False
+        return not self.task.cancelled
+
+
+def run_async(func, *args, on_result=None, on_error=None, owner=None, timeout=None, **kwargs):
+    """
+    Выполнить func(*args, **kwargs) в фоновом потоке.
+
+    on_result(result) / on_error(exception) вызываются в GUI-потоке.
+    owner — виджет, к которому привязана задача: если он будет удалён раньше,
+    чем придёт ответ, запрос прерывается, а результат отбрасывается.
+    timeout — предельное время одного запроса, сек.
+    """
+    task = DbTask(owner, timeout)
+    if on_result is not None:
+        task.finished.connect(on_result)
+    if on_error is not None:
+        task.failed.connect(on_error)
+    _active_tasks.add(task)
+    thread_pool().start(_DbRunnable(task, func, args, kwargs))
+    return task
+
+
+def run_async_stream(func, *args, on_chunk=None, on_result=None, on_error=None,
+                     owner=None, timeout=None, **kwargs):
+    """
+    Выполнить потоковый запрос func(*args, **kwargs) (генератор порций, например
+    db.iter_sales_with_items) в фоновом потоке.
+
+    on_chunk(rows) вызывается в GUI-потоке для каждой порции по мере чтения,
+    on_result(total) — после последней порции (total — число строк).
+    Если GUI не успевает показывать порции, чтение из БД приостанавливается.
+    """
+    task = DbTask(owner, timeout)
+    if on_chunk is not None:
+        task.chunk.connect(on_chunk)
+    if on_result is not None:
+        task.finished.connect(on_result)
+    if on_error is not None:
+        task.failed.connect(on_error)
+    _active_tasks.add(task)
+    thread_pool().start(_DbStreamRunnable(task, func, args, kwargs))
+    return task
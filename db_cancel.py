@@ -0,0 +1,58 @@
+"""
+Отмена запросов к БД и предельное время их выполнения.
+
+QueryScope — группа запросов одного вызова (например, загрузки одного окна).
+Запросы выполняются внутри `with db.query_scope(scope):` в рабочем потоке,
+а scope.cancel() из любого другого потока прерывает запрос, который сейчас
+выполняется на сервере; следующие запросы этой группы сразу завершаются
+ошибкой QueryCancelled.
+"""
+import threading
+
+
+class QueryCancelled(Exception):
+    """Запрос отменён (QueryScope.cancel) или прерван по тайм-ауту"""
+
+
+class QueryScope:
+    """
+    Отменяемая группа запросов.
+    timeout — предельное время одного запроса в секундах (None — без ограничения).
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._connections = {}  # подключение -> функция, прерывающая его запрос
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Прервать выполняющиеся запросы группы и не начинать новые"""
+        with self._lock:
+            self._cancelled = True
+            # под блокировкой: подключение не вернётся в пул, пока ему отправляется отмена
+            for interrupt in self._connections.values():
+                try:
+                    interrupt()
+                except Exception as e:
+                    print(f"Не удалось отменить запрос: {e}")
+
+    def check(self):
+        """Ошибка QueryCancelled, если группа уже отменена"""
+        if self._cancelled:
+            raise QueryCancelled("Запрос отменён")
+
+    def attach(self, conn, interrupt):
+        """Подключение conn выполняет запросы группы; interrupt() прерывает его запрос"""
+        with self._lock:
+            self.check()
+            self._connections[conn] = interrupt
+
+    def detach(self, conn):
+        """Подключение больше не выполняет запросы группы (вызывать до возврата в пул)"""
+        with self._lock:
+            self._connections.pop(conn, None)
@@ -0,0 +1,255 @@
+"""
+Пул подключений к PostgreSQL, через который работают функции db.py
+"""
+import threading
+import time
+
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Подключение из пула: помнит время создания, последнего возврата в пул
+    и имена подготовленных на нём серверных запросов (PREPARE)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.prepared = set()
+        # устаревшие подготовленные запросы, которые удаляются (DEALLOCATE) при возврате
+        # в пул: внутри прерванной ошибкой транзакции это сделать нельзя
+        self.deallocate = set()
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул подключений.
+
+    - не более maxconn подключений одновременно, minconn держатся открытыми;
+    - подключения, простаивающие дольше idle_timeout, закрываются (сверх minconn);
+    - подключение, не использовавшееся дольше health_check_interval,
+      перед выдачей проверяется запросом SELECT 1;
+    - если все подключения заняты, getconn ждёт до acquire_timeout секунд.
+
+    connect — функция без аргументов, открывающая новое подключение
+    (PooledConnection или его наследник).
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, idle_timeout=300.0,
+                 health_check_interval=30.0, acquire_timeout=10.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные размеры пула: нужно 0 <= minconn <= maxconn, maxconn >= 1")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []  # свободные подключения, последний — самый «тёплый»
+        self._total = 0  # открытые подключения (свободные + выданные + открываемые)
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "evicted_idle": 0,
+            "max_in_use": 0,
+        }
+
+    # ---------- выдача и возврат ----------
+
+    def getconn(self):
+        """Взять подключение из пула (или открыть новое, если есть место)"""
+        deadline = None
+        while True:
+            reserved = False
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolError("Пул подключений закрыт")
+                to_close = self._evict_idle_locked()
+                while not self._idle and self._total >= self.maxconn:
+                    if deadline is None:
+                        deadline = time.monotonic() + self.acquire_timeout
+                        self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolError(
+                            f"Нет свободных подключений к БД (занято {self._total} из {self.maxconn})"
+                        )
+                    started = time.monotonic()
+                    self._cond.wait(remaining)
+                    self._stats["wait_time"] += time.monotonic() - started
+                    if self._closed:
+                        raise PoolError("Пул подключений закрыт")
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._total += 1
+                    reserved = True
+            self._close_all(to_close)
+
+            if reserved:
+                conn = self._open_reserved()
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                in_use = self._total - len(self._idle)
+                if in_use > self._stats["max_in_use"]:
+                    self._stats["max_in_use"] = in_use
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """Вернуть подключение в пул. discard=True — закрыть вместо возврата."""
+        if not discard and not conn.closed:
+            discard = not self._reset(conn)
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            to_close = self._evict_idle_locked()
+            self._cond.notify()
+        self._close_all(to_close)
+
+    def prefill(self, count=None):
+        """
+        Открыть подключения заранее (например, пока пользователь вводит пароль):
+        до count (по умолчанию minconn, не больше maxconn)
+        """
+        target = min(self.maxconn, self.minconn if count is None else count)
+        while True:
+            with self._cond:
+                if self._closed or self._total >= target:
+                    return
+                self._total += 1
+            conn = self._open_reserved()
+            self.putconn(conn)
+
+    def closeall(self):
+        """Закрыть все свободные подключения; выданные закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            to_close, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in to_close:
+            self._discard(conn)
+
+    def stats(self):
+        """Снимок статистики пула"""
+        with self._cond:
+            result = dict(self._stats)
+            result.update({
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "total": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+            })
+        return result
+
+    # ---------- внутреннее ----------
+
+    def _open_reserved(self):
+        """Открыть подключение под уже зарезервированное место в пуле"""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._stats["closed"] += 1
+            self._cond.notify()
+
+    def _close_all(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _evict_idle_locked(self):
+        """Убрать из пула давно простаивающие подключения (вызывается под блокировкой)"""
+        if self.idle_timeout is None or not self._idle:
+            return []
+        now = time.monotonic()
+        evicted = []
+        # self._idle упорядочен по last_used: в начале — самые давние
+        while (self._idle and self._total > self.minconn
+               and now - self._idle[0].last_used > self.idle_timeout):
+            evicted.append(self._idle.pop(0))
+            self._total -= 1
+        if evicted:
+            self._stats["evicted_idle"] += len(evicted)
+            self._stats["closed"] += len(evicted)
+        return evicted
+
+    def _is_healthy(self, conn):
+        """Проверка подключения перед выдачей"""
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _deallocate(conn):
+        """Удалить на сервере подготовленные запросы из conn.deallocate"""
+        with conn.cursor() as cur:
+            for name in conn.deallocate:
+                try:
+                    cur.execute("DEALLOCATE " + name)
+                except psycopg2.errors.InvalidSqlStatementName:
+                    pass
+                if not conn.autocommit:
+                    conn.rollback()
+        conn.deallocate.clear()
+
+    def _reset(self, conn):
+        """Привести подключение в исходное состояние; False — подключение непригодно"""
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.deallocate:
+                self._deallocate(conn)
+            return True
+        except Exception:
+            return False
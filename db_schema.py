@@ -0,0 +1,124 @@
+"""
+Кэш структуры БД: таблицы, колонки и индексы текущей схемы.
+
+Структура читается из information_schema и pg_catalog один раз на процесс
+(одним запросом) и перечитывается, только если изменился отпечаток схемы —
+md5 от списка таблиц, представлений и индексов с числом их колонок.
+"""
+import threading
+import time
+
+# Отпечаток схемы: меняется при создании/удалении таблиц и индексов и при изменении набора колонок
+_FINGERPRINT_SQL = """
+    SELECT md5(COALESCE(string_agg(
+        c.relname || ':' || c.relkind::text || ':' || (
+            SELECT count(*)
+            FROM pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        ),
+        ',' ORDER BY c.relname
+    ), ''))
+    FROM pg_class c
+    WHERE c.relnamespace = current_schema()::regnamespace
+      AND c.relkind IN ('r', 'p', 'v', 'm', 'i', 'I')
+"""
+
+_LOAD_SQL = """
+    SELECT
+        (""" + _FINGERPRINT_SQL + """) AS fingerprint,
+        (SELECT COALESCE(json_agg(json_build_array(table_name, table_type)), '[]')
+         FROM information_schema.tables
+         WHERE table_schema = current_schema()) AS tables,
+        (SELECT COALESCE(json_agg(json_build_array(table_name, column_name) ORDER BY table_name, ordinal_position), '[]')
+         FROM information_schema.columns
+         WHERE table_schema = current_schema()) AS columns,
+        (SELECT COALESCE(json_agg(json_build_array(tablename, indexname, indexdef)), '[]')
+         FROM pg_indexes
+         WHERE schemaname = current_schema()) AS indexes
+"""
+
+
+class SchemaSnapshot:
+    """Снимок структуры схемы (не меняется после создания)"""
+
+    def __init__(self, fingerprint, tables, columns, indexes):
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self._tables = {name: table_type for name, table_type in tables}
+        self._columns = {}
+        for table, column in columns:
+            self._columns.setdefault(table, []).append(column)
+        self._indexes = {}
+        for table, index_name, definition in indexes:
+            self._indexes.setdefault(table, {})[index_name] = definition
+
+    def tables(self):
+        """Имена таблиц и представлений"""
+        return set(self._tables)
+
+    def has_table(self, name):
+        return name in self._tables
+
+    def columns(self, table):
+        """Колонки таблицы в порядке объявления"""
+        return tuple(self._columns.get(table, ()))
+
+    def has_column(self, table, column):
+        return column in self._columns.get(table, ())
+
+    def indexes(self, table):
+        """Индексы таблицы: имя -> определение (CREATE INDEX ...)"""
+        return dict(self._indexes.get(table, {}))
+
+    def resolve_table(self, *candidates):
+        """Первое из имён, под которым таблица есть в БД, или None"""
+        for name in candidates:
+            if name in self._tables:
+                return name
+        return None
+
+
+class SchemaCache:
+    """
+    Потокобезопасный кэш SchemaSnapshot.
+    get(cur) не обращается к серверу, пока не прошло check_interval секунд с последней
+    сверки; после этого один раз сверяет отпечаток и перечитывает схему, если он изменился.
+    """
+
+    def __init__(self, check_interval=300.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def get(self, cur):
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and (
+                self.check_interval is None
+                or time.monotonic() - self._checked_at < self.check_interval
+            ):
+                return snapshot
+
+        if snapshot is not None:
+            cur.execute(_FINGERPRINT_SQL)
+            if cur.fetchone()[0] == snapshot.fingerprint:
+                with self._lock:
+                    self._checked_at = time.monotonic()
+                return snapshot
+        return self.load(cur)
+
+    def load(self, cur):
+        """Перечитать структуру схемы (один запрос)"""
+        cur.execute(_LOAD_SQL)
+        fingerprint, tables, columns, indexes = cur.fetchone()
+        snapshot = SchemaSnapshot(fingerprint, tables, columns, indexes)
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        """Сбросить кэш: при следующем обращении схема будет прочитана заново"""
+        with self._lock:
+            self._snapshot = None
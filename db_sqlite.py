@@ -0,0 +1,1191 @@
+"""
+Встроенная база SQLite для работы на одном компьютере (без сервера PostgreSQL).
+
+Реализует те же функции, что и db.py, с теми же аргументами и форматом строк
+(числа с копейками — Decimal, даты — date/datetime). Подключается через
+db.set_backend("sqlite") или BACKEND = "sqlite" в db.py.
+
+База работает в режиме WAL: чтение не блокируется записью. У каждого потока своё
+подключение (фоновые запросы db_async идут из пула потоков).
+
+Перенос данных из PostgreSQL (параметры подключения — db.DB_CONFIG):
+    python db_sqlite.py furniture_store.db
+"""
+import atexit
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from db_cancel import QueryCancelled
+from db_stats import caller_function, row_bytes
+
+# Сколько секунд ждать, пока другой поток закончит запись
+BUSY_TIMEOUT = 10
+
+# Сколько строк за раз отдают потоковые функции iter_*
+STREAM_CHUNK_SIZE = 500
+
+# Цена со скидкой (products.current_price)
+_CURRENT_PRICE = """
+    CASE
+        WHEN discount_percent IS NOT NULL AND discount_percent > 0
+            THEN ROUND(price * (1 - discount_percent / 100.0), 2)
+        ELSE price
+    END
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    full_name VARCHAR(150),
+    role VARCHAR(30),
+    password TEXT
+);
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    last_name VARCHAR(50),
+    first_name VARCHAR(50),
+    middle_name VARCHAR(50),
+    position VARCHAR(50)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(150) NOT NULL,
+    category_id INTEGER REFERENCES categories(id),
+    sku VARCHAR(50) UNIQUE NOT NULL,
+    price DECIMAL(12,2) NOT NULL,
+    length DECIMAL(8,2),
+    width DECIMAL(8,2),
+    height DECIMAL(8,2),
+    material VARCHAR(100),
+    color VARCHAR(50),
+    discount_percent DECIMAL(5,2) DEFAULT 0,
+    photo_path TEXT,
+    current_price DECIMAL(12,2) GENERATED ALWAYS AS (""" + _CURRENT_PRICE + """) STORED
+);
+CREATE TABLE IF NOT EXISTS warehouse (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER UNIQUE REFERENCES products(id),
+    quantity INTEGER DEFAULT 0,
+    last_updated TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS suppliers (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(150),
+    city VARCHAR(100),
+    phone VARCHAR(30),
+    email VARCHAR(100),
+    inn VARCHAR(12),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    supplier_id INTEGER REFERENCES suppliers(id),
+    delivery_date DATE,
+    total_amount DECIMAL(12,2)
+);
+CREATE TABLE IF NOT EXISTS delivery_items (
+    id INTEGER PRIMARY KEY,
+    delivery_id INTEGER REFERENCES deliveries(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER,
+    purchase_price DECIMAL(12,2)
+);
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    sale_date DATE,
+    total_amount DECIMAL(12,2),
+    customer_name VARCHAR(150),
+    employee_id INTEGER REFERENCES employees(id)
+);
+CREATE TABLE IF NOT EXISTS sale_items (
+    id INTEGER PRIMARY KEY,
+    sale_id INTEGER REFERENCES sales(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER,
+    sale_price DECIMAL(12,2),
+    discount_percent DECIMAL(5,2)
+);
+CREATE INDEX IF NOT EXISTS sale_items_sale_id_idx ON sale_items (sale_id);
+CREATE INDEX IF NOT EXISTS delivery_items_delivery_id_idx ON delivery_items (delivery_id);
+CREATE INDEX IF NOT EXISTS sales_sale_date_idx ON sales (sale_date);
+CREATE INDEX IF NOT EXISTS products_category_name_id_idx ON products (category_id, name, id);
+CREATE INDEX IF NOT EXISTS products_name_id_idx ON products (name, id);
+CREATE INDEX IF NOT EXISTS products_discount_idx
+    ON products (discount_percent DESC) WHERE discount_percent > 0;
+"""
+
+# Представление товаров, как product_catalog в PostgreSQL (migrations/001_product_catalog.sql)
+CATALOG_VIEW = """
+CREATE VIEW IF NOT EXISTS product_catalog AS
+SELECT
+    p.id,
+    p.name,
+    p.sku,
+    c.name AS category,
+    p.material,
+    p.color,
+    p.length,
+    p.width,
+    p.height,
+    p.price,
+    p.discount_percent,
+    COALESCE(w.quantity, 0) AS stock_quantity,
+    p.current_price,
+    p.photo_path,
+    p.category_id
+FROM products p
+LEFT JOIN categories c ON c.id = p.category_id
+LEFT JOIN warehouse w ON w.product_id = p.id;
+"""
+
+# Таблицы в порядке зависимостей (для переноса данных)
+TABLES = (
+    "users", "employees", "categories", "products", "warehouse", "suppliers",
+    "deliveries", "delivery_items", "sales", "sale_items",
+)
+
+_CENTS = Decimal("0.01")
+
+
+def _convert_decimal(value):
+    # все денежные и размерные колонки схемы — с двумя знаками, как numeric(*, 2) в PostgreSQL
+    return Decimal(value.decode()).quantize(_CENTS)
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DECIMAL", _convert_decimal)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+# ==================================================
+# CONNECTION
+# ==================================================
+
+_state = {"path": None, "query_stats": None, "product_listener": None}
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+# Служебные функции: запросы из них относятся к вызвавшей их функции
+_INTERNAL_FUNCTIONS = ("get_connection", "get_cursor", "transaction")
+
+
+class _Cursor(sqlite3.Cursor):
+    """Курсор со счётчиками для статистики db.stats() (как db_stats.InstrumentedCursor)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = None
+        self.exec_ms = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._record(sql, params, started)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            self._record(sql, seq_of_params, started)
+
+    def _record(self, sql, params, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.exec_ms += elapsed_ms
+        self.queries += 1
+        stats = _state["query_stats"]
+        if stats is not None and elapsed_ms >= stats.slow_query_ms:
+            stats.log_slow(self.function or "?", sql, params, elapsed_ms)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.rows += 1
+            self.bytes += row_bytes(row)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(rows)
+        return rows
+
+    def _count(self, rows):
+        self.rows += len(rows)
+        self.bytes += sum(row_bytes(row) for row in rows)
+
+
+def open_database(path, query_stats=None, product_listener=None):
+    """
+    Открыть (и при необходимости создать) базу SQLite по пути path.
+    query_stats — db_stats.QueryStats, в который пишется статистика вызовов.
+    product_listener(product_ids) вызывается после фиксации изменений товаров.
+    """
+    close_pool()
+    _state["path"] = path
+    _state["query_stats"] = query_stats
+    _state["product_listener"] = product_listener
+    with get_connection() as conn:
+        conn.executescript(SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(products)")]
+        if "current_price" not in columns:
+            # база создана до появления current_price; ALTER TABLE умеет только VIRTUAL
+            conn.execute(
+                "ALTER TABLE products ADD COLUMN current_price DECIMAL(12,2) "
+                "GENERATED ALWAYS AS (" + _CURRENT_PRICE + ") VIRTUAL"
+            )
+        conn.executescript(CATALOG_VIEW)
+
+
+def _open_connection():
+    if _state["path"] is None:
+        raise ValueError("База SQLite не открыта: вызовите db.set_backend(\"sqlite\")")
+    conn = sqlite3.connect(
+        _state["path"],
+        timeout=BUSY_TIMEOUT,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        isolation_level=None,  # транзакции открываются явно в transaction()
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    # lower() в SQLite меняет регистр только латиницы
+    conn.create_function("unicode_lower", 1, lambda value: value and value.lower(), deterministic=True)
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+
+@contextmanager
+def get_connection(replica=False):
+    """Подключение текущего потока (replica принимается для совместимости с db.py)"""
+    current = getattr(_local, "transaction", None)
+    if current is not None:
+        yield current[0]
+        return
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _open_connection()
+    scope = getattr(_local, "scope", None)
+    if scope is None:
+        yield conn
+        return
+    scope.attach(conn, conn.interrupt)
+    if scope.timeout:
+        deadline = time.monotonic() + scope.timeout
+        # ненулевой результат обработчика прерывает запрос
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    try:
+        yield conn
+    finally:
+        scope.detach(conn)
+        conn.set_progress_handler(None, 0)
+
+
+@contextmanager
+def query_scope(scope):
+    """Запросы внутри блока относятся к группе scope (см. db.query_scope)"""
+    previous = getattr(_local, "scope", None)
+    _local.scope = scope
+    try:
+        yield scope
+    except sqlite3.OperationalError as e:
+        if str(e) != "interrupted":
+            raise
+        if scope.cancelled:
+            raise QueryCancelled("Запрос отменён") from e
+        raise QueryCancelled(f"Запрос выполнялся дольше {scope.timeout} с и был прерван") from e
+    finally:
+        _local.scope = previous
+
+
+@contextmanager
+def get_cursor(replica=False):
+    """Курсор на подключении текущего потока; вызов учитывается в db.stats()"""
+    function = caller_function(__name__, _INTERNAL_FUNCTIONS)
+    started = time.perf_counter()
+    cur = None
+    error = False
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor(_Cursor)
+            cur.function = function
+            try:
+                yield cur
+            finally:
+                cur.close()
+    except BaseException:
+        error = True
+        raise
+    finally:
+        stats = _state["query_stats"]
+        if stats is not None:
+            stats.record_call(function, (time.perf_counter() - started) * 1000, cur, error)
+
+
+@contextmanager
+def transaction(readonly=False):
+    """
+    Единица работы, как db.transaction(): все вызовы внутри блока — одна транзакция
+    SQLite. Вложенный transaction() присоединяется к внешней.
+    """
+    current = getattr(_local, "transaction", None)
+    if current is not None:
+        if current[1] and not readonly:
+            raise ValueError("Нельзя изменять данные внутри транзакции только для чтения")
+        yield current[0]
+        return
+
+    with get_connection() as conn:
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute("BEGIN")
+        else:
+            # блокировка записи берётся сразу, чтобы две транзакции не ждали друг друга
+            conn.execute("BEGIN IMMEDIATE")
+        _local.transaction = (conn, readonly)
+        _local.changed_products = changed_products = []
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            _local.transaction = None
+            if readonly:
+                conn.execute("PRAGMA query_only = OFF")
+    if changed_products and _state["product_listener"] is not None:
+        _state["product_listener"](changed_products)
+
+
+def _product_changed(product_id):
+    """Товар изменён: после COMMIT текущей транзакции или сразу, если её нет (см. db._product_changed)"""
+    if getattr(_local, "transaction", None) is None:
+        if _state["product_listener"] is not None:
+            _state["product_listener"]([product_id])
+    else:
+        _local.changed_products.append(product_id)
+
+
+def _stream(sql, params, chunk_size):
+    """Строки запроса порциями по chunk_size"""
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    with get_cursor() as cur:
+        cur.execute(sql, params)
+        scope = getattr(_local, "scope", None)
+        while True:
+            if scope is not None:
+                scope.check()
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def warm_up(connections=None):
+    """Открыть подключение заранее (для совместимости с db.warm_up)"""
+    with get_connection():
+        pass
+
+
+def pool_stats():
+    """Аналог db.pool_stats(): у SQLite пула нет, у каждого потока своё подключение"""
+    with _connections_lock:
+        total = len(_connections)
+    return {
+        "minconn": 0,
+        "maxconn": total,
+        "total": total,
+        "idle": 0,
+        "in_use": total,
+        "waits": 0,
+        "timeouts": 0,
+    }
+
+
+def close_pool():
+    """Закрыть все подключения (при выходе или переключении базы)"""
+    with _connections_lock:
+        connections = list(_connections)
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.__dict__.clear()
+
+
+atexit.register(close_pool)
+
+# ==================================================
+# AUTH
+# ==================================================
+
+def get_user_by_username(username):
+    """Получить пользователя по имени для проверки пароля"""
+    with get_cursor() as cur:
+        cur.execute(
+            "SELECT id, username, full_name, role, password FROM users WHERE username = ?",
+            (username,),
+        )
+        return cur.fetchone()
+
+
+def get_session_context(username):
+    """Пользователь, сотрудник и категории (см. db.get_session_context)"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT
+                u.id, u.username, u.full_name, u.role, u.password,
+                e.id, e.last_name, e.first_name, e.middle_name, e.position
+            FROM users u
+            LEFT JOIN employees e ON e.user_id = u.id
+            WHERE u.username = ?
+            LIMIT 1
+        """, (username,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("SELECT id, name FROM categories ORDER BY name")
+        categories = cur.fetchall()
+    return {
+        "user": tuple(row[0:5]),
+        "employee": tuple(row[5:10]) if row[5] is not None else None,
+        "categories": categories,
+    }
+
+
+# ==================================================
+# CATEGORIES
+# ==================================================
+
+def get_categories():
+    """Получение списка категорий"""
+    with get_cursor() as cur:
+        cur.execute("SELECT id, name FROM categories ORDER BY name")
+        return cur.fetchall()
+
+
+def add_category(name):
+    """Добавление категории"""
+    with get_cursor() as cur:
+        cur.execute("INSERT INTO categories (name) VALUES (?) RETURNING id", (name,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def delete_category(category_id):
+    """Удаление категории по ID. Не удалит, если в категории есть товары."""
+    with get_cursor() as cur:
+        cur.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+        return cur.rowcount > 0
+
+
+# ==================================================
+# PRODUCTS
+# ==================================================
+
+_PRODUCT_COLUMNS = """
+    id, name, sku, category, material, color, length, width, height,
+    price, discount_percent, stock_quantity, current_price, photo_path
+"""
+
+
+def _product_sql(*conditions, order_by=None):
+    """Запрос к представлению product_catalog (см. db._product_sql)"""
+    sql = "SELECT " + _PRODUCT_COLUMNS + " FROM product_catalog"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        sql += " ORDER BY " + order_by
+    return sql
+
+
+def get_products(category_id=None):
+    """Получение товаров с полной информацией, включая остатки и цену со скидкой"""
+    with get_cursor() as cur:
+        if category_id:
+            cur.execute(_product_sql("category_id = ?", order_by="name"), (category_id,))
+        else:
+            cur.execute(_product_sql(order_by="name"))
+        return cur.fetchall()
+
+
+def add_product(name, category_id, sku, price,
+                length=None, width=None, height=None,
+                material=None, color=None,
+                discount_percent=0.0, photo_path=None):
+    """Добавление товара (см. db.add_product)"""
+    with transaction(), get_cursor() as cur:
+        cur.execute("SELECT id FROM products WHERE sku = ?", (sku,))
+        if cur.fetchone():
+            raise ValueError("Товар с таким артикулом уже существует")
+
+        cur.execute(
+            """
+            INSERT INTO products
+                (name, category_id, sku, price,
+                 length, width, height,
+                 material, color, discount_percent, photo_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
+            """,
+            (name, category_id, sku, price,
+             length, width, height,
+             material, color, discount_percent, photo_path),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось добавить товар")
+        product_id = row[0]
+
+        cur.execute("INSERT INTO warehouse (product_id, quantity) VALUES (?, 0)", (product_id,))
+        _product_changed(product_id)
+        return product_id
+
+
+def update_product(product_id, name, category_id, sku, price,
+                   length=None, width=None, height=None,
+                   material=None, color=None,
+                   discount_percent=0.0, photo_path=None):
+    """Обновление товара с проверкой уникальности артикула"""
+    with transaction(), get_cursor() as cur:
+        cur.execute("SELECT id FROM products WHERE sku = ? AND id <> ?", (sku, product_id))
+        if cur.fetchone():
+            raise ValueError("Товар с таким артикулом уже существует")
+
+        cur.execute(
+            """
+            UPDATE products
+            SET
+                name = ?,
+                category_id = ?,
+                sku = ?,
+                price = ?,
+                length = ?,
+                width = ?,
+                height = ?,
+                material = ?,
+                color = ?,
+                discount_percent = ?,
+                photo_path = ?
+            WHERE id = ?
+            """,
+            (name, category_id, sku, price,
+             length, width, height,
+             material, color, discount_percent, photo_path,
+             product_id),
+        )
+        _product_changed(product_id)
+
+
+def delete_product(product_id):
+    """Удаление товара (остатки и сам товар удаляются в одной транзакции)"""
+    with transaction(), get_cursor() as cur:
+        cur.execute("DELETE FROM warehouse WHERE product_id = ?", (product_id,))
+        cur.execute("DELETE FROM products WHERE id = ?", (product_id,))
+        _product_changed(product_id)
+
+
+def get_products_page(category_id=None, after=None, limit=50):
+    """Страница товаров в порядке (name, id) после after = (name, id) (см. db.get_products_page)"""
+    conditions = []
+    params = []
+    if category_id:
+        conditions.append("category_id = ?")
+        params.append(category_id)
+    if after is not None:
+        conditions.append("(name, id) > (?, ?)")
+        params.extend(after)
+    params.append(limit)
+    with get_cursor() as cur:
+        cur.execute(_product_sql(*conditions, order_by="name, id") + " LIMIT ?", params)
+        return cur.fetchall()
+
+
+def get_products_by_category(category_id):
+    """Получение товаров по ID категории с полной информацией"""
+    return get_products(category_id=category_id)
+
+
+def search_product(sku):
+    """Поиск товара по артикулу"""
+    with get_cursor() as cur:
+        cur.execute(_product_sql("sku = ?"), (sku,))
+        return cur.fetchone()
+
+
+_PRODUCT_SEARCH_TEXT = (
+    "unicode_lower(coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' "
+    "|| coalesce(material, '') || ' ' || coalesce(color, ''))"
+)
+
+
+def search_products(text, category_id=None, limit=50, offset=0):
+    """
+    Поиск товаров по словам text в названии, артикуле, материале и цвете (см. db.search_products).
+    Без pg_trgm: каждое слово ищется подстрокой, похожие слова не находятся.
+    """
+    words = text.lower().split()
+    if not words:
+        return []
+    conditions = [f"instr({_PRODUCT_SEARCH_TEXT}, ?) > 0" for _ in words]
+    params = list(words)
+    if category_id:
+        conditions.append("category_id = ?")
+        params.append(category_id)
+    params.extend((text.strip().lower(), limit, offset))
+    with get_cursor() as cur:
+        cur.execute(
+            _product_sql(*conditions, order_by="unicode_lower(sku) = ? DESC, name, id") + " LIMIT ? OFFSET ?",
+            params,
+        )
+        return cur.fetchall()
+
+
+def get_discounted_products():
+    """Получение товаров со скидками"""
+    return get_discounted_products_by_category(None)
+
+
+def get_discounted_products_by_category(category_id):
+    """Получение товаров со скидками по категории"""
+    conditions = ["discount_percent > 0"]
+    params = []
+    if category_id is not None:
+        conditions.append("category_id = ?")
+        params.append(category_id)
+    with get_cursor() as cur:
+        cur.execute(_product_sql(*conditions, order_by="discount_percent DESC"), params)
+        return cur.fetchall()
+
+
+def get_product_by_id(product_id):
+    """Получение товара по ID"""
+    with get_cursor() as cur:
+        cur.execute(_product_sql("id = ?"), (product_id,))
+        return cur.fetchone()
+
+
+# ==================================================
+# WAREHOUSE / INVENTORY
+# ==================================================
+
+def get_inventory():
+    """Получение данных склада: id, name, sku, quantity, last_updated, category, price, photo_path"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT
+                p.id,
+                p.name,
+                p.sku,
+                w.quantity,
+                w.last_updated,
+                c.name AS category,
+                p.price,
+                p.photo_path
+            FROM warehouse w
+            JOIN products p ON p.id = w.product_id
+            LEFT JOIN categories c ON c.id = p.category_id
+            ORDER BY p.name
+        """)
+        return cur.fetchall()
+
+
+# ==================================================
+# SUPPLIERS
+# ==================================================
+
+def get_suppliers():
+    """Список поставщиков: (id, name, city, phone, email, inn, created_at, updated_at)"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT id, name, city, phone, email, inn, created_at, updated_at
+            FROM suppliers
+            ORDER BY name
+        """)
+        return cur.fetchall()
+
+
+def add_supplier(name, city, phone, inn, email=None):
+    """Добавление нового поставщика"""
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO suppliers (name, city, phone, inn, email)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id
+            """,
+            (name or None, city or None, phone or None, inn, email or None),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось добавить поставщика")
+        return row[0]
+
+
+def delete_supplier_by_inn(inn: str) -> int:
+    """Удаление поставщика по ИНН. Возвращает количество удалённых строк."""
+    with get_cursor() as cur:
+        cur.execute("DELETE FROM suppliers WHERE inn = ?", (inn,))
+        return cur.rowcount
+
+
+def delete_supplier_by_id(supplier_id) -> int:
+    """Удаление поставщика по ID. Возвращает количество удалённых строк."""
+    with get_cursor() as cur:
+        cur.execute("DELETE FROM suppliers WHERE id = ?", (supplier_id,))
+        return cur.rowcount
+
+
+# ==================================================
+# DELIVERIES
+# ==================================================
+
+def get_deliveries():
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT
+                d.id,
+                d.delivery_date,
+                s.name AS supplier,
+                d.total_amount
+            FROM deliveries d
+            JOIN suppliers s ON s.id = d.supplier_id
+            ORDER BY d.delivery_date DESC
+        """)
+        return cur.fetchall()
+
+
+_DELIVERIES_WITH_ITEMS_SQL = """
+    SELECT
+        d.id AS delivery_id,
+        d.delivery_date,
+        s.name AS supplier_name,
+        d.total_amount,
+        p.id AS product_id,
+        p.name AS product_name,
+        p.sku,
+        di.quantity,
+        di.purchase_price,
+        p.photo_path
+    FROM deliveries d
+    JOIN suppliers s ON s.id = d.supplier_id
+    JOIN delivery_items di ON di.delivery_id = d.id
+    JOIN products p ON p.id = di.product_id
+    ORDER BY d.delivery_date DESC, d.id DESC, p.name
+"""
+
+
+def get_deliveries_with_items():
+    """Получение всех поставок с детальной информацией о товарах"""
+    with get_cursor() as cur:
+        cur.execute(_DELIVERIES_WITH_ITEMS_SQL)
+        return cur.fetchall()
+
+
+def iter_deliveries_with_items(chunk_size=None):
+    """То же, что get_deliveries_with_items, но порциями по chunk_size строк"""
+    yield from _stream(_DELIVERIES_WITH_ITEMS_SQL, (), chunk_size)
+
+
+def create_delivery(supplier_id, delivery_date, items):
+    """
+    Создание поставки (см. db.create_delivery).
+    items: список кортежей (product_id, quantity, purchase_price).
+    """
+    total_amount = sum(quantity * purchase_price for _product_id, quantity, purchase_price in items)
+    received = {}
+    retail_prices = {}
+    for product_id, quantity, purchase_price in items:
+        received[product_id] = received.get(product_id, 0) + quantity
+        # розничная цена = закупочная + 20% (не берём из БД)
+        retail_prices[product_id] = round(float(purchase_price) * 1.2, 2)
+
+    with transaction(), get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO deliveries (supplier_id, delivery_date, total_amount)
+            VALUES (?, ?, ?)
+            RETURNING id
+            """,
+            (supplier_id, delivery_date, total_amount),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось создать поставку")
+        delivery_id = row[0]
+
+        cur.executemany(
+            """
+            INSERT INTO delivery_items
+                (delivery_id, product_id, quantity, purchase_price)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(delivery_id,) + tuple(item) for item in items],
+        )
+        cur.executemany(
+            """
+            INSERT INTO warehouse (product_id, quantity, last_updated)
+            VALUES (?, ?, datetime('now', 'localtime'))
+            ON CONFLICT (product_id)
+            DO UPDATE SET
+                quantity = warehouse.quantity + excluded.quantity,
+                last_updated = datetime('now', 'localtime')
+            """,
+            list(received.items()),
+        )
+        cur.executemany(
+            "UPDATE products SET price = ? WHERE id = ?",
+            [(price, product_id) for product_id, price in retail_prices.items()],
+        )
+        return delivery_id
+
+
+def create_sale(customer_name, employee_id, sale_date, items):
+    """
+    Создание продажи (см. db.create_sale).
+    items: список кортежей (product_id, quantity, discount_percent_override или None).
+    """
+    needed = {}
+    for product_id, quantity, _discount_override in items:
+        needed[product_id] = needed.get(product_id, 0) + quantity
+
+    with transaction(), get_cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT p.id, p.price, p.discount_percent, COALESCE(w.quantity, 0)
+            FROM products p
+            LEFT JOIN warehouse w ON w.product_id = p.id
+            WHERE p.id IN ({", ".join("?" * len(needed))})
+            """,
+            list(needed),
+        )
+        products = {row[0]: row[1:] for row in cur.fetchall()}
+
+        lines = []
+        total_amount = 0
+        for product_id, quantity, discount_override in items:
+            if product_id not in products:
+                raise ValueError(f"Товар id={product_id} не найден")
+
+            price, base_discount, stock = products[product_id]
+            if stock < needed[product_id]:
+                raise ValueError(
+                    f"Недостаточно товара id={product_id} на складе "
+                    f"(доступно {stock}, нужно {needed[product_id]})"
+                )
+
+            price_float = float(price) if price is not None else 0.0
+            base_discount_float = float(base_discount) if base_discount is not None else 0.0
+            discount = discount_override if discount_override is not None else base_discount_float
+            sale_price = price_float * (1 - discount / 100.0) if discount > 0 else price_float
+            total_amount += round(sale_price * quantity, 2)
+            lines.append((product_id, quantity, round(sale_price, 2), discount))
+
+        cur.execute(
+            """
+            INSERT INTO sales (sale_date, total_amount, customer_name, employee_id)
+            VALUES (?, ?, ?, ?)
+            RETURNING id
+            """,
+            (sale_date, round(total_amount, 2), customer_name, employee_id),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Не удалось создать продажу")
+        sale_id = row[0]
+
+        cur.executemany(
+            """
+            INSERT INTO sale_items
+                (sale_id, product_id, quantity, sale_price, discount_percent)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(sale_id,) + line for line in lines],
+        )
+        cur.executemany(
+            """
+            UPDATE warehouse
+            SET quantity = COALESCE(quantity, 0) - ?,
+                last_updated = datetime('now', 'localtime')
+            WHERE product_id = ?
+            """,
+            [(quantity, product_id) for product_id, quantity in needed.items()],
+        )
+        return sale_id
+
+
+# ==================================================
+# SALES
+# ==================================================
+
+def get_sales():
+    """Получение списка продаж"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT
+                s.id,
+                s.sale_date,
+                s.total_amount,
+                COALESCE(s.customer_name, 'Не указан') AS customer,
+                COALESCE(
+                    e.last_name || ' ' || e.first_name ||
+                    COALESCE(' ' || e.middle_name, ''),
+                    'Не указан'
+                ) AS employee
+            FROM sales s
+            LEFT JOIN employees e ON e.id = s.employee_id
+            ORDER BY s.sale_date DESC
+        """)
+        return cur.fetchall()
+
+
+def get_sale_items(sale_id, sale_date=None):
+    """Получение позиций продажи (sale_date — для совместимости с db.get_sale_items)"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT
+                p.name,
+                si.quantity,
+                si.sale_price,
+                si.discount_percent
+            FROM sale_items si
+            JOIN products p ON p.id = si.product_id
+            WHERE si.sale_id = ?
+        """, (sale_id,))
+        return cur.fetchall()
+
+
+def _sales_with_items_query(date_from=None, date_to=None):
+    """SQL и параметры позиций продаж за период"""
+    query = """
+        SELECT
+            p.name AS product_name,
+            si.quantity,
+            si.sale_price,
+            s.sale_date,
+            (si.sale_price * si.quantity) AS "line_total [DECIMAL]",
+            s.customer_name
+        FROM sale_items si
+        JOIN products p ON p.id = si.product_id
+        JOIN sales s ON s.id = si.sale_id
+    """
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append("s.sale_date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("s.sale_date <= ?")
+        params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY s.sale_date DESC, p.name"
+    return query, params
+
+
+def get_sales_with_items(date_from=None, date_to=None):
+    """Получение всех позиций продаж с информацией о продаже для отображения в таблице"""
+    with get_cursor() as cur:
+        cur.execute(*_sales_with_items_query(date_from, date_to))
+        return cur.fetchall()
+
+
+def iter_sales_with_items(date_from=None, date_to=None, chunk_size=None):
+    """То же, что get_sales_with_items, но порциями по chunk_size строк"""
+    query, params = _sales_with_items_query(date_from, date_to)
+    yield from _stream(query, params, chunk_size)
+
+
+# Периоды сводки продаж: имя -> первый день периода (неделя — с понедельника)
+_SUMMARY_PERIODS = {
+    "day": "date(s.sale_date)",
+    "week": "date(s.sale_date, 'weekday 0', '-6 days')",
+    "month": "date(s.sale_date, 'start of month')",
+}
+
+# Группировки сводки продаж: имя -> (id группы, название группы, нужные JOIN)
+_SUMMARY_GROUPS = {
+    "category": (
+        "c.id",
+        "COALESCE(c.name, 'Без категории')",
+        " JOIN products p ON p.id = si.product_id LEFT JOIN categories c ON c.id = p.category_id",
+    ),
+    "product": ("p.id", "p.name", " JOIN products p ON p.id = si.product_id"),
+}
+
+
+def _sales_summary_query(date_from=None, date_to=None, granularity="day", group_by=None):
+    """
+    SQL и параметры сводки продаж (см. db.get_sales_summary).
+    В SQLite нет ROLLUP: уровни итогов собираются через UNION ALL.
+    """
+    if granularity is not None and granularity not in _SUMMARY_PERIODS:
+        raise ValueError(f"Неизвестный период сводки: {granularity}")
+    if group_by is not None and group_by not in _SUMMARY_GROUPS:
+        raise ValueError(f"Неизвестная группировка сводки: {group_by}")
+
+    period = _SUMMARY_PERIODS[granularity] if granularity else None
+    group_id, group_name, joins = _SUMMARY_GROUPS[group_by] if group_by else (None, None, "")
+    conditions = []
+    params = []
+    if granularity:
+        conditions.append("s.sale_date IS NOT NULL")
+    if date_from:
+        conditions.append("s.sale_date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("s.sale_date <= ?")
+        params.append(date_to)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    # уровни итогов как у ROLLUP (период, группа): строки, итоги периодов, общий итог
+    levels = [(period, group_id), (period, None), (None, None)]
+    levels = list(dict.fromkeys(levels))
+    selects = []
+    for level_period, level_group in levels:
+        keys = [key for key in (level_period, level_group) if key]
+        if level_group:
+            keys.append(group_name)
+        selects.append(f"""
+            SELECT
+                {level_period or "NULL"} AS period,
+                {level_group or "NULL"} AS group_id,
+                {group_name if level_group else "NULL"} AS group_name,
+                COUNT(DISTINCT s.id) AS receipts,
+                SUM(si.quantity) AS units,
+                SUM(si.sale_price * si.quantity) AS revenue
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            {joins}
+            {where}
+            {"GROUP BY " + ", ".join(keys) if keys else ""}
+        """)
+    query = f"""
+        SELECT
+            period AS "period [DATE]",
+            group_id,
+            group_name,
+            receipts,
+            units,
+            revenue AS "revenue [DECIMAL]"
+        FROM ({" UNION ALL ".join(selects)})
+        ORDER BY period IS NULL, period, group_name IS NULL, revenue DESC
+    """
+    return query, params * len(selects)
+
+
+def get_sales_summary(date_from=None, date_to=None, granularity="day", group_by=None):
+    """Сводка продаж за период (см. db.get_sales_summary)"""
+    with get_cursor() as cur:
+        cur.execute(*_sales_summary_query(date_from, date_to, granularity, group_by))
+        return cur.fetchall()
+
+
+# ==================================================
+# EMPLOYEES
+# ==================================================
+
+def get_employee_by_user_id(user_id):
+    """Получение сотрудника по user_id"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT id, last_name, first_name, middle_name, position
+            FROM employees
+            WHERE user_id = ?
+        """, (user_id,))
+        return cur.fetchone()
+
+
+# старое имя с опечаткой
+get_employee_by_Auser_id = get_employee_by_user_id
+
+
+# ==================================================
+# BATCH FETCH
+# ==================================================
+
+_BATCH_FUNCTIONS = {
+    "categories": get_categories,
+    "suppliers": get_suppliers,
+    "products": get_products,
+}
+
+
+def fetch_many(*names):
+    """Несколько справочников сразу (у встроенной базы нет сетевых задержек, поэтому по очереди)"""
+    return {name: _BATCH_FUNCTIONS[name]() for name in names}
+
+
+# ==================================================
+# COPY FROM POSTGRESQL
+# ==================================================
+
+def copy_from_postgres(pg_cursor, path, suppliers_table="suppliers"):
+    """
+    Перенести данные из PostgreSQL (курсор psycopg2) в базу SQLite по пути path.
+    Таблицы SQLite очищаются и заполняются заново, id сохраняются.
+    """
+    open_database(path, _state["query_stats"], _state["product_listener"])
+    with transaction() as conn:
+        conn.execute("PRAGMA defer_foreign_keys = ON")
+        for table in reversed(TABLES):
+            conn.execute("DELETE FROM " + table)
+        for table in TABLES:
+            source = suppliers_table if table == "suppliers" else table
+            pg_cursor.execute(f"SELECT * FROM {source} LIMIT 0")
+            source_columns = {d[0].lower() for d in pg_cursor.description}
+            # колонки, которых нет в PostgreSQL, получат значения по умолчанию
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+                       if row[1] in source_columns]
+            pg_cursor.execute(f"SELECT {', '.join(columns)} FROM {source} ORDER BY id")
+            placeholders = ", ".join(["?"] * len(columns))
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                pg_cursor.fetchall(),
+            )
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Использование: python db_sqlite.py <файл базы SQLite>")
+        sys.exit(2)
+    import db
+    with db.get_cursor() as cur:
+        suppliers_table = db.get_schema(cur).resolve_table("suppliers", "suppliens", "supplier")
+        copy_from_postgres(cur, sys.argv[1], suppliers_table or "suppliers")
+    print(f"Данные перенесены в {sys.argv[1]}")
+
+
+if __name__ == "__main__":
+    main()
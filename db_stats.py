@@ -0,0 +1,238 @@
+"""
+Статистика обращений к БД для db.stats().
+
+По каждой функции db.* копится: число вызовов и запросов, полное время вызова
+(с ожиданием подключения из пула и разбором результата), время выполнения запросов
+(от отправки запроса до ответа сервера), число строк и примерный объём полученных
+данных, гистограмма задержки. Запросы дольше порога попадают в журнал медленных запросов.
+"""
+import collections
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import psycopg2.extensions
+
+# Верхние границы корзин гистограммы полного времени вызова, мс
+# (последняя корзина — всё, что дольше HISTOGRAM_BOUNDS_MS[-1])
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Команды, после которых курсор помечается как изменивший данные (cursor.wrote)
+_WRITE_COMMANDS = {"INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "CREATE", "ALTER", "DROP"}
+
+# Модули, кадры которых не считаются «вызывающей функцией»
+_TRANSPARENT_MODULES = {"contextlib", __name__, "db_schema", "db_pool"}
+
+
+def caller_function(module_name, skip=()):
+    """
+    Имя функции модуля module_name, из которой (прямо или через вспомогательные
+    функции) выполняется запрос. Служебные функции (skip, с «_» в начале, lambda)
+    пропускаются. Если запрос сделан не из module_name — «модуль.функция» вызывающего.
+    """
+    frame = sys._getframe(1)
+    outside = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        name = frame.f_code.co_name
+        if module == module_name:
+            if name not in skip and not name.startswith("_") and name != "<lambda>":
+                return name
+        elif outside is None and module not in _TRANSPARENT_MODULES:
+            outside = f"{module}.{name}"
+        frame = frame.f_back
+    return outside or "?"
+
+
+def row_bytes(row):
+    """Примерный объём строки результата: длина строковых/двоичных значений, 8 байт на прочие"""
+    size = 0
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, (str, bytes, memoryview)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Курсор, считающий время выполнения запросов, строки и байты.
+    Каждый запрос передаётся в connection.query_stats (QueryStats), если он задан;
+    function — имя функции, к которой относится запрос (иначе определяется по стеку);
+    wrote — через курсор выполнялись команды, изменяющие данные.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = None
+        self.exec_ms = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+        self.wrote = False
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, vars, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, vars_list, (time.perf_counter() - started) * 1000)
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is not None:
+            self.rows += 1
+            self.bytes += row_bytes(row)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+        self._count(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._count(rows)
+        return rows
+
+    def _timed_fetch(self, fetch, *args):
+        if self.name is None:
+            return fetch(*args)
+        # у серверного (именованного) курсора каждая выборка — обращение к серверу
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self.exec_ms += (time.perf_counter() - started) * 1000
+
+    def _count(self, rows):
+        self.rows += len(rows)
+        self.bytes += sum(row_bytes(row) for row in rows)
+
+    def _record(self, query, params, elapsed_ms):
+        self.exec_ms += elapsed_ms
+        self.queries += 1
+        if not self.wrote and self.statusmessage:
+            self.wrote = self.statusmessage.split(" ", 1)[0] in _WRITE_COMMANDS
+        stats = getattr(self.connection, "query_stats", None)
+        if stats is not None and elapsed_ms >= stats.slow_query_ms:
+            function = self.function or caller_function(stats.module_name, stats.skip)
+            stats.log_slow(function, query, params, elapsed_ms)
+
+
+class QueryStats:
+    """Потокобезопасный сборщик статистики по функциям и журнал медленных запросов"""
+
+    def __init__(self, module_name="db", skip=(), slow_query_ms=200, slow_log_size=100, log_params=False):
+        self.module_name = module_name
+        self.skip = frozenset(skip)
+        self.slow_query_ms = slow_query_ms
+        # параметры запросов (имена пользователей, покупателей) пишутся в журнал только по запросу
+        self.log_params = log_params
+        self._lock = threading.Lock()
+        self._functions = {}
+        self._slow = collections.deque(maxlen=slow_log_size)
+
+    def caller(self):
+        """Имя вызывающей функции модуля module_name (см. caller_function)"""
+        return caller_function(self.module_name, self.skip)
+
+    def record_call(self, function, wall_ms, cursor, error=False):
+        """Учесть один вызов функции; cursor — InstrumentedCursor, через который он прошёл"""
+        bucket = len(HISTOGRAM_BOUNDS_MS)
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if wall_ms <= bound:
+                bucket = index
+                break
+        with self._lock:
+            entry = self._functions.get(function)
+            if entry is None:
+                entry = self._functions[function] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "queries": 0,
+                    "rows": 0,
+                    "bytes": 0,
+                    "wall_total_ms": 0.0,
+                    "wall_max_ms": 0.0,
+                    "exec_total_ms": 0.0,
+                    "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                }
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["queries"] += getattr(cursor, "queries", 0)
+            entry["rows"] += getattr(cursor, "rows", 0)
+            entry["bytes"] += getattr(cursor, "bytes", 0)
+            entry["wall_total_ms"] += wall_ms
+            entry["wall_max_ms"] = max(entry["wall_max_ms"], wall_ms)
+            entry["exec_total_ms"] += getattr(cursor, "exec_ms", 0.0)
+            entry["histogram"][bucket] += 1
+
+    def log_slow(self, function, query, params, elapsed_ms):
+        """Запрос дольше порога: в журнал и в консоль (параметры — только при log_params)"""
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        query = re.sub(r"\s+", " ", str(query)).strip()
+        entry = {
+            "time": datetime.now(),
+            "function": function,
+            "ms": elapsed_ms,
+            "query": query,
+            "params": params if self.log_params else None,
+        }
+        with self._lock:
+            self._slow.append(entry)
+        message = f"Медленный запрос ({elapsed_ms:.0f} мс) в {function}: {query}"
+        if self.log_params:
+            message += f" {params!r}"
+        print(message)
+
+    def snapshot(self):
+        """Статистика по функциям: имя -> словарь с суммами, средними и перцентилями"""
+        with self._lock:
+            functions = {name: dict(entry, histogram=list(entry["histogram"]))
+                         for name, entry in self._functions.items()}
+        for entry in functions.values():
+            calls = entry["calls"]
+            entry["wall_mean_ms"] = entry["wall_total_ms"] / calls if calls else 0.0
+            entry["exec_mean_ms"] = entry["exec_total_ms"] / calls if calls else 0.0
+            entry["p50_ms"] = self._percentile(entry, 0.50)
+            entry["p95_ms"] = self._percentile(entry, 0.95)
+            entry["p99_ms"] = self._percentile(entry, 0.99)
+        return functions
+
+    def slow_queries(self):
+        """Журнал медленных запросов, новые первыми"""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._functions.clear()
+            self._slow.clear()
+
+    @staticmethod
+    def _percentile(entry, fraction):
+        """Оценка перцентиля по гистограмме: верхняя граница корзины"""
+        target = entry["calls"] * fraction
+        seen = 0
+        for index, count in enumerate(entry["histogram"]):
+            seen += count
+            if count and seen >= target:
+                if index < len(HISTOGRAM_BOUNDS_MS):
+                    return min(float(HISTOGRAM_BOUNDS_MS[index]), entry["wall_max_ms"])
+                return entry["wall_max_ms"]
+        return 0.0
@@ -13,6 +13,8 @@ except ImportError:
     HAS_PIL = False
     Image = None
 import db
+import db_async
+import refresh_scheduler
 from ui_styles import (
     BUTTON_STYLE,
     TITLE_STYLE,
@@ -54,8 +56,12 @@ BROWN_TOTAL_STYLE = "font-weight: bold; font-size: 11pt; color: #705847;"
 class DeliveriesWindow(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
+        self._load_task = None
+        self._loading_label = None
+        self._pending_group = None  # (date_str, delivery_info): последняя, ещё не показанная дата
         self.setup_ui()
         self.load_deliveries()
+        refresh_scheduler.register(self, self.load_deliveries, refresh_scheduler.DELIVERIES)
 
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -98,90 +104,123 @@ class DeliveriesWindow(QWidget):
         
         self.setLayout(layout)
 
-    def load_deliveries(self):
-        """Загрузка поставок с товарами"""
-        # Очищаем layout
+    def _clear_deliveries(self):
+        """Очистка списка поставок"""
         while self.scrollable_layout.count():
             child = self.scrollable_layout.takeAt(0)
             if child is not None:
                 w = child.widget()
                 if w is not None:
                     w.deleteLater()
-        
-        try:
-            deliveries_data = db.get_deliveries_with_items()
-            
-            if not deliveries_data:
-                no_deliveries_label = QLabel("Поставки не найдены")
-                no_deliveries_label.setStyleSheet(INFO_STYLE)
-                self.scrollable_layout.addWidget(no_deliveries_label)
-                return
 
-            # Группируем по дате поставки
-            deliveries_by_date = {}
+    def load_deliveries(self):
+        """Загрузка поставок с товарами (в фоне, порциями, с заглушкой на время запроса)"""
+        self._clear_deliveries()
+        self._pending_group = None
+        self._loading_label = QLabel(db_async.LOADING_TEXT)
+        self._loading_label.setStyleSheet(INFO_STYLE)
+        self.scrollable_layout.addWidget(self._loading_label)
+
+        if self._load_task is not None:
+            self._load_task.cancel()
+        self._load_task = db_async.run_async_stream(
+            db.iter_deliveries_with_items, owner=self,
+            on_chunk=self.show_deliveries, on_result=self.deliveries_loaded,
+            on_error=self.show_error,
+        )
+
+    def show_error(self, e):
+        """Ошибка загрузки поставок"""
+        self._clear_deliveries()
+        self._loading_label = None
+        self._pending_group = None
+        QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки поставок: {e}")
+
+    def show_deliveries(self, deliveries_data):
+        """
+        Отображение очередной порции поставок, сгруппированных по дате.
+        Строки приходят отсортированными по дате, поэтому дата показывается,
+        как только начинается следующая; последняя — в deliveries_loaded.
+        """
+        try:
             for row in deliveries_data:
                 # row: (delivery_id, delivery_date, supplier_name, total_amount, 
                 #       product_id, product_name, sku, quantity, purchase_price, photo_path)
                 delivery_date = row[1]
                 date_str = delivery_date.strftime('%d.%m.%Y') if hasattr(delivery_date, 'strftime') else str(delivery_date)
-                
-                if date_str not in deliveries_by_date:
-                    deliveries_by_date[date_str] = {
+
+                if self._pending_group is None or self._pending_group[0] != date_str:
+                    if self._pending_group is not None:
+                        self._add_delivery_frame(*self._pending_group)
+                    self._pending_group = (date_str, {
                         'delivery_id': row[0],
                         'supplier': row[2],
                         'total_amount': row[3],
                         'items': []
-                    }
-                
-                deliveries_by_date[date_str]['items'].append({
+                    })
+
+                delivery_info = self._pending_group[1]
+                delivery_info['items'].append({
                     'product_id': row[4],
                     'name': row[5],
                     'sku': row[6],
                     'quantity': row[7],
                     'price': row[8],
                     'photo_path': row[9],
-                    'supplier': deliveries_by_date[date_str]['supplier']
+                    'supplier': delivery_info['supplier']
                 })
+        except Exception as e:
+            self.show_error(e)
 
-            # Отображаем поставки по датам
-            for date_str in sorted(deliveries_by_date.keys(), reverse=True):
-                delivery_info = deliveries_by_date[date_str]
-                
-                # Фрейм для одной даты поставки
-                date_frame = QFrame()
-                date_frame.setFrameShape(QFrame.Box)
-                date_frame.setLineWidth(2)
-                date_frame.setStyleSheet(DELIVERY_FRAME_STYLE)
-                
-                date_layout = QVBoxLayout()
-                date_layout.setSpacing(5)
-                date_layout.setContentsMargins(10, 10, 10, 10)
-                
-                # Заголовок с датой и поставщиком
-                header_label = QLabel(
-                    f"Дата поставки: {date_str} | Поставщик: {delivery_info['supplier']}"
-                )
-                header_label.setStyleSheet("font-weight: bold; font-size: 12pt;")
-                date_layout.addWidget(header_label)
-                
-                # Отображаем товары в столбик
-                for item in delivery_info['items']:
-                    card = self.create_product_card(item, date_str)
-                    date_layout.addWidget(card)
-                
-                # Общая сумма в правом нижнем углу
-                total_label = QLabel(
-                    f"Общая сумма поставки: {delivery_info['total_amount']:.2f} руб."
-                )
-                total_label.setStyleSheet(BROWN_TOTAL_STYLE)
-                total_label.setAlignment(Qt.AlignmentFlag.AlignRight)
-                date_layout.addWidget(total_label)
-                
-                date_frame.setLayout(date_layout)
-                self.scrollable_layout.addWidget(date_frame)
-
+    def deliveries_loaded(self, total):
+        """Все поставки прочитаны: показываем последнюю дату и убираем заглушку"""
+        if self._loading_label is not None:
+            self._loading_label.deleteLater()
+            self._loading_label = None
+        try:
+            if self._pending_group is not None:
+                self._add_delivery_frame(*self._pending_group)
+                self._pending_group = None
+            if not total:
+                no_deliveries_label = QLabel("Поставки не найдены")
+                no_deliveries_label.setStyleSheet(INFO_STYLE)
+                self.scrollable_layout.addWidget(no_deliveries_label)
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки поставок: {e}")
+            self.show_error(e)
+
+    def _add_delivery_frame(self, date_str, delivery_info):
+        """Фрейм одной даты поставки с карточками товаров"""
+        date_frame = QFrame()
+        date_frame.setFrameShape(QFrame.Box)
+        date_frame.setLineWidth(2)
+        date_frame.setStyleSheet(DELIVERY_FRAME_STYLE)
+        
+        date_layout = QVBoxLayout()
+        date_layout.setSpacing(5)
+        date_layout.setContentsMargins(10, 10, 10, 10)
+        
+        # Заголовок с датой и поставщиком
+        header_label = QLabel(
+            f"Дата поставки: {date_str} | Поставщик: {delivery_info['supplier']}"
+        )
+        header_label.setStyleSheet("font-weight: bold; font-size: 12pt;")
+        date_layout.addWidget(header_label)
+        
+        # Отображаем товары в столбик
+        for item in delivery_info['items']:
+            card = self.create_product_card(item, date_str)
+            date_layout.addWidget(card)
+        
+        # Общая сумма в правом нижнем углу
+        total_label = QLabel(
+            f"Общая сумма поставки: {delivery_info['total_amount']:.2f} руб."
+        )
+        total_label.setStyleSheet(BROWN_TOTAL_STYLE)
+        total_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        date_layout.addWidget(total_label)
+        
+        date_frame.setLayout(date_layout)
+        self.scrollable_layout.addWidget(date_frame)
 
     def create_product_card(self, item, date_str):
         """Создание карточки товара"""
@@ -312,7 +351,10 @@ class DeliveriesWindow(QWidget):
         supplier_label.setStyleSheet(SUBTITLE_STYLE)
         supplier_layout.addWidget(supplier_label)
         
-        suppliers = db.get_suppliers()
+        # Поставщики и товары для новой поставки загружаются одним запросом к БД
+        reference_data = db.fetch_many("suppliers", "products")
+        suppliers = reference_data["suppliers"]
+        products = reference_data["products"]
         supplier_combo = QComboBox()
         supplier_combo.addItems([f"{s[1]} ({s[2]})" for s in suppliers])
         if suppliers:
@@ -372,7 +414,6 @@ class DeliveriesWindow(QWidget):
             product_label.setStyleSheet(SUBTITLE_STYLE)
             item_layout.addWidget(product_label)
             
-            products = db.get_products()
             display_products = []
             for p in products:
                 name = p[1]
@@ -500,7 +541,8 @@ class DeliveriesWindow(QWidget):
                 db.create_delivery(supplier_id, delivery_date, delivery_items)
                 QMessageBox.information(dialog, "Успех", "Поставка успешно сохранена")
                 dialog.accept()
-                self.load_deliveries()
+                # поставка меняет остатки и цены товаров
+                refresh_scheduler.request(refresh_scheduler.DELIVERIES, refresh_scheduler.PRODUCTS)
             except Exception as e:
                 QMessageBox.critical(dialog, "Ошибка", f"Не удалось сохранить поставку: {e}")
         save_btn = QPushButton("Сохранить поставку")
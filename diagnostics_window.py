@@ -0,0 +1,143 @@
+from PyQt5.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QHeaderView,
+)
+from PyQt5.QtCore import Qt
+import db
+from ui_styles import SUBTITLE_STYLE, BUTTON_STYLE, INFO_STYLE
+
+TABLE_STYLE = (
+    "QTableWidget { font-size: 10pt; } "
+    "QHeaderView::section { background-color: #f0e6dc; color: #705847; padding: 6px; }"
+)
+
+# Сколько функций показывать в таблице «самые медленные»
+TOP_FUNCTIONS = 15
+
+
+class DiagnosticsWindow(QWidget):
+    """Диагностика (только для администратора): статистика запросов db.* и медленные запросы"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setup_ui()
+        self.load_stats()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
+
+        title_label = QLabel("ДИАГНОСТИКА")
+        title_label.setStyleSheet("font-weight: bold; font-size: 14pt; color: #705847;")
+        layout.addWidget(title_label)
+
+        self.pool_label = QLabel()
+        self.pool_label.setStyleSheet(INFO_STYLE)
+        layout.addWidget(self.pool_label)
+
+        # Функции db.*, отсортированные по суммарному времени
+        functions_label = QLabel("Функции БД (по суммарному времени)")
+        functions_label.setStyleSheet(SUBTITLE_STYLE + " color: #705847;")
+        layout.addWidget(functions_label)
+
+        self.functions_table = self._create_table([
+            "Функция", "Вызовов", "Ошибок", "Всего, мс", "Среднее, мс",
+            "p95, мс", "Макс., мс", "Сервер, мс", "Строк", "Объём, КБ",
+        ])
+        layout.addWidget(self.functions_table, 2)
+
+        # Журнал медленных запросов
+        self.slow_label = QLabel()
+        self.slow_label.setStyleSheet(SUBTITLE_STYLE + " color: #705847;")
+        layout.addWidget(self.slow_label)
+
+        self.slow_table = self._create_table(["Время", "Функция", "мс", "Запрос", "Параметры"])
+        layout.addWidget(self.slow_table, 1)
+
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addStretch()
+
+        reset_btn = QPushButton("Сбросить")
+        reset_btn.setStyleSheet(BUTTON_STYLE)
+        reset_btn.clicked.connect(self.reset_stats)
+        bottom_layout.addWidget(reset_btn)
+
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.setStyleSheet(BUTTON_STYLE)
+        refresh_btn.clicked.connect(self.load_stats)
+        bottom_layout.addWidget(refresh_btn)
+        layout.addLayout(bottom_layout)
+
+        self.setLayout(layout)
+
+    @staticmethod
+    def _create_table(headers):
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table.setStyleSheet(TABLE_STYLE)
+        header = table.horizontalHeader()
+        if header is not None:
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            header.setStretchLastSection(True)
+        v_header = table.verticalHeader()
+        if v_header:
+            v_header.hide()
+        return table
+
+    @staticmethod
+    def _number_item(value, fmt="{:.1f}"):
+        item = QTableWidgetItem(fmt.format(value))
+        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return item
+
+    def load_stats(self):
+        """Заполнение таблиц из db.stats() и db.slow_queries()"""
+        try:
+            pool = db.pool_stats()
+            self.pool_label.setText(
+                f"Пул подключений: занято {pool['in_use']} из {pool['maxconn']}, "
+                f"свободно {pool['idle']}, ожиданий {pool['waits']}, тайм-аутов {pool['timeouts']}"
+            )
+        except Exception as e:
+            self.pool_label.setText(f"Пул подключений недоступен: {e}")
+
+        functions = sorted(db.stats().items(), key=lambda kv: kv[1]["wall_total_ms"], reverse=True)
+        functions = functions[:TOP_FUNCTIONS]
+        self.functions_table.setRowCount(len(functions))
+        for row, (name, entry) in enumerate(functions):
+            self.functions_table.setItem(row, 0, QTableWidgetItem(name))
+            self.functions_table.setItem(row, 1, self._number_item(entry["calls"], "{}"))
+            self.functions_table.setItem(row, 2, self._number_item(entry["errors"], "{}"))
+            self.functions_table.setItem(row, 3, self._number_item(entry["wall_total_ms"]))
+            self.functions_table.setItem(row, 4, self._number_item(entry["wall_mean_ms"]))
+            self.functions_table.setItem(row, 5, self._number_item(entry["p95_ms"]))
+            self.functions_table.setItem(row, 6, self._number_item(entry["wall_max_ms"]))
+            self.functions_table.setItem(row, 7, self._number_item(entry["exec_total_ms"]))
+            self.functions_table.setItem(row, 8, self._number_item(entry["rows"], "{}"))
+            self.functions_table.setItem(row, 9, self._number_item(entry["bytes"] / 1024))
+
+        slow = db.slow_queries()
+        self.slow_label.setText(f"Медленные запросы (дольше {db.SLOW_QUERY_MS} мс): {len(slow)}")
+        self.slow_table.setRowCount(len(slow))
+        for row, entry in enumerate(slow):
+            self.slow_table.setItem(row, 0, QTableWidgetItem(entry["time"].strftime("%d.%m.%Y %H:%M:%S")))
+            self.slow_table.setItem(row, 1, QTableWidgetItem(entry["function"]))
+            self.slow_table.setItem(row, 2, self._number_item(entry["ms"]))
+            self.slow_table.setItem(row, 3, QTableWidgetItem(entry["query"]))
+            params = entry["params"]
+            self.slow_table.setItem(row, 4, QTableWidgetItem("" if params is None else repr(params)))
+
+    def reset_stats(self):
+        """Обнуление статистики"""
+        db.reset_stats()
+        self.load_stats()
@@ -4,6 +4,7 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel,
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QImage
 import db
+import refresh_scheduler
 import os
 from ui_styles import BUTTON_STYLE
 
@@ -46,6 +47,7 @@ class DiscountsWindow(QDialog):
         self.setModal(False)
         self.create_widgets()
         self.load_products()
+        refresh_scheduler.register(self, self.load_products, refresh_scheduler.PRODUCTS)
 
     def create_widgets(self):
         layout = QVBoxLayout()
@@ -3,6 +3,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt
 import hashlib
 import db
+import db_async
 from ui_styles import SUBTITLE_STYLE
 
 # Овальные поля: фиксированная высота + border-radius = половина высоты (форма овала/капсулы)
@@ -40,6 +41,14 @@ class LoginWindow(QWidget):
         self.setWindowTitle("Вход в систему")
         self.setFixedSize(460, 380)
         self.setup_ui()
+        # Пока вводятся логин и пароль, в фоне открываются подключения к БД
+        self._warm_up_task = db_async.run_async(
+            db.warm_up, owner=self, on_error=self._warm_up_failed,
+        )
+
+    def _warm_up_failed(self, error):
+        """Не удалось заранее подключиться к БД: при входе подключение откроется заново"""
+        print(f"Ошибка подготовки подключений к БД: {error}")
 
     def showEvent(self, a0):
         """Окно по центру монитора при запуске"""
@@ -128,8 +137,9 @@ class LoginWindow(QWidget):
 
         # Получаем пользователя и проверяем пароль
         try:
-            # Используем функцию из db.py для получения пользователя
-            user = db.get_user_by_username(username)
+            # Пользователь, сотрудник и категории каталога — одним запросом
+            context = db.get_session_context(username)
+            user = context["user"] if context else None
             
             if not user or len(user) < 5:
                 QMessageBox.critical(self, "Ошибка", "Неверные данные")
@@ -141,11 +151,15 @@ class LoginWindow(QWidget):
                 QMessageBox.critical(self, "Ошибка", "Неверные данные")
                 return
 
+            employee = context["employee"]
             user_data = {
                 "id": user[0],
                 "username": user[1],
                 "full_name": user[2],
-                "role": user[3]
+                "role": user[3],
+                "employee_id": employee[0] if employee else None,
+                # категории для первого показа главного окна
+                "categories": context["categories"],
             }
 
             self.close()
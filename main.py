@@ -1,7 +1,8 @@
 # main.py - Точка входа в приложение
 import sys
-from PyQt5.QtWidgets import QApplication  # type: ignore[reportMissingImports]
+from PyQt5.QtWidgets import QApplication, QMessageBox  # type: ignore[reportMissingImports]
 from PyQt5.QtGui import QFont  # type: ignore[reportMissingImports]
+import db
 from logic import LoginWindow
 
 class FurnitureStoreApp:
@@ -15,10 +16,31 @@ class FurnitureStoreApp:
 
     def run(self):
         """Запуск приложения - показывает окно логина"""
+        if not self.apply_migrations():
+            sys.exit(1)
         login_window = LoginWindow(self.on_login)
         login_window.show()
         sys.exit(self.app.exec_())
 
+    def apply_migrations(self):
+        """
+        Недостающие миграции схемы при AUTO_MIGRATE = True — до окна входа.
+        Если миграция не применилась, приложение не запускается.
+        """
+        if not db.AUTO_MIGRATE or db.BACKEND != "postgres":
+            return True
+        import migrate
+        try:
+            for name in migrate.migrate():
+                print(f"Применена миграция {name}")
+        except Exception as e:
+            print(f"Ошибка миграции схемы БД: {e}")
+            QMessageBox.critical(None, "Ошибка",
+                                 f"Не удалось обновить схему БД:\n{e}\n\n"
+                                 "Приложение не запущено. Обратитесь к администратору.")
+            return False
+        return True
+
     def on_login(self, user_data):
         """Обработчик успешного входа"""
         self.user = user_data
@@ -5,6 +5,7 @@ from PyQt5.QtCore import Qt, QRegExp
 from PyQt5.QtGui import QRegExpValidator
 from functools import partial
 import db
+import refresh_scheduler
 from ui_styles import (BUTTON_STYLE, CATEGORY_BUTTON_STYLE, TITLE_STYLE, SUBTITLE_STYLE,
                       USER_NAME_STYLE, USER_ROLE_STYLE, SEPARATOR_STYLE)
 from warehouse_window import WarehouseWindow
@@ -13,6 +14,7 @@ from deliveries_window import DeliveriesWindow
 from suppliers_window import SuppliersWindow
 from purchase_window import PurchaseWindow
 from catalog_window import CatalogWindow
+from diagnostics_window import DiagnosticsWindow
 
 
 class MainWindow(QMainWindow):
@@ -123,7 +125,7 @@ class MainWindow(QMainWindow):
         # Доступ по ролям: администратор — всё кроме покупок; пользователь/продавец — только каталог и покупки
         self._is_admin = role_lower in ("администратор", "administrator", "admin")
         if self._is_admin:
-            allowed_menus = {"КАТАЛОГ", "СКЛАД", "ПРОДАЖИ", "ПОСТАВКИ", "ПОСТАВЩИКИ"}
+            allowed_menus = {"КАТАЛОГ", "СКЛАД", "ПРОДАЖИ", "ПОСТАВКИ", "ПОСТАВЩИКИ", "ДИАГНОСТИКА"}
         else:
             allowed_menus = {"КАТАЛОГ", "ПОКУПКИ"}
 
@@ -134,6 +136,7 @@ class MainWindow(QMainWindow):
             ("ПОКУПКИ", self.show_purchase),
             ("ПОСТАВКИ", self.show_deliveries),
             ("ПОСТАВЩИКИ", self.show_suppliers),
+            ("ДИАГНОСТИКА", self.show_diagnostics),
         ]
         nav_buttons = [(t, c) for t, c in all_nav_buttons if t in allowed_menus]
 
@@ -189,7 +192,10 @@ class MainWindow(QMainWindow):
         self.categories_widget.setLayout(self.categories_layout)
         user_cat_layout.addWidget(self.categories_widget)
         
-        self.load_categories()
+        # Категории уже загружены при входе; дальше load_categories читает их из БД
+        self.load_categories(self.user.pop('categories', None))
+        refresh_scheduler.register(self.categories_widget, self.load_categories,
+                                   refresh_scheduler.CATEGORIES)
         
         role = (self.user.get('role', 'Администратор') or '').lower()
         if role in ('администратор', 'administrator', 'admin'):
@@ -215,8 +221,8 @@ class MainWindow(QMainWindow):
         self.close()
         QApplication.quit()
 
-    def load_categories(self):
-        """Загрузка категорий из базы данных"""
+    def load_categories(self, categories=None):
+        """Загрузка категорий из базы данных (или показ уже загруженных categories)"""
         # Очищаем виджеты категорий
         while self.categories_layout.count():
             child = self.categories_layout.takeAt(0)
@@ -226,7 +232,8 @@ class MainWindow(QMainWindow):
                     w.deleteLater()
         
         try:
-            categories = db.get_categories()
+            if categories is None:
+                categories = db.get_categories()
             if categories:
                 for cat in categories:
                     if len(cat) >= 2:
@@ -255,8 +262,7 @@ class MainWindow(QMainWindow):
         """Показать товары выбранной категории"""
         self.clear_content()
         catalog = CatalogWindow(self.content, category_id=category_id, 
-                               category_name=category_name,
-                               on_refresh=self.load_categories, user_data=self.user)
+                               category_name=category_name, user_data=self.user)
         self.content_layout.addWidget(catalog)
     
     def open_add_category_window(self):
@@ -291,7 +297,7 @@ class MainWindow(QMainWindow):
             
             try:
                 db.add_category(name)
-                self.load_categories()
+                refresh_scheduler.request(refresh_scheduler.CATEGORIES)
                 dialog.accept()
                 QMessageBox.information(self, "Успех", "Категория добавлена")
             except Exception as e:
@@ -359,7 +365,7 @@ class MainWindow(QMainWindow):
             try:
                 deleted = db.delete_category(cat_id)
                 if deleted:
-                    self.load_categories()
+                    refresh_scheduler.request(refresh_scheduler.CATEGORIES)
                     dialog.accept()
                     QMessageBox.information(self, "Успех", "Категория удалена")
                 else:
@@ -427,3 +433,11 @@ class MainWindow(QMainWindow):
         self.clear_content()
         suppliers = SuppliersWindow(self.content)
         self.content_layout.addWidget(suppliers)
+    
+    def show_diagnostics(self):
+        """Показать статистику запросов к БД (только администратор)"""
+        if not self._is_admin:
+            return
+        self.clear_content()
+        diagnostics = DiagnosticsWindow(self.content)
+        self.content_layout.addWidget(diagnostics)
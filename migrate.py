@@ -0,0 +1,128 @@
+"""
+Версионные изменения схемы БД (папка migrations/).
+
+Каждый файл migrations/NNN_описание.sql — одна версия схемы. Применённые версии
+записываются в таблицу schema_migrations, и каждая применяется один раз, в своей
+транзакции: при ошибке версия откатывается целиком и не отмечается. Одновременный
+запуск с нескольких компьютеров безопасен — версии применяются под pg_advisory_lock.
+
+Версии применяются при обновлении программы, пока остальные рабочие места закрыты
+(при AUTO_MIGRATE = True в db.py — при запуске приложения, до окна входа).
+Параметры подключения — db.DB_CONFIG:
+    python migrate.py           # применить недостающие версии
+    python migrate.py --status  # показать применённые и ожидающие версии
+"""
+import argparse
+import os
+import re
+
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Ключ pg_advisory_lock, под которым применяются версии
+_LOCK_KEY = 7461050016
+
+_FILE_NAME_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+_CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version integer PRIMARY KEY,
+        name text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+
+def available():
+    """Версии из папки migrations/: список (номер, имя файла, путь) по возрастанию номера"""
+    migrations = {}
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _FILE_NAME_RE.match(file_name)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Две миграции с номером {version}: {migrations[version][1]} и {file_name}")
+        migrations[version] = (version, file_name, os.path.join(MIGRATIONS_DIR, file_name))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _applied(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return []
+    cur.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version")
+    return cur.fetchall()
+
+
+def status():
+    """(применённые: список (номер, имя, время), ожидающие: список (номер, имя))"""
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            applied = _applied(cur)
+    done = {row[0] for row in applied}
+    return applied, [(version, name) for version, name, _path in available() if version not in done]
+
+
+def migrate():
+    """Применить недостающие версии; возвращает имена применённых файлов"""
+    applied_now = []
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+            try:
+                # таблица создаётся только под блокировкой: одновременный CREATE TABLE IF NOT EXISTS
+                # с двух компьютеров падает на уникальности pg_type
+                cur.execute(_CREATE_TABLE_SQL)
+                # список перечитывается под блокировкой: другой экземпляр мог уже всё применить
+                done = {row[0] for row in _applied(cur)}
+                for version, name, path in available():
+                    if version in done:
+                        continue
+                    with open(path, encoding="utf-8") as f:
+                        sql = f.read()
+                    conn.autocommit = False
+                    try:
+                        cur.execute(sql)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (version, name),
+                        )
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        raise ValueError(f"Ошибка миграции {name}: {e}") from e
+                    finally:
+                        conn.autocommit = True
+                    applied_now.append(name)
+            finally:
+                if not conn.closed:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    if applied_now:
+        db.invalidate_schema()
+    return applied_now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="показать применённые и ожидающие версии")
+    args = parser.parse_args()
+
+    if args.status:
+        applied, pending = status()
+        for version, name, applied_at in applied:
+            print(f"{version:>4}  {name:<40} применена {applied_at:%d.%m.%Y %H:%M}")
+        for version, name in pending:
+            print(f"{version:>4}  {name:<40} ожидает")
+        return
+
+    applied_now = migrate()
+    for name in applied_now:
+        print(f"Применена миграция {name}")
+    if not applied_now:
+        print("Схема БД актуальна")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+-- Цена со скидкой хранится в products.current_price (генерируемый столбец),
+-- а товары с категорией и остатком на складе отдаёт одно представление product_catalog.
+-- Нужен PostgreSQL 12 или новее.
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS current_price numeric(12,2)
+    GENERATED ALWAYS AS (
+        CASE
+            WHEN discount_percent IS NOT NULL AND discount_percent > 0
+                THEN ROUND(price * (1 - discount_percent / 100.0), 2)
+            ELSE price
+        END
+    ) STORED;
+
+-- Колонки в порядке строк функций db.get_products и др.; category_id — для фильтра
+CREATE OR REPLACE VIEW product_catalog AS
+SELECT
+    p.id,
+    p.name,
+    p.sku,
+    c.name AS category,
+    p.material,
+    p.color,
+    p.length,
+    p.width,
+    p.height,
+    p.price,
+    p.discount_percent,
+    COALESCE(w.quantity, 0) AS stock_quantity,
+    p.current_price,
+    p.photo_path,
+    p.category_id
+FROM products p
+LEFT JOIN categories c ON c.id = p.category_id
+LEFT JOIN warehouse w ON w.product_id = p.id;
+
+-- Товары категории по названию (get_products)
+CREATE INDEX IF NOT EXISTS products_category_name_idx ON products (category_id, name);
+
+-- Товары со скидкой, по убыванию скидки (get_discounted_products*)
+CREATE INDEX IF NOT EXISTS products_discount_idx
+    ON products (discount_percent DESC)
+    WHERE discount_percent > 0;
+CREATE INDEX IF NOT EXISTS products_category_discount_idx
+    ON products (category_id, discount_percent DESC)
+    WHERE discount_percent > 0;
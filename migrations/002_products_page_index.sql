@@ -0,0 +1,7 @@
+-- Постраничный вывод товаров (db.get_products_page): порядок (name, id) и курсор
+-- «после (name, id)» обслуживаются одним индексом, без сортировки всей категории.
+CREATE INDEX IF NOT EXISTS products_category_name_id_idx ON products (category_id, name, id);
+CREATE INDEX IF NOT EXISTS products_name_id_idx ON products (name, id);
+
+-- Заменён products_category_name_id_idx
+DROP INDEX IF EXISTS products_category_name_idx;
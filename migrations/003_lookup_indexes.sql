@@ -0,0 +1,44 @@
+-- Индексы для поиска по ключам, на которых держатся частые запросы db.*.
+-- Если в БД уже есть индекс, начинающийся с тех же колонок (например, от UNIQUE
+-- или из предыдущих миграций), новый не создаётся.
+
+CREATE FUNCTION pg_temp.ensure_index(tbl regclass, cols text, index_name text) RETURNS void AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        WHERE i.indrelid = tbl
+          AND i.indpred IS NULL
+          AND (
+              SELECT string_agg(a.attname, ',' ORDER BY k.ord) || ','
+              FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+              JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+          ) LIKE replace(cols, ' ', '') || ',%'
+    ) THEN
+        EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %s (%s)', index_name, tbl, cols);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- товар по артикулу (search_product, проверка уникальности в add_product/update_product)
+SELECT pg_temp.ensure_index('products', 'sku', 'products_sku_idx');
+-- товары категории (get_products, get_products_page)
+SELECT pg_temp.ensure_index('products', 'category_id', 'products_category_id_idx');
+-- остаток товара (product_catalog, create_sale, create_delivery)
+SELECT pg_temp.ensure_index('warehouse', 'product_id', 'warehouse_product_id_idx');
+-- позиции продажи и продажи товара (get_sale_items, история продаж)
+SELECT pg_temp.ensure_index('sale_items', 'sale_id', 'sale_items_sale_id_idx');
+SELECT pg_temp.ensure_index('sale_items', 'product_id', 'sale_items_product_id_idx');
+-- продажи за период (get_sales_with_items, iter_sales_with_items)
+SELECT pg_temp.ensure_index('sales', 'sale_date', 'sales_sale_date_idx');
+-- позиции поставки и поставки товара (get_deliveries_with_items)
+SELECT pg_temp.ensure_index('delivery_items', 'delivery_id', 'delivery_items_delivery_id_idx');
+SELECT pg_temp.ensure_index('delivery_items', 'product_id', 'delivery_items_product_id_idx');
+-- история поставок от новых к старым
+SELECT pg_temp.ensure_index('deliveries', 'delivery_date', 'deliveries_delivery_date_idx');
+-- сотрудник пользователя (get_session_context, get_employee_by_user_id)
+SELECT pg_temp.ensure_index('employees', 'user_id', 'employees_user_id_idx');
+
+-- Частичный индекс по скидке (discount_percent > 0) создан в 001_product_catalog.sql
+
+DROP FUNCTION pg_temp.ensure_index(regclass, text, text);
@@ -0,0 +1,109 @@
+-- Дневные итоги продаж: сводки за период (db.get_sales_summary) читают их вместо
+-- всех позиций продаж. Итоги ведёт триггер на sale_items — одно обновление на
+-- оператор, а не на строку. История, накопленная до миграции, переносится в конце
+-- миграции; пересчитать итоги заново: python sales_rollup.py --rebuild
+
+-- Продано товара за день: единиц, выручка, чеков с этим товаром.
+-- Число всех чеков за день здесь не хранится: строку дня обновляла бы каждая продажа,
+-- и кассы ждали бы друг друга. Его считают по индексу sales (sale_date).
+CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+    sale_date date NOT NULL,
+    product_id integer NOT NULL,
+    units bigint NOT NULL DEFAULT 0,
+    revenue numeric(14,2) NOT NULL DEFAULT 0,
+    receipts integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id)
+);
+
+-- Добавленные позиции (new_items) прибавляются к итогам, удалённые (old_items) —
+-- вычитаются; изменение позиции — вычитание старой и прибавление новой.
+-- Дата берётся из sales, поэтому позиции удаляются раньше своей продажи
+-- (после каскадного удаления продаж или смены sales.sale_date итоги нужно
+-- перестроить: python sales_rollup.py --rebuild).
+CREATE OR REPLACE FUNCTION daily_sales_rollup_update() RETURNS trigger AS $$
+BEGIN
+    -- запросы без EXECUTE: план сохраняется между вызовами, продажа не платит за разбор
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO daily_sales_rollup AS r (sale_date, product_id, units, revenue, receipts)
+        SELECT
+            s.sale_date,
+            i.product_id,
+            -SUM(i.quantity),
+            -SUM(i.sale_price * i.quantity),
+            -COUNT(DISTINCT i.sale_id)
+        FROM old_items i
+        JOIN sales s ON s.id = i.sale_id
+        WHERE s.sale_date IS NOT NULL
+        GROUP BY s.sale_date, i.product_id
+        ORDER BY s.sale_date, i.product_id
+        ON CONFLICT (sale_date, product_id) DO UPDATE SET
+            units = r.units + EXCLUDED.units,
+            revenue = r.revenue + EXCLUDED.revenue,
+            receipts = r.receipts + EXCLUDED.receipts;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO daily_sales_rollup AS r (sale_date, product_id, units, revenue, receipts)
+        SELECT
+            s.sale_date,
+            i.product_id,
+            SUM(i.quantity),
+            SUM(i.sale_price * i.quantity),
+            COUNT(DISTINCT i.sale_id)
+        FROM new_items i
+        JOIN sales s ON s.id = i.sale_id
+        WHERE s.sale_date IS NOT NULL
+        GROUP BY s.sale_date, i.product_id
+        ORDER BY s.sale_date, i.product_id
+        ON CONFLICT (sale_date, product_id) DO UPDATE SET
+            units = r.units + EXCLUDED.units,
+            revenue = r.revenue + EXCLUDED.revenue,
+            receipts = r.receipts + EXCLUDED.receipts;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        -- строки, где ничего не осталось, удаляются
+        DELETE FROM daily_sales_rollup r
+        USING old_items i
+        JOIN sales s ON s.id = i.sale_id
+        WHERE r.sale_date = s.sale_date
+          AND r.product_id = i.product_id
+          AND r.units = 0
+          AND r.receipts = 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sale_items_rollup_insert ON sale_items;
+CREATE TRIGGER sale_items_rollup_insert
+    AFTER INSERT ON sale_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+DROP TRIGGER IF EXISTS sale_items_rollup_update ON sale_items;
+CREATE TRIGGER sale_items_rollup_update
+    AFTER UPDATE ON sale_items
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+DROP TRIGGER IF EXISTS sale_items_rollup_delete ON sale_items;
+CREATE TRIGGER sale_items_rollup_delete
+    AFTER DELETE ON sale_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+-- Перенос истории. Создание триггеров заблокировало вставку позиций до конца миграции,
+-- поэтому ни одна продажа не потеряется и не посчитается дважды.
+INSERT INTO daily_sales_rollup (sale_date, product_id, units, revenue, receipts)
+SELECT
+    s.sale_date,
+    si.product_id,
+    SUM(si.quantity),
+    SUM(si.sale_price * si.quantity),
+    COUNT(DISTINCT s.id)
+FROM sale_items si
+JOIN sales s ON s.id = si.sale_id
+WHERE s.sale_date IS NOT NULL
+GROUP BY s.sale_date, si.product_id
+ON CONFLICT (sale_date, product_id) DO NOTHING;
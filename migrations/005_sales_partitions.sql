@@ -0,0 +1,253 @@
+-- Помесячные секции продаж: sales и sale_items секционируются по дате продажи
+-- (PARTITION BY RANGE (sale_date), нужен PostgreSQL 12+). Запросы с условием на дату
+-- читают только секции своего периода, а старые месяцы можно отсоединить и выгрузить
+-- в архив (python sales_archive.py), не трогая остальные.
+--
+-- Позиции продажи получают колонку sale_date — копию даты продажи: без неё sale_items
+-- не разбить на месяцы. Ключи становятся составными: (id, sale_date) у обеих таблиц,
+-- позиция ссылается на продажу по (sale_id, sale_date).
+--
+-- Секции называются sales_ГГГГ_ММ и sale_items_ГГГГ_ММ. Продажи вне созданных секций
+-- попадают в sales_default / sale_items_default и переносятся в секцию месяца, когда
+-- она создаётся. Секции на будущие месяцы создаёт db.ensure_sales_partitions при
+-- запуске приложения.
+
+-- Создать секции sales и sale_items для месяцев с date_from по date_to (включительно).
+-- Существующие секции пропускаются; возвращает число созданных месяцев.
+CREATE OR REPLACE FUNCTION create_sales_partitions(date_from date, date_to date) RETURNS integer AS $$
+DECLARE
+    month date := date_trunc('month', date_from)::date;
+    next_month date;
+    created integer := 0;
+BEGIN
+    -- при одновременном запуске с нескольких компьютеров секции создаёт кто-то один
+    PERFORM pg_advisory_xact_lock(hashtext('create_sales_partitions'));
+    WHILE month <= date_to LOOP
+        next_month := (month + interval '1 month')::date;
+        IF to_regclass('sales_' || to_char(month, 'YYYY_MM')) IS NULL THEN
+            -- секции создаются отдельно и присоединяются готовыми: продажи месяца, уже
+            -- попавшие в секцию по умолчанию, переносятся в них (позиции раньше продаж,
+            -- иначе помешает внешний ключ). Операции над самими секциями не вызывают
+            -- триггеров sale_items, поэтому дневные итоги не меняются.
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE sales INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                'sales_' || to_char(month, 'YYYY_MM'));
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE sale_items INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                'sale_items_' || to_char(month, 'YYYY_MM'));
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM sale_items_default WHERE sale_date >= $1 AND sale_date < $2 RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                'sale_items_' || to_char(month, 'YYYY_MM')) USING month, next_month;
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM sales_default WHERE sale_date >= $1 AND sale_date < $2 RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                'sales_' || to_char(month, 'YYYY_MM')) USING month, next_month;
+            EXECUTE format(
+                'ALTER TABLE sales ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                'sales_' || to_char(month, 'YYYY_MM'), month, next_month);
+            EXECUTE format(
+                'ALTER TABLE sale_items ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                'sale_items_' || to_char(month, 'YYYY_MM'), month, next_month);
+            created := created + 1;
+        END IF;
+        month := next_month;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перевод sales и sale_items в секционированные таблицы: новые таблицы с теми же
+-- колонками, перенос строк, затем внешние ключи и индексы прежних таблиц.
+DO $$
+DECLARE
+    foreign_keys text[];
+    index_definitions text[];
+    definition text;
+    on_delete text;
+    sales_sequence text := pg_get_serial_sequence('sales', 'id');
+    items_sequence text := pg_get_serial_sequence('sale_items', 'id');
+    first_date date;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'sales'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+    IF EXISTS (SELECT 1 FROM sales WHERE sale_date IS NULL) THEN
+        RAISE EXCEPTION 'Есть продажи без даты (sales.sale_date IS NULL): укажите дату и повторите миграцию';
+    END IF;
+    IF EXISTS (SELECT 1 FROM sale_items si LEFT JOIN sales s ON s.id = si.sale_id WHERE s.id IS NULL) THEN
+        RAISE EXCEPTION 'Есть позиции без продажи (sale_items.sale_id): удалите их и повторите миграцию';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = 'sales'::regclass AND conrelid <> 'sale_items'::regclass
+    ) THEN
+        RAISE EXCEPTION 'На sales ссылаются другие таблицы: внешние ключи к секционированной sales должны включать sale_date';
+    END IF;
+
+    -- действие при удалении продажи, внешние ключи (кроме sale_items -> sales)
+    -- и обычные индексы прежних таблиц
+    SELECT CASE confdeltype WHEN 'c' THEN 'ON DELETE CASCADE' WHEN 'n' THEN 'ON DELETE SET NULL' ELSE '' END
+    INTO on_delete
+    FROM pg_constraint
+    WHERE contype = 'f' AND conrelid = 'sale_items'::regclass AND confrelid = 'sales'::regclass
+    LIMIT 1;
+    SELECT
+        array_agg(format('ALTER TABLE %I ADD CONSTRAINT %I %s',
+                         c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid)))
+    INTO foreign_keys
+    FROM pg_constraint c
+    WHERE c.contype = 'f'
+      AND c.conrelid IN ('sales'::regclass, 'sale_items'::regclass)
+      AND c.confrelid <> 'sales'::regclass;
+    SELECT array_agg(pg_get_indexdef(i.indexrelid))
+    INTO index_definitions
+    FROM pg_index i
+    WHERE i.indrelid IN ('sales'::regclass, 'sale_items'::regclass)
+      AND NOT i.indisunique;
+
+    ALTER TABLE sale_items RENAME TO sale_items_unpartitioned;
+    ALTER TABLE sales RENAME TO sales_unpartitioned;
+
+    CREATE TABLE sales (
+        LIKE sales_unpartitioned INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (sale_date);
+    CREATE TABLE sales_default PARTITION OF sales DEFAULT;
+
+    CREATE TABLE sale_items (
+        LIKE sale_items_unpartitioned INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS,
+        sale_date date NOT NULL
+    ) PARTITION BY RANGE (sale_date);
+    CREATE TABLE sale_items_default PARTITION OF sale_items DEFAULT;
+
+    SELECT min(sale_date) INTO first_date FROM sales_unpartitioned;
+    PERFORM create_sales_partitions(
+        COALESCE(first_date, current_date), (current_date + interval '3 months')::date);
+
+    -- id переносятся как есть, в том числе в колонки GENERATED ALWAYS AS IDENTITY
+    INSERT INTO sales OVERRIDING SYSTEM VALUE SELECT * FROM sales_unpartitioned;
+    INSERT INTO sale_items OVERRIDING SYSTEM VALUE
+    SELECT si.*, s.sale_date
+    FROM sale_items_unpartitioned si
+    JOIN sales_unpartitioned s ON s.id = si.sale_id;
+
+    -- счётчики id переходят к новым таблицам (у identity-колонок они свои — продолжают нумерацию)
+    IF sales_sequence IS NOT NULL AND pg_get_serial_sequence('sales', 'id') IS NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY sales.id', sales_sequence);
+    ELSIF sales_sequence IS NOT NULL THEN
+        PERFORM setval(pg_get_serial_sequence('sales', 'id'), COALESCE(max(id), 0) + 1, false) FROM sales;
+    END IF;
+    IF items_sequence IS NOT NULL AND pg_get_serial_sequence('sale_items', 'id') IS NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY sale_items.id', items_sequence);
+    ELSIF items_sequence IS NOT NULL THEN
+        PERFORM setval(pg_get_serial_sequence('sale_items', 'id'), COALESCE(max(id), 0) + 1, false) FROM sale_items;
+    END IF;
+
+    -- вместе с прежней sale_items удаляются и её триггеры дневных итогов (создаются ниже);
+    -- ключи и индексы создаются после переноса строк и под прежними именами
+    DROP TABLE sale_items_unpartitioned;
+    DROP TABLE sales_unpartitioned;
+
+    ALTER TABLE sales ADD PRIMARY KEY (id, sale_date);
+    ALTER TABLE sale_items ADD PRIMARY KEY (id, sale_date);
+
+    EXECUTE 'ALTER TABLE sale_items ADD FOREIGN KEY (sale_id, sale_date) REFERENCES sales (id, sale_date) '
+        || COALESCE(on_delete, '');
+    FOREACH definition IN ARRAY COALESCE(foreign_keys, '{}') LOOP
+        EXECUTE definition;
+    END LOOP;
+    FOREACH definition IN ARRAY COALESCE(index_definitions, '{}') LOOP
+        EXECUTE regexp_replace(definition, ' ON (ONLY )?\S+ USING ', ' ON ' ||
+            CASE WHEN definition ~ ' ON (ONLY )?\S*sale_items\S* USING ' THEN 'sale_items' ELSE 'sales' END
+            || ' USING ');
+    END LOOP;
+END;
+$$;
+
+-- Архивированные месяцы (python sales_archive.py): секции отсоединены и выгружены в файлы.
+-- Дневные итоги этих месяцев остаются в daily_sales_rollup.
+CREATE TABLE IF NOT EXISTS sales_archive (
+    month date PRIMARY KEY,
+    sales_rows bigint NOT NULL,
+    item_rows bigint NOT NULL,
+    sales_file text NOT NULL,
+    items_file text NOT NULL,
+    archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Число чеков за каждый день архивированных месяцев: сводки считают чеки за период
+-- по sales, а архивированных продаж там уже нет. Эти дни не меняются, поэтому строка
+-- на день здесь не мешает кассам (в отличие от daily_sales_rollup).
+CREATE TABLE IF NOT EXISTS sales_archive_days (
+    sale_date date PRIMARY KEY,
+    receipts integer NOT NULL
+);
+
+-- Дневные итоги: дата теперь есть у самой позиции, продажа для неё не нужна
+CREATE OR REPLACE FUNCTION daily_sales_rollup_update() RETURNS trigger AS $$
+BEGIN
+    -- запросы без EXECUTE: план сохраняется между вызовами, продажа не платит за разбор
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO daily_sales_rollup AS r (sale_date, product_id, units, revenue, receipts)
+        SELECT
+            i.sale_date,
+            i.product_id,
+            -SUM(i.quantity),
+            -SUM(i.sale_price * i.quantity),
+            -COUNT(DISTINCT i.sale_id)
+        FROM old_items i
+        GROUP BY i.sale_date, i.product_id
+        ORDER BY i.sale_date, i.product_id
+        ON CONFLICT (sale_date, product_id) DO UPDATE SET
+            units = r.units + EXCLUDED.units,
+            revenue = r.revenue + EXCLUDED.revenue,
+            receipts = r.receipts + EXCLUDED.receipts;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO daily_sales_rollup AS r (sale_date, product_id, units, revenue, receipts)
+        SELECT
+            i.sale_date,
+            i.product_id,
+            SUM(i.quantity),
+            SUM(i.sale_price * i.quantity),
+            COUNT(DISTINCT i.sale_id)
+        FROM new_items i
+        GROUP BY i.sale_date, i.product_id
+        ORDER BY i.sale_date, i.product_id
+        ON CONFLICT (sale_date, product_id) DO UPDATE SET
+            units = r.units + EXCLUDED.units,
+            revenue = r.revenue + EXCLUDED.revenue,
+            receipts = r.receipts + EXCLUDED.receipts;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        -- строки, где ничего не осталось, удаляются
+        DELETE FROM daily_sales_rollup r
+        USING old_items i
+        WHERE r.sale_date = i.sale_date
+          AND r.product_id = i.product_id
+          AND r.units = 0
+          AND r.receipts = 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sale_items_rollup_insert ON sale_items;
+CREATE TRIGGER sale_items_rollup_insert
+    AFTER INSERT ON sale_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+DROP TRIGGER IF EXISTS sale_items_rollup_update ON sale_items;
+CREATE TRIGGER sale_items_rollup_update
+    AFTER UPDATE ON sale_items
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+DROP TRIGGER IF EXISTS sale_items_rollup_delete ON sale_items;
+CREATE TRIGGER sale_items_rollup_delete
+    AFTER DELETE ON sale_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
@@ -0,0 +1,25 @@
+-- Нечёткий поиск товаров (db.search_products) по названию, артикулу, материалу и цвету:
+-- триграммный GIN-индекс расширения pg_trgm. По нему ищутся и подстроки (LIKE '%...%'),
+-- и слова с опечатками (оператор <%), сколько бы товаров ни было в каталоге.
+-- Если расширение не установить (нет пакета postgresql-contrib или прав на
+-- CREATE EXTENSION), миграция только предупреждает: поиск работает без индекса —
+-- подстрокой по всем товарам. После установки расширения индекс создаст
+-- повторный запуск этого файла (psql -f migrations/006_product_search.sql).
+
+DO $$
+BEGIN
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE WARNING 'Расширение pg_trgm недоступно (%), поиск товаров будет без индекса', SQLERRM;
+        RETURN;
+    END;
+
+    -- Выражение должно совпадать с _PRODUCT_SEARCH_TEXT в db.py, иначе индекс не используется
+    CREATE INDEX IF NOT EXISTS products_search_trgm_idx ON products USING gin (
+        lower(coalesce(name, '') || ' ' || coalesce(sku, '') || ' '
+              || coalesce(material, '') || ' ' || coalesce(color, ''))
+        gin_trgm_ops
+    );
+END;
+$$;
@@ -5,6 +5,7 @@ from PyQt5.QtCore import Qt, QDate, QRegularExpression
 from PyQt5.QtGui import QRegularExpressionValidator
 from datetime import datetime
 import db
+import refresh_scheduler
 from ui_styles import BUTTON_STYLE, TITLE_STYLE, SUBTITLE_STYLE, INPUT_STYLE
 
 # Более тёмный коричневый цвет для надписей в этом окне
@@ -246,9 +247,9 @@ class PurchaseWindow(QDialog):
         sale_date = self.date_entry.date().toPyDate()
 
         try:
-            # Получаем employee_id из таблицы employees по user_id
-            employee_id = None
-            if self.user:
+            # employee_id загружается при входе; иначе ищем в таблице employees по user_id
+            employee_id = self.user.get('employee_id')
+            if employee_id is None and 'employee_id' not in self.user:
                 user_id = self.user.get('id')
                 if user_id:
                     employee = db.get_employee_by_user_id(user_id)
@@ -257,6 +258,7 @@ class PurchaseWindow(QDialog):
             
             # Вызываем create_sale с customer_name напрямую
             db.create_sale(customer_name, employee_id, sale_date, self.items)
+            refresh_scheduler.request(refresh_scheduler.SALES, refresh_scheduler.PRODUCTS)
             QMessageBox.information(self, "Успех", "Покупка успешно оформлена и записана в раздел 'Продажи'")
             self.accept()
         except Exception as e:
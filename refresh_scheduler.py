@@ -0,0 +1,159 @@
+"""
+Общий планировщик обновления окон.
+
+Окно регистрирует свою функцию перезагрузки и темы данных, которые оно показывает:
+
+    refresh_scheduler.register(self, self.load_products, refresh_scheduler.PRODUCTS)
+
+а код, изменивший данные, вместо прямого вызова load_*() просит обновить тему:
+
+    refresh_scheduler.request(refresh_scheduler.PRODUCTS)
+
+Запросы копятся DEBOUNCE_MS миллисекунд (каждый новый запрос откладывает обновление,
+но не дольше MAX_DELAY_MS), после чего каждое видимое окно перезагружается один раз,
+сколько бы запросов к нему ни пришло. Скрытое окно не перезагружается, а помечается
+устаревшим и обновляется, когда его покажут снова.
+"""
+import time
+
+from PyQt5 import sip
+from PyQt5.QtCore import QEvent, QObject, QTimer
+
+# Темы данных
+PRODUCTS = "products"       # товары, цены и остатки
+CATEGORIES = "categories"
+SUPPLIERS = "suppliers"
+SALES = "sales"
+DELIVERIES = "deliveries"
+
+# Сколько ждать следующего запроса, прежде чем обновлять окна, мс
+DEBOUNCE_MS = 150
+
+# Дольше этого обновление не откладывается, даже если запросы идут непрерывно, мс
+MAX_DELAY_MS = 1000
+
+_scheduler = None
+
+
+class _View:
+    """Зарегистрированное окно"""
+
+    __slots__ = ("widget", "reload", "topics", "stale")
+
+    def __init__(self, widget, reload, topics):
+        self.widget = widget
+        self.reload = reload
+        self.topics = frozenset(topics)
+        self.stale = False
+
+
+class RefreshScheduler(QObject):
+    """Планировщик обновлений (один на приложение, см. scheduler())"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._views = {}        # id(widget) -> _View
+        self._pending = set()   # id(widget) окон, ждущих обновления
+        self._first_request = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._stats = {"requests": 0, "reloads": 0, "coalesced": 0, "deferred": 0, "errors": 0}
+
+    def register(self, widget, reload, *topics):
+        """
+        widget перезагружается вызовом reload() при запросе любой из тем topics.
+        Регистрация снимается сама, когда виджет удаляется.
+        """
+        key = id(widget)
+        self._views[key] = _View(widget, reload, topics)
+        widget.installEventFilter(self)
+        widget.destroyed.connect(lambda _obj=None: self._forget(key))
+
+    def request(self, *topics):
+        """Обновить окна, показывающие любую из тем topics"""
+        self._stats["requests"] += 1
+        topics = set(topics)
+        for key, view in self._views.items():
+            if view.topics & topics:
+                self._schedule(key)
+
+    def refresh(self, widget):
+        """Обновить одно окно (например, при смене фильтра) с тем же откладыванием"""
+        self._stats["requests"] += 1
+        if id(widget) in self._views:
+            self._schedule(id(widget))
+
+    def flush(self):
+        """Выполнить накопленные обновления сейчас"""
+        self._timer.stop()
+        pending, self._pending = self._pending, set()
+        self._first_request = None
+        for key in pending:
+            view = self._views.get(key)
+            if view is None:
+                continue
+            if sip.isdeleted(view.widget):
+                self._forget(key)
+                continue
+            if not view.widget.isVisible():
+                # обновится при следующем показе (eventFilter)
+                view.stale = True
+                self._stats["deferred"] += 1
+                continue
+            view.stale = False
+            self._stats["reloads"] += 1
+            try:
+                view.reload()
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Ошибка обновления окна: {e}")
+
+    def stats(self):
+        """Счётчики: запросы, перезагрузки, объединённые и отложенные обновления, ошибки"""
+        return dict(self._stats, pending=len(self._pending), views=len(self._views))
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Show:
+            key = id(obj)
+            view = self._views.get(key)
+            if view is not None and view.stale:
+                self._schedule(key)
+        return False
+
+    def _schedule(self, key):
+        if key in self._pending:
+            self._stats["coalesced"] += 1
+        self._pending.add(key)
+        now = time.monotonic()
+        if self._first_request is None:
+            self._first_request = now
+        left_ms = MAX_DELAY_MS - (now - self._first_request) * 1000
+        self._timer.start(int(max(0, min(DEBOUNCE_MS, left_ms))))
+
+    def _forget(self, key):
+        self._views.pop(key, None)
+        self._pending.discard(key)
+
+
+def scheduler():
+    """Планировщик приложения (создаётся при первом обращении, в GUI-потоке)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RefreshScheduler()
+    return _scheduler
+
+
+def register(widget, reload, *topics):
+    """См. RefreshScheduler.register"""
+    scheduler().register(widget, reload, *topics)
+
+
+def request(*topics):
+    """См. RefreshScheduler.request"""
+    scheduler().request(*topics)
+
+
+def refresh(widget):
+    """См. RefreshScheduler.refresh"""
+    scheduler().refresh(widget)
@@ -0,0 +1,193 @@
+"""
+Архив старых продаж (помесячные секции sales и sale_items, migrations/005_sales_partitions.sql).
+
+Месяцы старше горизонта хранения отсоединяются от sales и sale_items, выгружаются в сжатые
+файлы CSV (sales_ГГГГ_ММ.csv.gz и sale_items_ГГГГ_ММ.csv.gz в папке --dir) и удаляются из БД,
+так что рабочие таблицы остаются небольшими. Архивированные месяцы записываются в таблицу
+sales_archive, число чеков по дням — в sales_archive_days; дневные итоги (daily_sales_rollup)
+остаются — сводки за эти месяцы без группировки и по товарам по-прежнему считаются. Заодно создаются секции на ближайшие месяцы (db.ensure_sales_partitions),
+поэтому команду можно запускать по расписанию и на сервере без приложения.
+    python sales_archive.py                      # архивировать месяцы старше KEEP_MONTHS
+    python sales_archive.py --keep-months 12 --dry-run
+    python sales_archive.py --before 2023-01-01  # месяцы, целиком лежащие до даты
+    python sales_archive.py --list               # архивированные месяцы
+    python sales_archive.py --restore 2022-05    # вернуть месяц из архива в БД
+"""
+import argparse
+import gzip
+import os
+from datetime import date, datetime
+
+import db
+
+# Сколько месяцев продаж (кроме текущего) остаётся в рабочих таблицах
+KEEP_MONTHS = 24
+
+# Папка для файлов архива
+ARCHIVE_DIR = "archive"
+
+
+def _suffix(month):
+    return f"{month:%Y_%m}"
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partitions():
+    """Месяцы, секции которых сейчас в БД: список дат (первое число месяца) по возрастанию"""
+    with db.get_cursor() as cur:
+        cur.execute(
+            r"""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'sales'::regclass
+              AND c.relname ~ '^sales_\d{4}_\d{2}$'
+            """
+        )
+        return sorted(datetime.strptime(row[0], "sales_%Y_%m").date() for row in cur.fetchall())
+
+
+def archived():
+    """Архивированные месяцы: список (месяц, продаж, позиций, файл продаж, файл позиций, когда)"""
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT month, sales_rows, item_rows, sales_file, items_file, archived_at
+            FROM sales_archive
+            ORDER BY month
+            """
+        )
+        return cur.fetchall()
+
+
+def months_to_archive(before):
+    """Месяцы, целиком лежащие до даты before (секции которых ещё в БД)"""
+    return [month for month in partitions() if _add_months(month, 1) <= before]
+
+
+def _export(cur, table, path):
+    """Выгрузить таблицу в сжатый CSV (сначала во временный файл); возвращает число строк"""
+    cur.execute(f"SELECT count(*) FROM {table}")
+    rows = cur.fetchone()[0]
+    with gzip.open(path + ".tmp", "wb") as f:
+        cur.copy_expert(f"COPY {table} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+def archive_month(month, directory=ARCHIVE_DIR):
+    """
+    Выгрузить месяц в файлы и удалить его секции из БД (одна транзакция: если что-то
+    не удалось, месяц остаётся в БД). Продажи других месяцев на это время не ждут,
+    кроме короткого отсоединения секций в конце. Возвращает (продаж, позиций).
+    """
+    suffix = _suffix(month)
+    os.makedirs(directory, exist_ok=True)
+    sales_path = os.path.abspath(os.path.join(directory, f"sales_{suffix}.csv.gz"))
+    items_path = os.path.abspath(os.path.join(directory, f"sale_items_{suffix}.csv.gz"))
+    with db.transaction(), db.get_cursor() as cur:
+        # месяц не должен меняться, пока выгружается
+        cur.execute(f"LOCK TABLE sale_items_{suffix}, sales_{suffix} IN SHARE MODE")
+        item_rows = _export(cur, f"sale_items_{suffix}", items_path)
+        sales_rows = _export(cur, f"sales_{suffix}", sales_path)
+        # позиции — первыми: пока они в БД, секцию продаж не отсоединить (внешний ключ).
+        # Отсоединение и удаление секций не вызывает триггеров sale_items: дневные итоги остаются.
+        cur.execute(f"ALTER TABLE sale_items DETACH PARTITION sale_items_{suffix}")
+        cur.execute(f"DROP TABLE sale_items_{suffix}")
+        cur.execute(f"ALTER TABLE sales DETACH PARTITION sales_{suffix}")
+        cur.execute(
+            f"INSERT INTO sales_archive_days (sale_date, receipts) "
+            f"SELECT sale_date, count(*) FROM sales_{suffix} GROUP BY sale_date"
+        )
+        cur.execute(f"DROP TABLE sales_{suffix}")
+        cur.execute(
+            """
+            INSERT INTO sales_archive (month, sales_rows, item_rows, sales_file, items_file)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            (month, sales_rows, item_rows, sales_path, items_path),
+        )
+    return sales_rows, item_rows
+
+
+def restore_month(month):
+    """Вернуть архивированный месяц в БД из его файлов; возвращает (продаж, позиций)"""
+    suffix = _suffix(month)
+    with db.transaction(), db.get_cursor() as cur:
+        cur.execute(
+            "SELECT sales_file, items_file FROM sales_archive WHERE month = %s FOR UPDATE",
+            (month,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Месяц {month:%m.%Y} не архивирован")
+        sales_path, items_path = row
+        cur.execute("SELECT create_sales_partitions(%s, %s)", (month, month))
+        # строки загружаются прямо в секции: триггеры sale_items не срабатывают,
+        # и дневные итоги (оставшиеся после архивации) не удваиваются
+        counts = []
+        for table, path in ((f"sales_{suffix}", sales_path), (f"sale_items_{suffix}", items_path)):
+            with gzip.open(path, "rb") as f:
+                cur.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv, HEADER)", f)
+            cur.execute(f"SELECT count(*) FROM {table}")
+            counts.append(cur.fetchone()[0])
+        cur.execute(
+            "DELETE FROM sales_archive_days WHERE sale_date >= %s AND sale_date < %s",
+            (month, _add_months(month, 1)),
+        )
+        cur.execute("DELETE FROM sales_archive WHERE month = %s", (month,))
+    return tuple(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архив старых продаж")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--keep-months", type=int, default=KEEP_MONTHS,
+                        help=f"сколько месяцев оставить в БД кроме текущего (по умолчанию {KEEP_MONTHS})")
+    action.add_argument("--before", type=date.fromisoformat,
+                        help="архивировать месяцы, целиком лежащие до даты (ГГГГ-ММ-ДД)")
+    action.add_argument("--list", action="store_true", help="показать архивированные месяцы")
+    action.add_argument("--restore", metavar="ГГГГ-ММ",
+                        type=lambda value: datetime.strptime(value, "%Y-%m").date(),
+                        help="вернуть месяц из архива")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help=f"папка для файлов (по умолчанию {ARCHIVE_DIR})")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет архивировано")
+    args = parser.parse_args()
+
+    if not db.get_schema().has_table("sales_archive"):
+        raise SystemExit("Продажи не секционированы: выполните python migrate.py")
+
+    if args.list:
+        for month, sales_rows, item_rows, sales_file, items_file, archived_at in archived():
+            print(f"{month:%m.%Y}  продаж {sales_rows}, позиций {item_rows}, "
+                  f"архивирован {archived_at:%d.%m.%Y}: {sales_file}, {items_file}")
+        return
+
+    if args.restore:
+        sales_rows, item_rows = restore_month(args.restore)
+        print(f"{args.restore:%m.%Y} возвращён: продаж {sales_rows}, позиций {item_rows}")
+        return
+
+    created = db.ensure_sales_partitions()
+    if created:
+        print(f"Созданы секции продаж на {created} мес.")
+
+    before = args.before or _add_months(date.today().replace(day=1), -args.keep_months)
+    months = months_to_archive(before)
+    if not months:
+        print(f"Нет месяцев до {before:%d.%m.%Y} для архивации")
+        return
+    for month in months:
+        if args.dry_run:
+            print(f"{month:%m.%Y} будет архивирован")
+            continue
+        sales_rows, item_rows = archive_month(month, args.dir)
+        print(f"{month:%m.%Y} архивирован: продаж {sales_rows}, позиций {item_rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Дневные итоги продаж (таблица daily_sales_rollup, migrations/004_daily_sales_rollup.sql).
+
+Новые продажи попадают в итоги сами (триггер на sale_items), история до миграции
+переносится самой миграцией. Перестраивать итоги нужно после правок в обход триггера
+(каскадное удаление продаж, смена sales.sale_date) и загрузки продаж с отключёнными
+триггерами. Итоги архивированных месяцев (sales_archive.py) не пересчитываются и
+не сверяются: их позиций в БД уже нет, а продажи, внесённые в такой месяц после
+архивации, лишь добавлены к архивным итогам.
+    python sales_rollup.py --rebuild                          # вся история
+    python sales_rollup.py --rebuild --from 2024-01-01 --to 2024-12-31
+    python sales_rollup.py --check                            # сверить итоги с позициями продаж
+"""
+import argparse
+from datetime import date
+
+import db
+
+_LIVE_TOTALS_SQL = """
+    SELECT
+        s.sale_date,
+        si.product_id,
+        SUM(si.quantity) AS units,
+        SUM(si.sale_price * si.quantity) AS revenue,
+        COUNT(DISTINCT s.id) AS receipts
+    FROM sale_items si
+    JOIN sales s ON s.id = si.sale_id
+    WHERE s.sale_date IS NOT NULL
+"""
+
+
+def _period(column, date_from, date_to):
+    """Условие и параметры для периода date_from..date_to (границы включительно)"""
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append(f"{column} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{column} <= %s")
+        params.append(date_to)
+    return "".join(" AND " + condition for condition in conditions), params
+
+
+def _not_archived(cur, column="sale_date"):
+    """
+    Условие: день column не из архивированного месяца (таблица sales_archive, если есть).
+    Применяется и к итогам, и к позициям: продажа, внесённая после архивации её месяца,
+    есть и в итогах (поверх архивных), и в позициях, но не пересчитывается и не сверяется.
+    """
+    if not db.get_schema(cur).has_table("sales_archive"):
+        return ""
+    return (" AND NOT EXISTS (SELECT 1 FROM sales_archive a"
+            f" WHERE a.month = date_trunc('month', {column})::date)")
+
+
+def rebuild(date_from=None, date_to=None):
+    """
+    Пересчитать итоги за период (по умолчанию — за всю историю) по позициям продаж.
+    На время пересчёта новые продажи ждут (блокировка sale_items), чтобы ни одна
+    не потерялась и не посчиталась дважды. Возвращает число строк итогов.
+    """
+    period, params = _period("sale_date", date_from, date_to)
+    live_period, live_params = _period("s.sale_date", date_from, date_to)
+    with db.transaction(), db.get_cursor() as cur:
+        cur.execute("LOCK TABLE sale_items IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("DELETE FROM daily_sales_rollup WHERE TRUE" + period + _not_archived(cur), params)
+        cur.execute(
+            "INSERT INTO daily_sales_rollup (sale_date, product_id, units, revenue, receipts) "
+            + _LIVE_TOTALS_SQL + live_period + _not_archived(cur, "s.sale_date")
+            + " GROUP BY s.sale_date, si.product_id",
+            live_params,
+        )
+        return cur.rowcount
+
+
+def check(date_from=None, date_to=None):
+    """
+    Сверить итоги с позициями продаж за период.
+    Возвращает расхождения: список (дата, id товара, итоги в daily_sales_rollup, по позициям),
+    где итоги — (units, revenue, receipts) или None, если строки нет.
+    """
+    period, params = _period("sale_date", date_from, date_to)
+    live_period, live_params = _period("s.sale_date", date_from, date_to)
+    with db.get_cursor() as cur:
+        cur.execute(
+            "SELECT sale_date, product_id, units, revenue, receipts FROM daily_sales_rollup "
+            "WHERE TRUE" + period + _not_archived(cur),
+            params,
+        )
+        stored = {(row[0], row[1]): tuple(row[2:]) for row in cur.fetchall()}
+        cur.execute(
+            _LIVE_TOTALS_SQL + live_period + _not_archived(cur, "s.sale_date")
+            + " GROUP BY s.sale_date, si.product_id",
+            live_params,
+        )
+        live = {(row[0], row[1]): tuple(row[2:]) for row in cur.fetchall()}
+    return [
+        (key[0], key[1], stored.get(key), live.get(key))
+        for key in sorted(stored.keys() | live.keys())
+        if stored.get(key) != live.get(key)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дневные итоги продаж")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--rebuild", action="store_true", help="пересчитать итоги по позициям продаж")
+    action.add_argument("--check", action="store_true", help="сверить итоги с позициями продаж")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="начало периода (ГГГГ-ММ-ДД)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="конец периода (ГГГГ-ММ-ДД)")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rows = rebuild(args.date_from, args.date_to)
+        print(f"Итоги пересчитаны: {rows} строк (день, товар)")
+        return
+
+    mismatches = check(args.date_from, args.date_to)
+    for sale_date, product_id, stored, live in mismatches[:50]:
+        print(f"{sale_date:%d.%m.%Y}  товар {product_id}: в итогах {stored}, по позициям {live}")
+    if mismatches:
+        raise SystemExit(f"Расхождений: {len(mismatches)} — выполните python sales_rollup.py --rebuild")
+    print("Итоги совпадают с позициями продаж")
+
+
+if __name__ == "__main__":
+    main()
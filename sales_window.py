@@ -4,7 +4,9 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt, QDate
 from datetime import datetime
 import db
-from ui_styles import BUTTON_STYLE, TITLE_STYLE
+import db_async
+import refresh_scheduler
+from ui_styles import BUTTON_STYLE, TITLE_STYLE, INFO_STYLE
 
 # Стили как в окне склада
 UTIL_LABEL = "font-size: 10pt; color: #333;"
@@ -18,16 +20,46 @@ UTIL_INPUT = """
     }
 """
 
+# Предельное время запроса продаж за период, сек
+SALES_QUERY_TIMEOUT = 60
+
+# Разбивка сводки по периодам: до SUMMARY_DAYS дней — по дням, до SUMMARY_WEEKS — по неделям,
+# дольше — по месяцам
+SUMMARY_DAYS = 31
+SUMMARY_WEEKS = 180
+
+# Заголовки столбцов сводки для каждой разбивки
+SUMMARY_HEADER_FORMATS = {"day": "%d.%m", "week": "с %d.%m", "month": "%m.%Y"}
+
 # Константы через Unicode
 TITLE_SALES = "ПРОДАЖИ"
 PERIOD = "\u041f\u0435\u0440\u0438\u043e\u0434"  # Период
 
 
+def format_money(value):
+    """Сумма в рублях с пробелами между разрядами"""
+    return f"{float(value or 0):,.2f}".replace(",", " ") + " \u0440\u0443\u0431."
+
+
+def summary_granularity(date_from, date_to):
+    """Разбивка сводки для периода date_from..date_to (см. SUMMARY_DAYS, SUMMARY_WEEKS)"""
+    days = (date_to - date_from).days + 1
+    if days <= SUMMARY_DAYS:
+        return "day"
+    if days <= SUMMARY_WEEKS:
+        return "week"
+    return "month"
+
+
 class SalesWindow(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
+        self._load_task = None
+        self._summary_task = None
+        self._summary_granularity = "day"
         self.setup_ui()
         self.load_sales()
+        refresh_scheduler.register(self, self.load_sales, refresh_scheduler.SALES)
     
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -67,6 +99,31 @@ class SalesWindow(QWidget):
         period_layout.addStretch()
         layout.addLayout(period_layout)
         
+        # Итоги за период и полоса сводки по дням / неделям / месяцам (считаются на сервере)
+        self.totals_label = QLabel()
+        self.totals_label.setStyleSheet("font-weight: bold; font-size: 11pt; color: #705847;")
+        layout.addWidget(self.totals_label)
+        
+        self.summary_table = QTableWidget(2, 0)
+        self.summary_table.setVerticalHeaderLabels(["Выручка", "Чеков"])
+        self.summary_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.summary_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.summary_table.setStyleSheet("""
+            QHeaderView::section {
+                font-size: 9pt;
+                color: #705847;
+                padding: 2px;
+            }
+        """)
+        self.summary_table.setFixedHeight(110)
+        layout.addWidget(self.summary_table)
+        
+        # Заглушка на время загрузки данных
+        self.status_label = QLabel(db_async.LOADING_TEXT)
+        self.status_label.setStyleSheet(INFO_STYLE)
+        self.status_label.hide()
+        layout.addWidget(self.status_label)
+        
         # Таблица продаж: встроенный заголовок — значения строго под наименованиями колонок
         self.table = QTableWidget()
         self.table.setColumnCount(6)
@@ -104,21 +161,67 @@ class SalesWindow(QWidget):
         self.setLayout(layout)
     
     def on_date_changed(self):
-        """Обновление данных при изменении даты"""
-        self.load_sales()
+        """Обновление данных при изменении даты (быстрая прокрутка даты — одна загрузка)"""
+        refresh_scheduler.refresh(self)
     
     def load_sales(self):
-        """Загрузка данных о продажах с фильтром по периоду"""
+        """Загрузка данных о продажах с фильтром по периоду (в фоне)"""
+        date_from = self.date_from.date().toPyDate()
+        date_to = self.date_to.date().toPyDate()
+        
+        # Предыдущий, ещё не завершённый запрос больше не нужен: он прерывается на сервере
+        if self._load_task is not None:
+            self._load_task.cancel()
+        self.load_summary(date_from, date_to)
+        self.status_label.setText(db_async.LOADING_TEXT)
+        self.status_label.show()
+        self.table.setRowCount(0)
+        # Продажи читаются порциями: первые строки видны сразу, не дожидаясь всей истории
+        self._load_task = db_async.run_async_stream(
+            db.iter_sales_with_items, date_from=date_from, date_to=date_to,
+            owner=self, on_chunk=self.show_sales, on_result=self.sales_loaded,
+            on_error=self.show_error, timeout=SALES_QUERY_TIMEOUT,
+        )
+    
+    def load_summary(self, date_from, date_to):
+        """Загрузка итогов и сводки по периодам: одна небольшая выборка (в фоне)"""
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+        self.totals_label.setText("")
+        self.summary_table.setColumnCount(0)
+        self._summary_granularity = summary_granularity(date_from, date_to)
+        self._summary_task = db_async.run_async(
+            db.get_sales_summary, date_from, date_to, self._summary_granularity,
+            owner=self, on_result=self.show_summary, on_error=self.show_error,
+            timeout=SALES_QUERY_TIMEOUT,
+        )
+    
+    def show_summary(self, rows):
+        """Итоги за период и полоса сводки"""
+        # Строки: (period, group_id, group_name, receipts, units, revenue), последняя — общий итог
+        periods = [row for row in rows if row[0] is not None]
+        total = rows[-1] if rows and rows[-1][0] is None else None
+        _period, _group_id, _group_name, receipts, units, revenue = total or (None, None, None, 0, 0, 0)
+        self.totals_label.setText(
+            f"Чеков: {receipts}    Продано: {units or 0} шт.    Выручка: {format_money(revenue)}"
+        )
+        
+        header_format = SUMMARY_HEADER_FORMATS[self._summary_granularity]
+        self.summary_table.setColumnCount(len(periods))
+        self.summary_table.setHorizontalHeaderLabels([row[0].strftime(header_format) for row in periods])
+        for column, (_period, _group_id, _group_name, receipts, _units, revenue) in enumerate(periods):
+            self.summary_table.setItem(0, column, QTableWidgetItem(format_money(revenue)))
+            self.summary_table.setItem(1, column, QTableWidgetItem(str(receipts)))
+    
+    def show_sales(self, sales_data):
+        """Добавление очередной порции строк в таблицу продаж"""
         try:
-            date_from = self.date_from.date().toPyDate()
-            date_to = self.date_to.date().toPyDate()
-            
-            sales_data = db.get_sales_with_items(date_from=date_from, date_to=date_to)
             # Возвращает: (product_name, quantity, sale_price, sale_date, line_total, customer_name)
             
-            self.table.setRowCount(len(sales_data))
+            first_row = self.table.rowCount()
+            self.table.setRowCount(first_row + len(sales_data))
             
-            for row, item in enumerate(sales_data):
+            for row, item in enumerate(sales_data, first_row):
                 if len(item) >= 6:
                     product_name = item[0] or "\u2014"  # Наименование
                     quantity = item[1] or 0  # Количество
@@ -131,9 +234,19 @@ class SalesWindow(QWidget):
                     
                     self.table.setItem(row, 0, QTableWidgetItem(str(product_name)))
                     self.table.setItem(row, 1, QTableWidgetItem(str(quantity)))
-                    self.table.setItem(row, 2, QTableWidgetItem(f"{float(sale_price):,.2f}".replace(",", " ") + " \u0440\u0443\u0431."))
+                    self.table.setItem(row, 2, QTableWidgetItem(format_money(sale_price)))
                     self.table.setItem(row, 3, QTableWidgetItem(date_str))
-                    self.table.setItem(row, 4, QTableWidgetItem(f"{float(line_total):,.2f}".replace(",", " ") + " \u0440\u0443\u0431."))
+                    self.table.setItem(row, 4, QTableWidgetItem(format_money(line_total)))
                     self.table.setItem(row, 5, QTableWidgetItem(str(customer_name)))
         except Exception as e:
             print(f"Ошибка загрузки продаж: {e}")
+    
+    def sales_loaded(self, total):
+        """Все продажи за период загружены"""
+        self.status_label.hide()
+    
+    def show_error(self, error):
+        """Ошибка загрузки продаж"""
+        print(f"Ошибка загрузки продаж: {error}")
+        self.status_label.setText(f"Ошибка загрузки продаж: {error}")
+        self.status_label.show()
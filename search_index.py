@@ -0,0 +1,330 @@
+"""
+Индекс товаров в памяти клиента для мгновенного поиска по мере ввода (поле «Поиск» каталога).
+
+Строится по строкам db.get_products: отсортированный список артикулов (поиск по началу
+артикула) и обратный индекс слов названия, материала и цвета (поиск по началу слова).
+Запрос к БД на каждое нажатие клавиши не нужен: поиск идёт в памяти за доли миллисекунды.
+
+Индекс приложения (product_index) подписан на изменения товаров через db.add_product,
+db.update_product и db.delete_product и обновляется по одному товару. Остатки и цены,
+изменённые продажами и поставками, и товары других рабочих мест в нём не обновляются:
+для этого — reload(), которую каталог вызывает в фоне при обновлении товаров
+(refresh_scheduler.PRODUCTS).
+
+    index = search_index.product_index()
+    index.reload()                             # в фоне: db_async.run_async(index.reload)
+    index.search("стол дуб", category="Столы", limit=30)
+"""
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from operator import itemgetter
+
+import db
+
+_WORD_RE = re.compile(r"\w+")
+
+# Поля строки товара (id, name, sku, category, material, color, ...), слова которых индексируются
+_WORD_FIELDS = (1, 4, 5)
+
+# Запрос из нескольких слов: сколько товаров самого редкого слова можно просмотреть
+# по названию, проверяя остальные слова; если это дольше — пересекаются множества товаров слов
+STREAM_STEPS = 300
+
+# При пересечении: если оставшихся товаров меньше, чем товаров слова / FILTER_RATIO,
+# они проверяются по одному, а не пересекаются со всеми товарами слова
+FILTER_RATIO = 20
+
+
+def _sku(product):
+    return (product[2] or "").lower()
+
+
+def _sort_key(product):
+    """Порядок товаров в результатах: по названию, затем по id"""
+    return ((product[1] or "").lower(), product[0])
+
+
+def _terms(sku, words):
+    """Артикул и слова товара одной строкой: «слово начинается с p» — это "\\0" + p in строка"""
+    return "\0" + "\0".join([sku, *words])
+
+
+def _product_words(product):
+    """Слова названия, материала и цвета товара (в нижнем регистре)"""
+    words = set()
+    for field in _WORD_FIELDS:
+        if product[field]:
+            words.update(_WORD_RE.findall(product[field].lower()))
+    return words
+
+
+class ProductSearchIndex:
+    """
+    Поиск товаров по началу артикула и началу слов названия, материала и цвета.
+    Потокобезопасен: изменения товаров приходят из потока, который их сделал.
+    """
+
+    def __init__(self, products=None):
+        self._lock = threading.Lock()
+        self._products = {}     # id -> строка товара
+        self._sort_keys = {}    # id -> _sort_key
+        self._terms = {}        # id -> _terms: проверка остальных слов запроса
+        self._skus = []         # отсортированный список (артикул в нижнем регистре, id)
+        self._postings = {}     # слово -> множество id товаров
+        self._ordered = {}      # слово -> отсортированный список _sort_key его товаров
+        self._words = []        # отсортированные слова _postings
+        self._changed_while_loading = None
+        self.loaded = False
+        if products is not None:
+            self.load(products)
+
+    def __len__(self):
+        return len(self._products)
+
+    @property
+    def loading(self):
+        """Идёт reload()"""
+        return self._changed_while_loading is not None
+
+    def load(self, products):
+        """Перестроить индекс по строкам товаров (как у db.get_products)"""
+        by_id = {}
+        sort_keys = {}
+        terms = {}
+        skus = []
+        postings = {}
+        for product in products:
+            product_id = product[0]
+            by_id[product_id] = product
+            sort_keys[product_id] = _sort_key(product)
+            words = _product_words(product)
+            terms[product_id] = _terms(_sku(product), words)
+            skus.append((_sku(product), product_id))
+            for word in words:
+                postings.setdefault(word, set()).add(product_id)
+        skus.sort()
+        ordered = {word: sorted(map(sort_keys.__getitem__, ids)) for word, ids in postings.items()}
+        words = sorted(postings)
+        with self._lock:
+            self._products = by_id
+            self._sort_keys = sort_keys
+            self._terms = terms
+            self._skus = skus
+            self._postings = postings
+            self._ordered = ordered
+            self._words = words
+            self.loaded = True
+
+    def reload(self):
+        """
+        Перечитать все товары из БД. Товары, изменённые за время чтения, затем
+        перечитываются по одному, чтобы индекс не вернул их прежнее состояние.
+        """
+        with self._lock:
+            self._changed_while_loading = set()
+        try:
+            self.load(db.get_products())
+        finally:
+            with self._lock:
+                changed, self._changed_while_loading = self._changed_while_loading, None
+        for product_id in changed:
+            self.product_changed(product_id)
+
+    def product_changed(self, product_id):
+        """Товар добавлен, изменён или удалён (db.add_product_listener): перечитать его строку"""
+        with self._lock:
+            if self._changed_while_loading is not None:
+                self._changed_while_loading.add(product_id)
+        product = db.get_product_by_id(product_id)
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.put(product)
+
+    def put(self, product):
+        """Добавить товар или заменить его прежнюю строку"""
+        product_id = product[0]
+        with self._lock:
+            self._remove(product_id)
+            self._products[product_id] = product
+            self._sort_keys[product_id] = sort_key = _sort_key(product)
+            words = _product_words(product)
+            self._terms[product_id] = _terms(_sku(product), words)
+            bisect.insort(self._skus, (_sku(product), product_id))
+            for word in words:
+                ids = self._postings.get(word)
+                if ids is None:
+                    ids = self._postings[word] = set()
+                    self._ordered[word] = []
+                    bisect.insort(self._words, word)
+                ids.add(product_id)
+                bisect.insort(self._ordered[word], sort_key)
+
+    def remove(self, product_id):
+        """Убрать товар из индекса"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        sort_key = self._sort_keys.pop(product_id)
+        del self._terms[product_id]
+        del self._skus[bisect.bisect_left(self._skus, (_sku(product), product_id))]
+        for word in _product_words(product):
+            ids = self._postings[word]
+            ids.discard(product_id)
+            ordered = self._ordered[word]
+            del ordered[bisect.bisect_left(ordered, sort_key)]
+            if not ids:
+                del self._postings[word]
+                del self._ordered[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+
+    def _word_range(self, prefix):
+        """Слова индекса, начинающиеся с prefix"""
+        return self._words[bisect.bisect_left(self._words, prefix):
+                           bisect.bisect_left(self._words, prefix + "\uffff")]
+
+    def _sku_range(self, prefix):
+        """(артикул, id) товаров, артикул которых начинается с prefix, по артикулу"""
+        return self._skus[bisect.bisect_left(self._skus, (prefix,)):
+                          bisect.bisect_left(self._skus, (prefix + "\uffff",))]
+
+    def _prefix_ids(self, prefix):
+        """id товаров, у которых артикул или одно из слов начинается с prefix (не изменять)"""
+        skus = self._sku_range(prefix)
+        words = self._word_range(prefix)
+        if not skus and len(words) == 1:
+            return self._postings[words[0]]
+        ids = set(map(itemgetter(1), skus))
+        for word in words:
+            ids.update(self._postings[word])
+        return ids
+
+    def _prefix_size(self, prefix):
+        """Сколько товаров найдёт prefix (товар с несколькими такими словами — несколько раз)"""
+        return len(self._sku_range(prefix)) + sum(map(len, map(self._postings.__getitem__,
+                                                                self._word_range(prefix))))
+
+    def search(self, text, category=None, limit=None):
+        """
+        Товары, у которых каждое слово text — начало артикула или одного из слов
+        названия, материала и цвета. category — название категории (строки товаров
+        содержат его, а не id). Возвращает строки товаров, не больше limit.
+        Запрос из одного слова: сначала товары с артикулом, начинающимся с него
+        (по артикулу, равный — первым), затем остальные по названию;
+        из нескольких слов — по названию.
+        """
+        words = text.lower().split()
+        if not words:
+            return []
+        with self._lock:
+            products = self._products
+            if category is None:
+                wanted = None
+            else:
+                def wanted(product_id):
+                    return products[product_id][3] == category
+            if len(words) == 1:
+                found = self._search_word(words[0], wanted, limit)
+            else:
+                found = self._search_words(words, wanted, limit)
+            return [products[product_id] for product_id in found]
+
+    def _search_word(self, word, wanted, limit):
+        """
+        Одно слово: товары берутся по порядку из списков артикулов и слов, уже
+        отсортированных, и только пока не набрано limit, — сколько бы их ни нашлось.
+        """
+        stream = itertools.chain(
+            map(itemgetter(1), self._sku_range(word)),
+            map(itemgetter(1), heapq.merge(*map(self._ordered.__getitem__, self._word_range(word)))),
+        )
+        found = []
+        seen = set()
+        for product_id in stream:
+            if product_id in seen or (wanted is not None and not wanted(product_id)):
+                continue
+            seen.add(product_id)
+            found.append(product_id)
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+
+    def _search_words(self, words, wanted, limit):
+        """Несколько слов: товары, найденные по каждому слову, по названию"""
+        sizes = {word: self._prefix_size(word) for word in words}
+        words = sorted(sizes, key=sizes.__getitem__)
+        if limit is not None:
+            # сколько товаров найдётся, если слова встречаются независимо друг от друга
+            total = max(len(self._products), 1)
+            expected = total
+            for word in words:
+                expected *= sizes[word] / total
+            # товаров самого редкого слова придётся просмотреть около limit * его товаров / найдено
+            if limit * sizes[words[0]] <= STREAM_STEPS * expected:
+                found = self._stream_words(words, wanted, limit)
+                if found is not None:
+                    return found
+        matches = self._prefix_ids(words[0])
+        for word in words[1:]:
+            if len(matches) * FILTER_RATIO < sizes[word]:
+                # оставшихся товаров мало: проверить их, а не собирать все товары слова
+                needle = "\0" + word
+                terms = self._terms
+                matches = {product_id for product_id in matches if needle in terms[product_id]}
+            else:
+                matches = matches & self._prefix_ids(word)
+            if not matches:
+                return []
+        if wanted is not None:
+            matches = [product_id for product_id in matches if wanted(product_id)]
+        if limit is None:
+            return sorted(matches, key=self._sort_keys.__getitem__)
+        return heapq.nsmallest(limit, matches, key=self._sort_keys.__getitem__)
+
+    def _stream_words(self, words, wanted, limit):
+        """
+        Товары первого (самого редкого) слова по названию, у которых есть и остальные
+        слова, — пока не набрано limit. None, если за STREAM_STEPS товаров не набралось.
+        """
+        skus = self._sku_range(words[0])
+        if len(skus) > STREAM_STEPS:
+            return None
+        streams = [self._ordered[word] for word in self._word_range(words[0])]
+        if skus:
+            streams.append(sorted(self._sort_keys[product_id] for _sku, product_id in skus))
+        ordered = streams[0] if len(streams) == 1 else heapq.merge(*streams)
+        needles = ["\0" + word for word in words[1:]]
+        terms = self._terms
+        found = []
+        seen = set()
+        for step, (_name, product_id) in enumerate(ordered):
+            if step >= STREAM_STEPS:
+                return None
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            if ((wanted is None or wanted(product_id))
+                    and all(needle in terms[product_id] for needle in needles)):
+                found.append(product_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+_product_index = None
+
+
+def product_index():
+    """Индекс товаров приложения (один на процесс), подписанный на изменения товаров db.*"""
+    global _product_index
+    if _product_index is None:
+        _product_index = ProductSearchIndex()
+        db.add_product_listener(_product_index.product_changed)
+    return _product_index
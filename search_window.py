@@ -1,96 +1,198 @@
-from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QPushButton)
-from PyQt5.QtCore import Qt
-from ui_styles import BUTTON_STYLE, TITLE_STYLE, SUBTITLE_STYLE
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QLineEdit, QComboBox, QTableWidget, QTableWidgetItem,
+                             QHeaderView, QMessageBox)
+import db
+import db_async
+from ui_styles import (BUTTON_STYLE, TITLE_STYLE, SUBTITLE_STYLE, INFO_STYLE,
+                       INPUT_STYLE, COMBOBOX_STYLE)
+from product_details_window import ProductDetailsWindow
+
+# Товаров на странице результатов
+PAGE_SIZE = 50
+
+# Колонки таблицы результатов: заголовок и номер поля в строке товара
+# (id, name, sku, category, material, color, length, width, height, price, discount_percent, stock_quantity, current_price, ...)
+RESULT_COLUMNS = [
+    ("Артикул", 2),
+    ("Наименование", 1),
+    ("Категория", 3),
+    ("Материал", 4),
+    ("Цвет", 5),
+    ("Цена, руб.", 12),
+    ("Остаток", 11),
+]
 
 
 class SearchWindow(QDialog):
-    def __init__(self, parent, product):
+    """Поиск товаров по названию, артикулу, материалу и цвету (db.search_products) постранично"""
+
+    def __init__(self, parent, query="", category_id=None):
         super().__init__(parent)
-        self.product = product
-        self.setWindowTitle("Результат поиска")
-        self.setGeometry(200, 200, 500, 400)
+        self.products = []
+        self.page = 0
+        self._search_task = None
+        self.setWindowTitle("Поиск товаров")
+        self.setGeometry(200, 200, 900, 600)
         self.setModal(True)
-        self.create_widgets()
-    
-    def create_widgets(self):
+        self.create_widgets(query, category_id)
+        if query.strip():
+            self.search()
+
+    def create_widgets(self, query, category_id):
         """Создание интерфейса"""
         layout = QVBoxLayout()
         layout.setSpacing(10)
         layout.setContentsMargins(20, 20, 20, 20)
-        
-        title_label = QLabel("Результат поиска")
+
+        title_label = QLabel("Поиск товаров")
         title_label.setStyleSheet(TITLE_STYLE)
         layout.addWidget(title_label)
-        
-        # product: (id, name, sku, category, material, color, length, width, height, price, discount_percent, stock_quantity, current_price, ...)
-        p = self.product
-        if p and len(p) >= 13:
-            info_layout = QVBoxLayout()
-            info_layout.setSpacing(5)
-
-            def _val(i, default=""):
-                if i >= len(p) or p[i] is None:
-                    return default
-                return p[i]
-
-            def _num(i, default=0):
-                try:
-                    return float(p[i]) if i < len(p) and p[i] is not None else default
-                except (TypeError, ValueError):
-                    return default
-
-            name_label = QLabel(f"Наименование: {_val(1)}")
-            name_label.setStyleSheet("font-size: 11pt;")
-            info_layout.addWidget(name_label)
-
-            sku_label = QLabel(f"Артикул: {_val(2)}")
-            sku_label.setStyleSheet("font-size: 11pt;")
-            info_layout.addWidget(sku_label)
-
-            category_label = QLabel(f"Категория: {_val(3)}")
-            category_label.setStyleSheet("font-size: 11pt;")
-            info_layout.addWidget(category_label)
-
-            price = _num(9)
-            price_label = QLabel(f"Цена: {price:.2f} руб.")
-            price_label.setStyleSheet("font-size: 11pt;")
-            info_layout.addWidget(price_label)
-
-            current_price = _num(12)
-            discount = _num(10)
-            if current_price < price and discount > 0:
-                disc_price_label = QLabel(
-                    f"Цена со скидкой: {current_price:.2f} руб. (скидка {discount:.0f}%)"
-                )
-                disc_price_label.setStyleSheet("font-size: 11pt; font-weight: bold; color: red;")
-                info_layout.addWidget(disc_price_label)
-
-            stock_label = QLabel(f"Остаток: {_val(11, '0')} шт.")
-            stock_label.setStyleSheet(SUBTITLE_STYLE)
-            info_layout.addWidget(stock_label)
-
-            if _val(4):
-                material_label = QLabel(f"Материал: {_val(4)}")
-                material_label.setStyleSheet(SUBTITLE_STYLE)
-                info_layout.addWidget(material_label)
-
-            if _val(5):
-                color_label = QLabel(f"Цвет: {_val(5)}")
-                color_label.setStyleSheet(SUBTITLE_STYLE)
-                info_layout.addWidget(color_label)
-
-            layout.addLayout(info_layout)
-        elif not p or len(p) < 2:
-            not_found = QLabel("Товар не найден")
-            not_found.setStyleSheet(SUBTITLE_STYLE)
-            layout.addWidget(not_found)
-        
-        layout.addStretch()
-        
-        # Кнопка закрытия
+
+        # Строка запроса, категория и кнопка поиска
+        query_layout = QHBoxLayout()
+        self.query_entry = QLineEdit(query)
+        self.query_entry.setPlaceholderText("название, артикул, материал или цвет")
+        self.query_entry.setStyleSheet(INPUT_STYLE)
+        self.query_entry.returnPressed.connect(self.search)
+        query_layout.addWidget(self.query_entry, 1)
+
+        self.category_combo = QComboBox()
+        self.category_combo.setStyleSheet(COMBOBOX_STYLE)
+        self.category_combo.addItem("Все категории", None)
+        try:
+            for cat_id, cat_name in db.get_categories():
+                self.category_combo.addItem(cat_name, cat_id)
+        except Exception as e:
+            print(f"Ошибка загрузки категорий: {e}")
+        index = self.category_combo.findData(category_id)
+        if index >= 0:
+            self.category_combo.setCurrentIndex(index)
+        self.category_combo.currentIndexChanged.connect(lambda _index: self.search())
+        query_layout.addWidget(self.category_combo)
+
+        search_btn = QPushButton("Найти")
+        search_btn.setStyleSheet(BUTTON_STYLE)
+        search_btn.clicked.connect(self.search)
+        query_layout.addWidget(search_btn)
+        layout.addLayout(query_layout)
+
+        self.status_label = QLabel("Введите название, артикул, материал или цвет")
+        self.status_label.setStyleSheet(INFO_STYLE)
+        layout.addWidget(self.status_label)
+
+        # Результаты: двойной щелчок открывает карточку товара
+        self.table = QTableWidget(0, len(RESULT_COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _ in RESULT_COLUMNS])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.cellDoubleClicked.connect(self.show_product_details)
+        header = self.table.horizontalHeader()
+        if header is not None:
+            for column in range(len(RESULT_COLUMNS)):
+                header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+            header.setSectionResizeMode(1, QHeaderView.Stretch)
+        v_header = self.table.verticalHeader()
+        if v_header:
+            v_header.hide()
+        layout.addWidget(self.table, 1)
+
+        # Листание страниц и закрытие
+        pager_layout = QHBoxLayout()
+        self.prev_btn = QPushButton("< Назад")
+        self.prev_btn.setStyleSheet(BUTTON_STYLE)
+        self.prev_btn.clicked.connect(self.prev_page)
+        pager_layout.addWidget(self.prev_btn)
+
+        self.page_label = QLabel()
+        self.page_label.setStyleSheet(SUBTITLE_STYLE)
+        pager_layout.addWidget(self.page_label)
+
+        self.next_btn = QPushButton("Вперёд >")
+        self.next_btn.setStyleSheet(BUTTON_STYLE)
+        self.next_btn.clicked.connect(self.next_page)
+        pager_layout.addWidget(self.next_btn)
+
+        pager_layout.addStretch()
+
         close_btn = QPushButton("Закрыть")
         close_btn.setStyleSheet(BUTTON_STYLE)
         close_btn.clicked.connect(self.accept)
-        layout.addWidget(close_btn, alignment=Qt.AlignmentFlag.AlignCenter)
-        
+        pager_layout.addWidget(close_btn)
+        layout.addLayout(pager_layout)
+
         self.setLayout(layout)
+        self._update_pager(has_more=False)
+
+    def search(self):
+        """Новый поиск — с первой страницы"""
+        self.page = 0
+        self.load_page()
+
+    def prev_page(self):
+        """Предыдущая страница результатов"""
+        if self.page > 0:
+            self.page -= 1
+            self.load_page()
+
+    def next_page(self):
+        """Следующая страница результатов"""
+        self.page += 1
+        self.load_page()
+
+    def load_page(self):
+        """Запрос страницы self.page в фоне (на строку больше — узнать, есть ли следующая)"""
+        query = self.query_entry.text().strip()
+        if self._search_task is not None:
+            self._search_task.cancel()
+            self._search_task = None
+        if not query:
+            self.show_results([])
+            return
+        self.status_label.setText(db_async.LOADING_TEXT)
+        self._search_task = db_async.run_async(
+            db.search_products, query, category_id=self.category_combo.currentData(),
+            limit=PAGE_SIZE + 1, offset=self.page * PAGE_SIZE, owner=self,
+            on_result=self.show_results, on_error=self.show_error,
+        )
+
+    def show_results(self, products):
+        """Показ страницы результатов"""
+        has_more = len(products) > PAGE_SIZE
+        self.products = products[:PAGE_SIZE]
+        self.table.setRowCount(len(self.products))
+        for row, product in enumerate(self.products):
+            for column, (_, field) in enumerate(RESULT_COLUMNS):
+                value = product[field]
+                if field == 12 and value is not None:
+                    value = f"{float(value):.2f}"
+                self.table.setItem(row, column, QTableWidgetItem("" if value is None else str(value)))
+        if self.products:
+            self.status_label.setText("Двойной щелчок по строке — карточка товара")
+        elif self.query_entry.text().strip():
+            self.status_label.setText("Товары не найдены")
+        else:
+            self.status_label.setText("Введите название, артикул, материал или цвет")
+        self._update_pager(has_more)
+
+    def show_error(self, error):
+        """Ошибка поиска"""
+        print(f"Ошибка поиска: {error}")
+        self.status_label.setText(f"Ошибка поиска: {error}")
+
+    def _update_pager(self, has_more):
+        self.prev_btn.setEnabled(self.page > 0)
+        self.next_btn.setEnabled(has_more)
+        self.page_label.setText(f"Страница {self.page + 1}")
+
+    def show_product_details(self, row, _column=None):
+        """Карточка товара из строки результатов"""
+        if 0 <= row < len(self.products):
+            try:
+                product = db.get_product_by_id(self.products[row][0])
+            except Exception as e:
+                QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке товара: {e}")
+                return
+            if product:
+                ProductDetailsWindow(self, product).show()
+            else:
+                QMessageBox.critical(self, "Ошибка", "Товар не найден")
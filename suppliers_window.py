@@ -14,6 +14,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QRegExp
 from PyQt5.QtGui import QRegExpValidator
 import db
+import refresh_scheduler
 from ui_styles import TITLE_STYLE, SUBTITLE_STYLE, BUTTON_STYLE
 import traceback
 
@@ -25,6 +26,7 @@ class SuppliersWindow(QWidget):
         try:
             self.setup_ui()
             self.load_suppliers()
+            refresh_scheduler.register(self, self.load_suppliers, refresh_scheduler.SUPPLIERS)
         except Exception as e:
             error_msg = f"Ошибка инициализации окна поставщиков: {e}"
             print(error_msg)
@@ -33,11 +35,6 @@ class SuppliersWindow(QWidget):
                 self.suppliers_table.setRowCount(1)
                 self.suppliers_table.setItem(0, 0, QTableWidgetItem(f"Ошибка: {e}"))
 
-    def showEvent(self, a0):
-        super().showEvent(a0)
-        if self.suppliers_table is not None and self.suppliers_table.rowCount() == 0:
-            self.load_suppliers()
-    
     def setup_ui(self):
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 20)
@@ -163,7 +160,7 @@ class SuppliersWindow(QWidget):
                 return
             try:
                 db.add_supplier(name, city, phone, inn)
-                self.load_suppliers()
+                refresh_scheduler.request(refresh_scheduler.SUPPLIERS)
                 dialog.accept()
             except Exception as e:
                 QMessageBox.critical(dialog, "Ошибка", f"Не удалось добавить поставщика: {e}")
@@ -207,7 +204,7 @@ class SuppliersWindow(QWidget):
                 QMessageBox.information(self, "Информация", "Поставщик не найден")
             else:
                 QMessageBox.information(self, "Успех", "Поставщик удалён")
-            self.load_suppliers()
+            refresh_scheduler.request(refresh_scheduler.SUPPLIERS)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось удалить поставщика: {e}")
 
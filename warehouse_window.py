@@ -4,6 +4,8 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QImage
 import db
+import db_async
+import refresh_scheduler
 import os
 
 UTIL_CARD_FRAME = """
@@ -47,8 +49,10 @@ except ImportError:
 class WarehouseWindow(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
+        self._load_task = None
         self.setup_ui()
         self.load_warehouse_data()
+        refresh_scheduler.register(self, self.load_warehouse_data, refresh_scheduler.PRODUCTS)
 
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -78,7 +82,7 @@ class WarehouseWindow(QWidget):
 
         self.setLayout(layout)
 
-    def load_warehouse_data(self):
+    def _clear_cards(self):
         while self.cards_layout.count():
             child = self.cards_layout.takeAt(0)
             if child is not None:
@@ -86,8 +90,23 @@ class WarehouseWindow(QWidget):
                 if w is not None:
                     w.deleteLater()
 
+    def load_warehouse_data(self):
+        self._clear_cards()
+        loading_label = QLabel(db_async.LOADING_TEXT)
+        loading_label.setStyleSheet("font-size: 11pt; color: #666;")
+        loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.cards_layout.addWidget(loading_label, alignment=Qt.AlignmentFlag.AlignCenter)
+
+        if self._load_task is not None:
+            self._load_task.cancel()
+        self._load_task = db_async.run_async(
+            db.get_inventory, owner=self,
+            on_result=self.show_inventory, on_error=self.show_error,
+        )
+
+    def show_inventory(self, inventory):
+        self._clear_cards()
         try:
-            inventory = db.get_inventory()
             if not inventory:
                 no_label = QLabel(NO_GOODS)
                 no_label.setStyleSheet("font-size: 11pt; color: #666;")
@@ -100,10 +119,14 @@ class WarehouseWindow(QWidget):
                 if card is not None:
                     self.cards_layout.addWidget(card)
         except Exception as e:
-            QMessageBox.critical(self, ERR, ERR_LOAD + ": " + str(e))
-            err = QLabel(str(e))
-            err.setStyleSheet("color: #c00;")
-            self.cards_layout.addWidget(err, alignment=Qt.AlignmentFlag.AlignCenter)
+            self.show_error(e)
+
+    def show_error(self, e):
+        self._clear_cards()
+        QMessageBox.critical(self, ERR, ERR_LOAD + ": " + str(e))
+        err = QLabel(str(e))
+        err.setStyleSheet("color: #c00;")
+        self.cards_layout.addWidget(err, alignment=Qt.AlignmentFlag.AlignCenter)
 
     def _create_card(self, item):
         if len(item) < 6: